@@ -1,14 +1,55 @@
 from components.app_config import create_app, external_stylesheets
-from components.html_components import title_card, modal
-from dash import dcc, html, no_update, callback_context
-from dash.dependencies import Input, Output, State
+from components.html_components import build_modal, build_search_results, title_card, search_bar
+from dash import ClientsideFunction, dcc, html, no_update, callback_context
+from dash.dependencies import ALL, Input, Output, State
 from dash.exceptions import PreventUpdate
+from flask import has_request_context, request
 from loguru import logger
-from utils.dataframes import ep1_df, ep2_df, ep3_df
-from utils.functions import generate_column_defs
+from utils.api import register_episode_routes, register_export_routes, register_facet_routes
+from utils.episodes import check_for_update, connect_current, current_data_version, get_column_types, get_dataset_cache_stats, get_datasets, register_data_reload
+from utils.lookup import find_enemy, get_modal_cache_stats, render_modal
+from utils.metrics import register_metrics
+from utils.profiling import register_profiling
+from utils.payloads import WIRE_FORMATS, get_grid_payload
+from utils.query import fetch_block
+from utils.search import search
 import dash_ag_grid as dag
 import dash_bootstrap_components as dbc
-import pandas as pd
+from urllib.parse import parse_qs, urlsplit
+import gc
+import os
+
+# 'clientSide' ships the whole episode to the browser, 'infinite' fetches blocks of rows from SQLite as the user scrolls
+GRID_ROW_MODEL = os.getenv('GRID_ROW_MODEL', 'clientSide')
+if GRID_ROW_MODEL not in ('clientSide', 'infinite'):
+  raise ValueError(f"GRID_ROW_MODEL must be 'clientSide' or 'infinite', not {GRID_ROW_MODEL!r}")
+
+# 'callback' sends each episode through a Dash callback, 'api' has the browser fetch it from /api/episode so it can be cached
+GRID_DATA_SOURCE = os.getenv('GRID_DATA_SOURCE', 'callback')
+if GRID_DATA_SOURCE not in ('callback', 'api'):
+  raise ValueError(f"GRID_DATA_SOURCE must be 'callback' or 'api', not {GRID_DATA_SOURCE!r}")
+
+# 'rows' sends rowData as the list of dicts the grid takes, 'columns' sends one array per column (with categories dictionary encoded)
+# and has the browser expand it back into rows, which saves repeating every key in every row
+GRID_WIRE_FORMAT = os.getenv('GRID_WIRE_FORMAT', 'rows')
+if GRID_WIRE_FORMAT not in WIRE_FORMATS:
+  raise ValueError(f"GRID_WIRE_FORMAT must be 'rows' or 'columns', not {GRID_WIRE_FORMAT!r}")
+
+# Where the browser keeps the episodes it has already loaded, so switching back to a tab doesn't go to the server
+# 'local' survives closing the browser, 'session' lasts as long as the tab, 'memory' until a page reload, and 'off' always asks the server
+# Only used when episodes come through a callback into the clientSide row model; with GRID_DATA_SOURCE=api the browser's HTTP cache does this job
+EPISODE_CACHE = os.getenv('EPISODE_CACHE', 'local')
+if EPISODE_CACHE not in ('local', 'session', 'memory', 'off'):
+  raise ValueError(f"EPISODE_CACHE must be 'local', 'session', 'memory' or 'off', not {EPISODE_CACHE!r}")
+use_episode_cache = EPISODE_CACHE != 'off' and GRID_DATA_SOURCE == 'callback' and GRID_ROW_MODEL == 'clientSide'
+
+# With the 'columns' wire format, episodes sent through a callback go to a store first, and the browser expands them into rowData
+# With GRID_DATA_SOURCE=api the browser fetches and expands them itself, so nothing reads that store
+send_row_columns = GRID_WIRE_FORMAT == 'columns' and GRID_ROW_MODEL == 'clientSide' and GRID_DATA_SOURCE == 'callback'
+
+# Put the first episode's data (and a deep-linked enemy's popup) straight into the layout, so the page doesn't wait on a callback before showing rows
+# Set it to 0 to send an empty grid and load the episode through the usual callback
+INLINE_INITIAL_EPISODE = os.getenv('INLINE_INITIAL_EPISODE', '1') == '1'
 
 # Create the Dash app
 app = create_app(
@@ -30,73 +71,256 @@ app.description = "A searchable and sortable table of all enemies in the Xenosag
 # For Gunicorn
 server = app.server
 
-app.layout = html.Div(
-  [
-    dcc.Location(id='url', refresh=False),
-    dcc.Store(id='clicked-cell-unique-value'),
-    dcc.Store(id='active-tab-data'),
-    html.Div(title_card),
-    # Use dcc.Tabs for episode selection instead of buttons
-    dbc.Tabs(
-      id='tabs',
-      active_tab='ep1',  # Set default active tab to Episode I
-      children=[
-        dbc.Tab(label='Episode I', tab_id='ep1'),
-        dbc.Tab(label='Episode II', tab_id='ep2'),
-        dbc.Tab(label='Episode III', tab_id='ep3'),
-      ],
-      style={'flex': '0 0 auto'},  # Style adjustments for tabs
-    ),
-    # Container for the grid; make sure it's visible and properly styled
-    html.Div(
-      dag.AgGrid(
-        id='grid',
-        className="ag-theme-alpine-dark",
-        style={
-          'width': '100%',
-          'height': 'calc(100vh - 200px)',
-        },
+# Pick up a new xenosaga.db without a restart, and keep each request on one version of the data
+register_data_reload(server)
+
+# Versioned, precompressed JSON for each episode, with ETags so repeat visits are a 304
+register_episode_routes(server)
+
+# Cross-episode facet queries (types, drops, elements, status immunities) answered from bitmap indexes
+register_facet_routes(server)
+
+# CSV and Parquet dumps of the data, streamed from SQLite with the grid's filter and sort semantics
+register_export_routes(server)
+
+def episode_response(tab_id):
+  """
+  Build what the browser's episode cache stores for a tab: the data version, the columnDefs and the rows in the configured wire format.
+
+  Args:
+    tab_id (str): The tab id, e.g. 'ep1'.
+
+  Returns:
+    dict: The episode, ready to send.
+  """
+  # The payloads are built once per version of the data, so this is just a dictionary lookup
+  payload = get_grid_payload(tab_id)
+  response = {'tab': tab_id, 'version': current_data_version()}
+  if payload is None: # Handle the case where the active tab is not one of the above
+    return dict(response, rowData=[], columnDefs=[])
+  if GRID_WIRE_FORMAT == 'columns':
+    return dict(response, rowColumns=payload.row_columns, columnDefs=payload.column_defs)
+  return dict(response, rowData=payload.row_data, columnDefs=payload.column_defs)
+
+def read_deep_link():
+  """
+  Work out which tab and enemy the page was opened on, from a URL like /?ep=ep3&enemy=<uuid>.
+  The Dash renderer fetches the layout from /_dash-layout, so the page's own query string arrives in the Referer header.
+
+  Returns:
+    Tuple[str, str | None]: The tab id (the enemy's episode if there is one, the first tab by default) and the enemy's uuid, or None.
+  """
+  datasets = get_datasets()
+  first_tab = next(iter(datasets))
+  if not has_request_context():
+    return first_tab, None
+  query = request.args.to_dict()
+  if not query and request.referrer:
+    query = {key: values[0] for key, values in parse_qs(urlsplit(request.referrer).query).items()}
+  tab_id = query.get('ep') if query.get('ep') in datasets else first_tab
+  enemy_tab = find_enemy(query.get('enemy'))
+  if enemy_tab is None:
+    return tab_id, None
+  return enemy_tab, query['enemy']
+
+# The layout is built per page load so it carries the data version being served right now, and whatever the URL asked for
+def serve_layout():
+  active_tab, enemy = read_deep_link()
+  grid_props, row_columns, initial_episode = {}, None, None
+  payload = get_grid_payload(active_tab) if INLINE_INITIAL_EPISODE else None
+  if payload is not None:
+    if use_episode_cache:
+      # showEpisode puts it in the browser's cache and on the grid without going back to the server
+      initial_episode = episode_response(active_tab)
+    else:
+      grid_props['columnDefs'] = payload.column_defs
+      if send_row_columns:
+        row_columns = payload.row_columns
+      elif GRID_ROW_MODEL == 'clientSide':
+        grid_props['rowData'] = payload.row_data
+      # The infinite row model asks for its own rows
+  modal_header, modal_body = (render_modal(enemy) if enemy else None) or (None, None)
+
+  return html.Div(
+    [
+      dcc.Location(id='url', refresh=False),
+      dcc.Store(id='clicked-cell-unique-value'),
+      # The data version goes into the /api/episode URLs so a new database busts the browser cache
+      dcc.Store(id='data-version', data=current_data_version()),
+      # Holds the episode in the 'columns' wire format on its way to the grid, when GRID_WIRE_FORMAT is 'columns'
+      dcc.Store(id='grid-row-columns', data=row_columns),
+      # The episodes this browser has loaded, keyed by data version, and the requests and responses for the ones it hasn't
+      dcc.Store(id='episode-cache', storage_type=EPISODE_CACHE if EPISODE_CACHE != 'off' else 'memory'),
+      dcc.Store(id='episode-request'),
+      dcc.Store(id='episode-response', data=initial_episode),
+      html.Div(title_card),
+      search_bar,
+      # Use dcc.Tabs for episode selection instead of buttons
+      dbc.Tabs(
+        id='tabs',
+        active_tab=active_tab,  # The first tab unless the URL asked for another one
+        # One tab per dataset in the database's registry
+        children=[dbc.Tab(label=dataset.label, tab_id=tab_id) for tab_id, dataset in get_datasets().items()],
+        style={'flex': '0 0 auto'},  # Style adjustments for tabs
       ),
-      id='grid-container',
-      style={'flex': '1 1 auto', 'overflow': 'auto'}, # Allow horizontal and vertical scrolling
-    ),
-    modal,
-  ],
-  style={
-    'display': 'flex',
-    'flexDirection': 'column',
-    'height': '100vh'
-  },
-)
+      # Container for the grid; make sure it's visible and properly styled
+      html.Div(
+        dag.AgGrid(
+          id='grid',
+          className="ag-theme-alpine-dark",
+          # Use the uuid as the row id so cell clicks carry the uuid and nothing else
+          getRowId="params.data.uuid",
+          rowModelType=GRID_ROW_MODEL,
+          # Only used by the infinite row model: how many rows to request at a time and how many blocks to keep
+          dashGridOptions={"cacheBlockSize": 100, "maxBlocksInCache": 10} if GRID_ROW_MODEL == 'infinite' else {},
+          style={
+            'width': '100%',
+            'height': 'calc(100vh - 200px)',
+          },
+          **grid_props,
+        ),
+        id='grid-container',
+        style={'flex': '1 1 auto', 'overflow': 'auto'}, # Allow horizontal and vertical scrolling
+      ),
+      build_modal(modal_header, modal_body),
+    ],
+    style={
+      'display': 'flex',
+      'flexDirection': 'column',
+      'height': '100vh'
+    },
+  )
 
-# A callback to generate the grid (lazy load) and the column definitions based on the selected tab
-@app.callback(
-  [Output('grid', 'rowData'), Output('grid', 'columnDefs'), Output('active-tab-data', 'data')],
-  [Input('tabs', 'active_tab')]
-)
-def update_grid_data_and_columns(active_tab):
-  if active_tab == 'ep1':
-    data = ep1_df
-  elif active_tab == 'ep2':
-    data = ep2_df
-  elif active_tab == 'ep3':
-    data = ep3_df
-  else: # Handle the case where the active tab is not one of the above
-    return [], []  # Return empty data and column definitions
+app.layout = serve_layout
+
+if GRID_DATA_SOURCE == 'api' and GRID_ROW_MODEL == 'clientSide':
+  # Let the browser fetch the episode itself (see assets/clientside.js) so the response can come from its HTTP cache
+  app.clientside_callback(
+    ClientsideFunction(namespace='xenosaga', function_name='loadEpisodeColumns' if GRID_WIRE_FORMAT == 'columns' else 'loadEpisode'),
+    [Output('grid', 'rowData'), Output('grid', 'columnDefs')],
+    [Input('tabs', 'active_tab')],
+    [State('data-version', 'data')],
+    # The layout already has the first episode in it
+    prevent_initial_call=INLINE_INITIAL_EPISODE
+  )
+elif use_episode_cache:
+  # Tab switches are answered in the browser from the episode cache (see assets/clientside.js)
+  # Only an episode that isn't cached for this data version is requested from the server
+  app.clientside_callback(
+    ClientsideFunction(namespace='xenosaga', function_name='showEpisode'),
+    [
+      Output('grid', 'rowData'),
+      Output('grid', 'columnDefs'),
+      Output('episode-cache', 'data'),
+      Output('data-version', 'data'),
+      Output('episode-request', 'data'),
+    ],
+    [Input('tabs', 'active_tab'), Input('episode-response', 'data')],
+    [State('data-version', 'data'), State('episode-cache', 'data')]
+  )
+
+  # Send one episode for the browser to cache, in whichever wire format is configured
+  @app.callback(
+    Output('episode-response', 'data'),
+    [Input('episode-request', 'data')],
+    # Nothing has been requested yet when the page loads
+    prevent_initial_call=True
+  )
+  def update_grid_data_and_columns(episode_request):
+    if not episode_request:
+      raise PreventUpdate
+    return episode_response(episode_request['tab'])
+else:
+  # A callback to generate the grid (lazy load) and the column definitions based on the selected tab
+  @app.callback(
+    [Output('grid-row-columns', 'data') if send_row_columns else Output('grid', 'rowData'), Output('grid', 'columnDefs')],
+    [Input('tabs', 'active_tab')],
+    # The layout already has the first episode in it
+    prevent_initial_call=INLINE_INITIAL_EPISODE
+  )
+  def update_grid_data_and_columns(active_tab):
+    # The payloads are built once at startup, so this is just a dictionary lookup
+    payload = get_grid_payload(active_tab)
+    if payload is None: # Handle the case where the active tab is not one of the above
+      return ({'length': 0, 'columns': []} if send_row_columns else []), []  # Return empty data and column definitions
 
-  rowData = data.to_dict('records')
-  columnDefs = generate_column_defs(data)
-  return rowData, columnDefs, rowData
+    # The infinite row model fetches its own rows, so only send the column definitions
+    if GRID_ROW_MODEL == 'infinite':
+      return no_update, payload.column_defs
+    return (payload.row_columns if send_row_columns else payload.row_data), payload.column_defs
+
+  if send_row_columns:
+    app.clientside_callback(
+      ClientsideFunction(namespace='xenosaga', function_name='expandRowColumns'),
+      Output('grid', 'rowData'),
+      Input('grid-row-columns', 'data')
+    )
+
+if GRID_ROW_MODEL == 'infinite':
+  # Answer the grid's block requests with filtering and sorting pushed down into SQLite
+  @app.callback(
+    Output('grid', 'getRowsResponse'),
+    [Input('grid', 'getRowsRequest')],
+    [State('tabs', 'active_tab')],
+    # The grid hasn't asked for anything yet when the page loads
+    prevent_initial_call=True
+  )
+  def serve_grid_block(request, active_tab):
+    if not request:
+      raise PreventUpdate
+    conn = connect_current()
+    dataset = get_datasets().get(active_tab) if isinstance(active_tab, str) else None
+    if dataset is None:
+      raise PreventUpdate
+    try:
+      return fetch_block(conn, dataset.table_name, request, get_column_types(active_tab))
+    except ValueError as e: # A malformed request, or an unknown column or filter type in it
+      logger.warning(f"Rejected grid block request: {e}")
+      raise PreventUpdate
+
+  # The grid keeps its cached blocks when the tab changes, so throw them away to make it ask for the new episode
+  app.clientside_callback(
+    """
+    function(active_tab) {
+      dash_ag_grid.getApiAsync('grid').then((api) => api.purgeInfiniteCache());
+    }
+    """,
+    Input('tabs', 'active_tab'),
+    prevent_initial_call=True
+  )
 
 
 # Create a callback to update the column size to autoSize
 # Gets triggered when the columnDefs property of the grid changes. This callback will then set the columnSize property to "autoSize"
-@app.callback(
+# It's clientside so neither the first page load nor a tab switch served from the episode cache waits on the server for it
+app.clientside_callback(
+  """
+  function(_) {
+    return "responsiveSizeToFit";
+  }
+  """,
   Output('grid', 'columnSize'),
   [Input('grid', 'columnDefs')]
 )
-def update_column_size(_):
-  return "responsiveSizeToFit"
+
+# Search every episode at once using the FTS5 index built by json_to_sqlite.py
+@app.callback(
+  Output('search-results', 'children'),
+  [Input('search-input', 'value')],
+  # The search box is empty when the page loads
+  prevent_initial_call=True
+)
+def update_search_results(query):
+  if not query or not query.strip():
+    return None
+  # Map the table each hit came from back to its tab
+  conn = connect_current()
+  datasets = get_datasets()
+  tab_ids = {dataset.table_name: tab_id for tab_id, dataset in datasets.items()}
+  hits = search(conn, query)
+  for hit in hits:
+    hit['tab_id'] = tab_ids.get(hit['table_name'])
+  return build_search_results(hits, {tab_id: dataset.label for tab_id, dataset in datasets.items()})
 
 # Create a callback to open a modal when a row is selected in the grid
 # Based on https://dashaggrid.pythonanywhere.com/other-examples/popup-from-cell-click
@@ -107,104 +331,61 @@ def update_column_size(_):
   [
     Input("grid", "cellClicked"),
     Input("close", "n_clicks"),
+    Input({"type": "search-result", "uuid": ALL}, "n_clicks"),
   ],
   [
     State("modal", "is_open"),
-    State("grid", "rowData")
-  ]
+  ],
+  # Nothing has been clicked when the page loads; a deep-linked enemy's modal is already in the layout
+  prevent_initial_call=True
 )
-def open_and_populate_modal(cell_clicked_data, close_btn_clicks, modal_open, grid_data):
+def open_and_populate_modal(cell_clicked_data, close_btn_clicks, search_result_clicks, modal_open):
   ctx = callback_context
 
   if not ctx.triggered:
     return no_update, no_update, no_update
 
-  trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+  trigger_id = ctx.triggered_id
 
   if trigger_id == 'close':
     return False, no_update, no_update
   
-  if trigger_id == 'grid':
-    if not cell_clicked_data or 'rowIndex' not in cell_clicked_data:
-      raise PreventUpdate
+  if trigger_id == 'grid' or isinstance(trigger_id, dict):
+    if trigger_id == 'grid':
+      if not cell_clicked_data or 'rowIndex' not in cell_clicked_data:
+        raise PreventUpdate
+      # The grid uses getRowId="params.data.uuid", so the row id is the uuid itself
+      # That way the browser doesn't have to upload the whole rowData just so we can read one uuid
+      clicked_uuid = cell_clicked_data['rowId']
+    else:
+      # A search result was clicked. New results also fire this callback with n_clicks=0, so ignore those
+      if not ctx.triggered[0]['value']:
+        raise PreventUpdate
+      clicked_uuid = trigger_id['uuid']
 
-    # Assuming 'rowId' corresponds to the index in 'grid_data' and contains the 'uuid'
-    row_id = cell_clicked_data['rowId']
-    clicked_uuid = grid_data[int(row_id)]['uuid']
+    # One indexed SQLite lookup the first time, and a cache hit after that
+    rendered = render_modal(clicked_uuid)
+    if rendered is None:
+      logger.error(f"UUID {clicked_uuid} not found in any dataset.")
+      return True, no_update, html.P("Error: Details not found for the selected enemy.", className="modal-error-message")
 
-    # Populate the modal with the correct data
-    data = {"uuid": clicked_uuid}
-    if not data:
-      raise PreventUpdate
-
-    # Consolidate dataset lookup into a single statement with a clearer structure
-    datasets = {'ep1': ep1_df, 'ep2': ep2_df, 'ep3': ep3_df}
-    found_df = next((df for df_name, df in datasets.items() if data["uuid"] in df['uuid'].values), None)
-
-    if found_df is None:
-      logger.error(f"UUID {data['uuid']} not found in any dataset.")
-      return True, html.P("Error: Details not found for the selected enemy.", className="modal-error-message")
-
-    # Efficiently retrieve the selected row
-    selected_row = found_df.loc[found_df['uuid'] == data['uuid']].iloc[0]
-
-    def format_value(value):
-      """Format the value for display. If the value is a number, format it with commas. Otherwise, return the value as is."""
-      if value is None or value == '':
-        return 'N/A'
-      try:
-        numeric_value = float(value)
-        if numeric_value.is_integer():
-          return f"{int(numeric_value):,}"
-        return f"{numeric_value:,}"
-      except (ValueError, TypeError):
-        return value
-      
-    def apply_element_style(text):
-      """Colorize the text based on the element. Preserves spaces and commas."""
-      color_styles = {
-        "Lightning": "yellow",
-        "Fire": "red",
-        "Ice": "lightblue",
-        "Yes": "green",
-        "No": "red",
-        "Cannot": "red",
-      }
-      parts = text.split(", ")
-      spans = []
-      for i, part in enumerate(parts):
-        color = color_styles.get(part, None)
-        if color:
-          spans.append(html.Span(part, style={'color': color}))
-        else:
-          spans.append(html.Span(part))
-        if i < len(parts) - 1:
-          spans.append(", ")
-      return spans
-
-    # Retrieve the enemy's name
-    enemy_name = selected_row['Name']
-
-    # Remove the 'Name' key-value pair from the selected_row dictionary
-    # This is to prevent the 'Name' key from being displayed in the modal body, as it's already displayed in the modal header
-    selected_row = selected_row.drop('Name')
-
-    # Streamline content generation by using Dash HTML components for better layout control
-    content = []
-    for key, value in selected_row.items():
-      if key != "uuid":
-        if isinstance(value, str):
-          spans = apply_element_style(value)
-          content.append(html.Div([html.B(f"{key}: "), *spans], style={'margin-bottom': '10px'}))
-        else:
-          content.append(html.Div([html.B(f"{key}: "), html.Span(f"{format_value(value) if pd.notnull(value) else 'N/A'}")], style={'margin-bottom': '10px'}))
-
-    logger.debug(f"Selected enemy stats: {content}")
-
-    return True, html.H4(enemy_name), html.Div(content, className="modal-content-wrapper")
+    modal_header, modal_body = rendered
+    return True, modal_header, modal_body
 
   return no_update, no_update, no_update
 
+# Latency, response size and error counts for every callback above, plus the modal cache's hit rate and the dataset loads and evictions, on /metrics
+register_metrics(app, caches={'modal': get_modal_cache_stats, 'datasets': get_dataset_cache_stats})
+# Opt-in cProfile dumps of callback requests, see utils/profile_report.py
+register_profiling(app)
+
+# Load the data in the gunicorn master, so the workers start out sharing it
+check_for_update()
+
+# Everything above runs once in the gunicorn master thanks to --preload
+# Freezing it moves those objects out of the garbage collector's reach, so collections in each worker don't write to the pages they share copy-on-write
+gc.freeze()
+
 # Run the app if running locally
 if __name__ == '__main__':
   app.run(debug=True)
@@ -0,0 +1,104 @@
+// Wrapped in a function so the helpers don't end up as globals
+(function () {
+    // Expand the compact 'columns' wire format (see build_row_columns in utils/payloads.py) into the list of row objects the grid takes
+    // Every row gets its keys added in the same order, so they all end up with the same shape in the JS engine
+    function expandRowColumns(rowColumns) {
+        if (!rowColumns) {
+            return [];
+        }
+        const length = rowColumns.length;
+        const rows = new Array(length);
+        for (let i = 0; i < length; i++) {
+            rows[i] = {};
+        }
+        for (const column of rowColumns.columns) {
+            const name = column.name;
+            if (column.codes) {
+                const dictionary = column.dictionary;
+                const codes = column.codes;
+                for (let i = 0; i < length; i++) {
+                    rows[i][name] = codes[i] < 0 ? null : dictionary[codes[i]];
+                }
+            } else {
+                const values = column.values;
+                for (let i = 0; i < length; i++) {
+                    rows[i][name] = values[i];
+                }
+            }
+        }
+        return rows;
+    }
+
+    // The rows of an episode, in whichever wire format the server sent them
+    function episodeRows(episode) {
+        return episode.rowColumns ? expandRowColumns(episode.rowColumns) : episode.rowData;
+    }
+
+    // Fetch an episode from the cacheable /api/episode endpoint instead of a Dash callback
+    // The URL carries the data version, so the browser and any CDN can keep the response until the data changes
+    async function fetchEpisode(activeTab, dataVersion, wireFormat) {
+        if (!activeTab) {
+            return [[], []];
+        }
+        const format = wireFormat === 'columns' ? '&format=columns' : '';
+        const response = await fetch(`/api/episode/${activeTab}.json?v=${dataVersion}${format}`);
+        if (!response.ok) {
+            return [[], []];
+        }
+        const episode = await response.json();
+        return [episodeRows(episode), episode.columnDefs];
+    }
+
+    // Answer a tab switch from the episode cache, or ask the server for the episode if it isn't cached for this data version
+    // Also called with the server's response, which goes into the cache (and onto the grid, if its tab is still the active one)
+    // Returns [rowData, columnDefs, cache, dataVersion, episodeRequest]
+    function showEpisode(activeTab, response, dataVersion, cache) {
+        const noUpdate = window.dash_clientside.no_update;
+        const triggered = window.dash_clientside.callback_context.triggered.map((trigger) => trigger.prop_id);
+        let episodes = cache && cache.version === dataVersion ? cache.episodes : {};
+        let newCache = noUpdate;
+        let newVersion = noUpdate;
+
+        // The layout can also come with the first episode already in the response, to be cached without asking for it
+        const fromServer = triggered.includes('episode-response.data');
+        if (response && (fromServer || !episodes[response.tab])) {
+            if (response.version !== dataVersion) {
+                // The data was updated since the page loaded, so everything cached for the old version goes
+                episodes = {};
+                newVersion = response.version;
+            }
+            const {tab, version, ...episode} = response;
+            episodes = Object.assign({}, episodes, {[tab]: episode});
+            newCache = {version: version, episodes: episodes};
+        }
+
+        if (!activeTab) {
+            return [[], [], newCache, newVersion, noUpdate];
+        }
+        if (fromServer && response && response.tab !== activeTab) {
+            // Cached for later, but the user has moved on to another tab since asking for it
+            return [noUpdate, noUpdate, newCache, newVersion, noUpdate];
+        }
+        const episode = episodes[activeTab];
+        if (episode) {
+            return [episodeRows(episode), episode.columnDefs, newCache, newVersion, noUpdate];
+        }
+        // The request for the active tab is already on its way if this is a response for another tab
+        // The timestamp makes a repeated request for the same tab still count as a change
+        const request = fromServer ? noUpdate : {tab: activeTab, requested: Date.now()};
+        return [noUpdate, noUpdate, newCache, newVersion, request];
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        xenosaga: {
+            loadEpisode: function (activeTab, dataVersion) {
+                return fetchEpisode(activeTab, dataVersion, 'rows');
+            },
+            loadEpisodeColumns: function (activeTab, dataVersion) {
+                return fetchEpisode(activeTab, dataVersion, 'columns');
+            },
+            expandRowColumns: expandRowColumns,
+            showEpisode: showEpisode,
+        },
+    });
+})();
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the hot callbacks, called directly and through Dash.
+
+Each case is timed over many iterations (after a warm-up round, so the lazy
+caches are filled) and reported as latency percentiles plus the size of what
+the browser would receive:
+
+    direct:*  calls update_grid_data_and_columns, open_and_populate_modal and
+              generate_column_defs as plain Python functions
+    http:*    POSTs the same interactions to /_dash-update-component through
+              the Flask test client, so Dash's own (de)serialization is included
+
+Results are compared to benchmarks/baselines/callbacks.json, and the script
+exits non-zero if any case regressed. Record a new baseline with
+--update-baseline.
+
+Usage:
+    python benchmarks/callbacks.py [--iterations 200] [--update-baseline]
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)
+
+from benchmarks.dash_requests import cell_click_body, tab_switch_args, tab_switch_body
+from benchmarks.harness import compare_to_baseline, load_baseline, percentiles, print_results, write_baseline
+
+BASELINE = 'callbacks'
+
+
+def time_case(function, iterations):
+    """Run function once to warm up, then time it. Returns the latencies and the last result."""
+    result = function()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - started)
+    return samples, result
+
+
+def with_triggered(prop_id, value, function, *args):
+    """Call a callback directly with Dash's callback context set, the way Dash's testing docs do."""
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+
+    def run():
+        context_value.set(AttributeDict(triggered_inputs=[{'prop_id': prop_id, 'value': value}]))
+        return function(*args)
+
+    return contextvars.copy_context().run(run)
+
+
+def output_bytes(value):
+    """Size of a callback's return value the way Dash would serialize it."""
+    import plotly.io.json
+    return len(plotly.io.json.to_json_plotly(value).encode('utf-8'))
+
+
+def run_cases(iterations):
+    import app
+    from utils.episodes import get_column_types, get_datasets, read_episode_rows
+    from utils.functions import generate_column_defs
+
+    client = app.server.test_client()
+    uuid = read_episode_rows('ep1')[1][0]['uuid']
+    cell_clicked = {'rowIndex': 0, 'rowId': uuid, 'colId': 'Name'}
+    results = {}
+    tab_ids = list(get_datasets())
+
+    def record(case, function, size_of):
+        samples, result = time_case(function, iterations)
+        results[case] = dict(percentiles(samples), bytes=size_of(result))
+
+    for tab_id in tab_ids:
+        record(f'direct:tab_switch:{tab_id}', lambda: app.update_grid_data_and_columns(*tab_switch_args(tab_id)), output_bytes)
+    record(
+        'direct:row_click',
+        lambda: with_triggered('grid.cellClicked', cell_clicked, app.open_and_populate_modal, cell_clicked, 0, [], False),
+        output_bytes,
+    )
+    for tab_id in tab_ids:
+        columns = read_episode_rows(tab_id)[0]
+        column_types = get_column_types(tab_id)
+        record(f'direct:column_defs:{tab_id}', lambda: generate_column_defs(columns, column_types), output_bytes)
+
+    def post(body):
+        response = client.post('/_dash-update-component', json=body)
+        assert response.status_code == 200, response.status_code
+        return response.data
+
+    for tab_id in tab_ids:
+        record(f'http:tab_switch:{tab_id}', lambda: post(tab_switch_body(tab_id)), len)
+    record('http:row_click', lambda: post(cell_click_body(uuid)), len)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--metric', choices=('p50', 'p90', 'p99'), default='p50', help='Which percentile is checked against the baseline')
+    parser.add_argument('--latency-tolerance', type=float, default=1.5, help='Fail if the checked percentile is this many times the baseline')
+    parser.add_argument('--size-tolerance', type=float, default=1.05, help='Fail if a response is this many times bigger than the baseline')
+    parser.add_argument('--update-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    os.environ.setdefault('LOGURU_LEVEL', 'WARNING')
+    results = run_cases(args.iterations)
+    baseline = load_baseline(BASELINE)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results, baseline, args.metric)
+
+    if args.update_baseline:
+        write_baseline(BASELINE, results)
+        print(f"Baseline written to benchmarks/baselines/{BASELINE}.json")
+        return
+    if baseline is None:
+        print("No baseline recorded yet; run with --update-baseline to store one")
+        return
+    failures = compare_to_baseline(results, baseline, args.latency_tolerance, args.size_tolerance, args.metric)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
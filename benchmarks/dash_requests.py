@@ -0,0 +1,69 @@
+"""
+Request bodies for the Dash callbacks in app.py, shared by the benchmark scripts.
+
+Each function returns the JSON body the browser would POST to
+/_dash-update-component for one interaction.
+"""
+
+import os
+
+
+def uses_episode_cache():
+    """Whether the app answers tab switches from the browser's episode cache, with the same environment variables app.py reads."""
+    return (
+        os.getenv('EPISODE_CACHE', 'local') != 'off'
+        and os.getenv('GRID_DATA_SOURCE', 'callback') == 'callback'
+        and os.getenv('GRID_ROW_MODEL', 'clientSide') == 'clientSide'
+    )
+
+
+def tab_switch_args(tab_id):
+    """The arguments update_grid_data_and_columns takes when switching to a tab the browser doesn't have cached."""
+    return ({'tab': tab_id, 'requested': 0},) if uses_episode_cache() else (tab_id,)
+
+
+def tab_switch_body(tab_id, wire_format=None):
+    """
+    Switching to a tab, which fires update_grid_data_and_columns.
+    With the episode cache on, this is the request the browser sends for an episode it doesn't have yet.
+    Otherwise its first output depends on GRID_WIRE_FORMAT.
+    """
+    if uses_episode_cache():
+        return {
+            'output': 'episode-response.data',
+            'outputs': {'id': 'episode-response', 'property': 'data'},
+            'inputs': [{'id': 'episode-request', 'property': 'data', 'value': tab_switch_args(tab_id)[0]}],
+            'changedPropIds': ['episode-request.data'],
+        }
+    if (wire_format or os.getenv('GRID_WIRE_FORMAT', 'rows')) == 'columns':
+        rows_output = {'id': 'grid-row-columns', 'property': 'data'}
+    else:
+        rows_output = {'id': 'grid', 'property': 'rowData'}
+    return {
+        'output': f"..{rows_output['id']}.{rows_output['property']}...grid.columnDefs..",
+        'outputs': [
+            rows_output,
+            {'id': 'grid', 'property': 'columnDefs'},
+        ],
+        'inputs': [{'id': 'tabs', 'property': 'active_tab', 'value': tab_id}],
+        'changedPropIds': ['tabs.active_tab'],
+    }
+
+
+def cell_click_body(uuid):
+    """Clicking a row in the grid, which fires open_and_populate_modal."""
+    return {
+        'output': '..modal.is_open...modal-header.children...modal-content.children..',
+        'outputs': [
+            {'id': 'modal', 'property': 'is_open'},
+            {'id': 'modal-header', 'property': 'children'},
+            {'id': 'modal-content', 'property': 'children'},
+        ],
+        'inputs': [
+            {'id': 'grid', 'property': 'cellClicked', 'value': {'rowIndex': 0, 'rowId': uuid, 'colId': 'Name'}},
+            {'id': 'close', 'property': 'n_clicks', 'value': 0},
+            [],
+        ],
+        'state': [{'id': 'modal', 'property': 'is_open', 'value': False}],
+        'changedPropIds': ['grid.cellClicked'],
+    }
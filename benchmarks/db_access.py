@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compare the ways the app can read from assets/xenosaga.db, per query:
+
+    pandas      a fresh sqlite3.connect() and pd.read_sql_query('SELECT * ...'),
+                the way the tables used to be loaded
+    fresh       utils.db.connect_readonly() opened and closed around each query
+    pooled      utils.db.pooled_connection(), this thread's long-lived immutable
+                connection with its page cache and prepared statements warm
+
+for one enemy by uuid (the modal lookup), a whole episode, and one 50-row block
+of the infinite row model.
+
+Usage:
+    python benchmarks/db_access.py [--runs 2000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import pandas as pd
+
+from benchmarks.harness import episode_uuids
+from utils.db import DB_PATH, connect_readonly, fetch_row, fetch_rows, pooled_connection
+from utils.episodes import get_column_types, get_datasets
+from utils.query import fetch_block
+
+PAGE_SIZE = 50
+
+
+def median_microseconds(function, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples)
+
+
+def with_pandas(sql, params=()):
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def with_fresh_connection(fetch, *args):
+    conn = connect_readonly()
+    try:
+        return fetch(conn, *args)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare pandas, fresh connections and the pooled connection for the queries the app makes.')
+    parser.add_argument('--runs', type=int, default=2000, help='Queries to time per case')
+    args = parser.parse_args()
+
+    uuids = episode_uuids()
+    episode_tables = {tab_id: dataset.table_name for tab_id, dataset in get_datasets().items()}
+    random.seed(0)
+    lookups = [(episode_tables[tab_id], uuid) for tab_id, tab_uuids in uuids.items() for uuid in tab_uuids]
+    column_types = {table_name: get_column_types(tab_id) for tab_id, table_name in episode_tables.items()}
+    # The grid's getRowsRequest for each block, as serve_grid_block gets it
+    blocks = [
+        (table_name, {'startRow': start, 'endRow': start + PAGE_SIZE}, column_types[table_name])
+        for tab_id, table_name in episode_tables.items() for start in range(0, len(uuids[tab_id]), PAGE_SIZE)
+    ]
+    tables = list(episode_tables.values())
+
+    cases = {
+        'by uuid': {
+            'pandas': lambda: with_pandas(f"SELECT * FROM {(lookup := random.choice(lookups))[0]} WHERE uuid = ?", (lookup[1],)),
+            'fresh': lambda: with_fresh_connection(fetch_row, *random.choice(lookups)),
+            'pooled': lambda: fetch_row(pooled_connection(), *random.choice(lookups)),
+        },
+        'by episode': {
+            'pandas': lambda: with_pandas(f"SELECT * FROM {random.choice(tables)}"),
+            'fresh': lambda: with_fresh_connection(fetch_rows, random.choice(tables)),
+            'pooled': lambda: fetch_rows(pooled_connection(), random.choice(tables)),
+        },
+        'by block': {
+            'pandas': lambda: with_pandas(f"SELECT * FROM {(block := random.choice(blocks))[0]} ORDER BY rowid LIMIT ? OFFSET ?", (PAGE_SIZE, block[1]['startRow'])),
+            'fresh': lambda: with_fresh_connection(fetch_block, *random.choice(blocks)),
+            'pooled': lambda: fetch_block(pooled_connection(), *random.choice(blocks)),
+        },
+    }
+
+    print(f"Median microseconds of {args.runs} queries\n")
+    print(f"{'query':<12} {'pandas':>9} {'fresh':>9} {'pooled':>9} {'speedup':>8}")
+    for name, functions in cases.items():
+        times = {method: median_microseconds(function, args.runs) for method, function in functions.items()}
+        print(f"{name:<12} {times['pandas']:>9.1f} {times['fresh']:>9.1f} {times['pooled']:>9.1f} {times['pandas'] / times['pooled']:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Check that exports stream: time to first byte, total time and peak Python
+memory of utils/export.py's CSV and Parquet streams, against
+loading the whole table with pandas and writing it out in one go.
+
+The real tables only have a few hundred rows, so this works on a scratch copy
+of assets/xenosaga.db with Episode II duplicated up to --rows rows. Peak memory
+is measured with tracemalloc in a separate, untimed run. It only counts
+allocations Python (and numpy) can see, which is all of them for these code
+paths.
+
+Usage:
+    python benchmarks/export.py [--rows 100000]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)
+
+import pandas as pd
+
+from utils.db import DB_PATH
+from utils.export import build_export_queries, export_columns, stream_csv, stream_parquet
+from utils.schema import read_column_types
+
+TABLE = 'episode2'
+
+
+def grow_table(db_path, rows):
+    """Duplicate the table's rows until it has at least this many."""
+    conn = sqlite3.connect(db_path)
+    try:
+        # The copies share uuids, so the unique index has to go
+        conn.execute(f"DROP INDEX IF EXISTS idx_{TABLE}_uuid")
+        while conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0] < rows:
+            conn.execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}")
+        conn.commit()
+        return conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def measure(produce):
+    """Run an export to the end twice: once timed, once under tracemalloc. Returns seconds to the first chunk, total seconds, bytes and peak traced memory."""
+    started = time.perf_counter()
+    first_byte, size = None, 0
+    for chunk in produce():
+        if first_byte is None and chunk:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    # tracemalloc slows everything down a lot, so it gets a run of its own
+    tracemalloc.start()
+    for chunk in produce():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_byte, total, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare streamed exports with building them in memory.')
+    parser.add_argument('--rows', type=int, default=100000, help='Rows to grow the scratch table to')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = os.path.join(scratch, 'xenosaga.db')
+        shutil.copyfile(DB_PATH, db_path)
+        rows = grow_table(db_path, args.rows)
+        conn = sqlite3.connect(db_path)
+        column_types = read_column_types(conn, TABLE)
+        conn.close()
+        columns = export_columns({TABLE: column_types})
+        queries = build_export_queries({TABLE: ('Episode II', column_types)})
+
+        def streamed(stream):
+            def produce():
+                conn = sqlite3.connect(db_path)
+                try:
+                    yield from stream(conn, queries, columns)
+                finally:
+                    conn.close()
+            return produce
+
+        def pandas_csv():
+            conn = sqlite3.connect(db_path)
+            try:
+                df = pd.read_sql_query(queries[0][1], conn)
+            finally:
+                conn.close()
+            yield df.to_csv(index=False).encode('utf-8')
+
+        def pandas_parquet():
+            conn = sqlite3.connect(db_path)
+            try:
+                df = pd.read_sql_query(queries[0][1], conn)
+            finally:
+                conn.close()
+            buffer = io.BytesIO()
+            df.to_parquet(buffer, index=False)
+            yield buffer.getvalue()
+
+        cases = [
+            ('csv, streamed', streamed(stream_csv)),
+            ('csv, pandas', pandas_csv),
+            ('parquet, streamed', streamed(stream_parquet)),
+            ('parquet, pandas', pandas_parquet),
+        ]
+
+        print(f"Exporting {rows:,} rows of {TABLE}\n")
+        print(f"{'export':<20} {'first byte ms':>14} {'total ms':>10} {'MB out':>8} {'peak MB':>8}")
+        for name, produce in cases:
+            first_byte, total, size, peak = measure(produce)
+            print(f"{name:<20} {first_byte * 1000:>14.1f} {total * 1000:>10.0f} {size / 1e6:>8.1f} {peak / 1e6:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Time cross-episode facet queries on the bitmap indexes (utils/facets.py)
+against doing the same thing the way the grid's text filters do: a case
+insensitive substring match on each episode's columns, one dataframe at a time.
+
+The bitmap times include the counts for every facet value; the substring
+baseline only finds the matches, and its results are checked against the
+bitmaps' count.
+
+Usage:
+    python benchmarks/facets.py [--runs 1000]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)
+
+from utils.dataframes import get_episode_df
+from utils.episodes import get_datasets
+from utils.facets import get_facet_index
+from utils.schema import DATASETS
+
+# (label, facet filters, the grid-filter equivalent: column substrings that must all match, per episode table)
+QUERIES = [
+    (
+        'drops Revive DX',
+        {'drop': 'Revive DX'},
+        {dataset.table_name: [(dataset.facet_fields['drop'], 'Revive DX')] for dataset in DATASETS},
+    ),
+    (
+        'Mechanical, weak to Lightning',
+        {'type': 'Mechanical', 'weak': 'Lightning'},
+        {
+            'episode1': [(['Type'], 'Mechanical'), (['Weakness'], 'Lightning')],
+            'episode3': [(['Type'], 'Mechanical'), (['Weak to Element'], 'Lightning')],
+        },
+    ),
+    (
+        'Episode II, immune to Slow',
+        {'episode': 'ep2', 'status_immune': 'Slow'},
+        {'episode2': [(['Slow'], 'Immune')]},
+    ),
+]
+
+
+def substring_query(conditions):
+    """Count the enemies matching every condition, each one a substring that has to be in any of its columns."""
+    count = 0
+    for tab_id, dataset in get_datasets().items():
+        table_name = dataset.table_name
+        if table_name not in conditions:
+            continue
+        df = get_episode_df(tab_id)
+        mask = None
+        for columns, text in conditions[table_name]:
+            column_mask = None
+            for column in columns:
+                matches = df[column].astype('string').str.contains(text, case=False, regex=False, na=False)
+                column_mask = matches if column_mask is None else column_mask | matches
+            mask = column_mask if mask is None else mask & column_mask
+        count += int(mask.sum())
+    return count
+
+
+def median_microseconds(function, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time facet queries on the bitmap indexes against substring filters on dataframes.')
+    parser.add_argument('--runs', type=int, default=1000, help='Queries to time per case')
+    args = parser.parse_args()
+
+    index = get_facet_index()
+    print(f"Median of {args.runs} runs\n")
+    print(f"{'query':<32} {'matches':>8} {'bitmap us':>10} {'substring us':>13} {'speedup':>8}")
+    for label, filters, conditions in QUERIES:
+        result = index.query(filters)
+        # Text filters can't tell which of Episode II's damage percentages are weaknesses, so they miss its enemies; only report the difference
+        substring_count = substring_query(conditions)
+        bitmap_us = median_microseconds(lambda: index.query(filters, limit=100), args.runs)
+        substring_us = median_microseconds(lambda: substring_query(conditions), max(args.runs // 10, 1))
+        note = '' if substring_count == result.count else f"  (substring matched {substring_count})"
+        print(f"{label:<32} {result.count:>8} {bitmap_us:>10.1f} {substring_us:>13.1f} {substring_us / bitmap_us:>7.0f}x{note}")
+
+
+if __name__ == '__main__':
+    main()
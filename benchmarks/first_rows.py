@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Time to first row on a fresh page load, with and without the first episode
+inlined into the layout (INLINE_INITIAL_EPISODE).
+
+Each load replays the requests the Dash renderer makes before the grid has
+rows, against gunicorn on localhost:
+
+    1. GET the page (a deep link like /?ep=ep3&enemy=<uuid>)
+    2. GET /_dash-layout and /_dash-dependencies, which the renderer fetches in parallel
+    3. POST the tab's episode callback, unless the layout already had the rows
+
+Every round trip also pays --rtt milliseconds of simulated network latency,
+since that is what dominates on a slow mobile link. The JavaScript bundles are
+the same either way and aren't counted.
+
+Usage:
+    python benchmarks/first_rows.py [--loads 50] [--rtt 150] [--tab ep3]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.dash_requests import tab_switch_body
+from benchmarks.harness import episode_uuids, gunicorn, percentiles, post
+
+
+def get(url, headers=None):
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}), timeout=30) as response:
+        return response.read()
+
+
+def find_props(node, component_id):
+    """The props of the component with this id in a serialized layout, or None."""
+    if isinstance(node, dict):
+        if node.get('props', {}).get('id') == component_id:
+            return node['props']
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        props = find_props(child, component_id)
+        if props is not None:
+            return props
+    return None
+
+
+def has_rows(layout):
+    """Whether the layout already carries the first episode's rows, in any of the forms app.py can inline them."""
+    grid = find_props(layout, 'grid') or {}
+    return bool(grid.get('rowData') or (find_props(layout, 'episode-response') or {}).get('data') or (find_props(layout, 'grid-row-columns') or {}).get('data'))
+
+
+def load_page(base_url, page, tab_id, rtt):
+    """Replay one page load. Returns the seconds until the grid has rows, how many round trips it took, and whether the modal was open."""
+    started = time.perf_counter()
+    get(base_url + page)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        layout_future = pool.submit(get, f'{base_url}/_dash-layout', {'Referer': base_url + page})
+        pool.submit(get, f'{base_url}/_dash-dependencies').result()
+        layout = json.loads(layout_future.result())
+    round_trips = 2
+    if not has_rows(layout):
+        post(f'{base_url}/_dash-update-component', tab_switch_body(tab_id))
+        round_trips += 1
+    elapsed = time.perf_counter() - started + round_trips * rtt
+    return elapsed, round_trips, bool((find_props(layout, 'modal') or {}).get('is_open'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loads', type=int, default=50, help='Page loads to time per configuration')
+    parser.add_argument('--rtt', type=float, default=150, help='Simulated network round trip time in milliseconds')
+    parser.add_argument('--tab', default='ep3', help='The tab the deep link opens')
+    parser.add_argument('--port', type=int, default=8053)
+    args = parser.parse_args()
+
+    uuid = episode_uuids()[args.tab][0]
+    page = f'/?ep={args.tab}&enemy={uuid}'
+    print(f"Loading {page} {args.loads} times per configuration, with {args.rtt:.0f}ms per round trip\n")
+    print(f"{'configuration':<22} {'round trips':>11} {'p50 ms':>9} {'p90 ms':>9} {'modal open':>11}")
+    for name, inline in (('callback (before)', '0'), ('inlined (after)', '1')):
+        env = {'INLINE_INITIAL_EPISODE': inline, 'LOGURU_LEVEL': 'WARNING'}
+        # The episode callback's request body depends on the same settings as the server
+        os.environ.update(env)
+        with gunicorn(args.port, 1, env=env):
+            base_url = f'http://127.0.0.1:{args.port}'
+            load_page(base_url, page, args.tab, 0)  # Warm up
+            loads = [load_page(base_url, page, args.tab, args.rtt / 1000) for _ in range(args.loads)]
+        summary = percentiles([load[0] for load in loads])
+        print(f"{name:<22} {loads[0][1]:>11} {summary['p50']:>9.1f} {summary['p90']:>9.1f} {str(loads[0][2]):>11}")
+
+
+if __name__ == '__main__':
+    main()
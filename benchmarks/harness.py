@@ -0,0 +1,140 @@
+"""
+Helpers shared by the benchmark scripts: timing summaries, stored baselines,
+and running gunicorn on localhost.
+
+Baselines are plain JSON files in benchmarks/baselines/. They are only
+meaningful on the machine they were recorded on, so re-record them with
+--update-baseline after moving to new hardware.
+"""
+
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'baselines')
+
+
+def percentiles(samples):
+    """Summarize latencies (in seconds) as milliseconds: p50, p90, p99 and max."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {'count': 0, 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+
+    def at(fraction):
+        # Nearest-rank percentile, so small sample counts don't interpolate between runs
+        index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+        return ordered[index] * 1000
+
+    return {'count': len(ordered), 'p50': at(0.50), 'p90': at(0.90), 'p99': at(0.99), 'max': ordered[-1] * 1000}
+
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+def load_baseline(name):
+    """Read a stored baseline, or None if it hasn't been recorded yet."""
+    try:
+        with open(baseline_path(name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_baseline(name, results):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(baseline_path(name), 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare_to_baseline(results, baseline, latency_tolerance, size_tolerance, metric='p90', min_latency_ms=1.0):
+    """
+    Compare benchmark results to a baseline and list every regression.
+
+    Both are {case: {'p50': ms, 'p90': ms, 'p99': ms, 'bytes': n, ...}}. A case
+    regresses if its metric percentile is more than latency_tolerance times the baseline's, or
+    its response is more than size_tolerance times bigger. Latencies under
+    min_latency_ms are treated as min_latency_ms, so sub-millisecond jitter
+    doesn't fail a run. Cases missing from either side are skipped.
+    """
+    failures = []
+    for case, result in results.items():
+        if result.get('errors'):
+            failures.append(f"{case}: {result['errors']} failed requests")
+        expected = (baseline or {}).get(case)
+        if not expected:
+            continue
+        if metric in expected and max(result[metric], min_latency_ms) > max(expected[metric], min_latency_ms) * latency_tolerance:
+            failures.append(f"{case}: {metric} {result[metric]:.2f}ms vs baseline {expected[metric]:.2f}ms")
+        if expected.get('bytes') and result.get('bytes', 0) > expected['bytes'] * size_tolerance:
+            failures.append(f"{case}: {result['bytes']} bytes vs baseline {expected['bytes']} bytes")
+        if 'throughput' in expected and result.get('throughput', 0) * latency_tolerance < expected['throughput']:
+            failures.append(f"{case}: {result['throughput']:.1f} req/s vs baseline {expected['throughput']:.1f} req/s")
+    return failures
+
+
+def print_results(results, baseline=None, metric='p90'):
+    print(f"{'case':<28} {'count':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'bytes':>9} {'base ' + metric:>9}")
+    for case, result in results.items():
+        expected = (baseline or {}).get(case, {})
+        base = f"{expected[metric]:.2f}" if metric in expected else '-'
+        print(
+            f"{case:<28} {result['count']:>6} {result['p50']:>9.2f} {result['p90']:>9.2f} {result['p99']:>9.2f} "
+            f"{result['max']:>9.2f} {result.get('bytes', 0):>9} {base:>9}"
+        )
+
+
+def post(url, body, timeout=30):
+    """POST a JSON body and return the response bytes."""
+    request = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'), headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def wait_until_up(base_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/health', timeout=2):
+                return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError(f"gunicorn didn't come up at {base_url}")
+
+
+@contextlib.contextmanager
+def gunicorn(port, workers, env=None, threads=1):
+    """Run the app under gunicorn --preload on localhost for the duration of the block. Yields the master process."""
+    command = [sys.executable, '-m', 'gunicorn', '--preload', f'--workers={workers}', f'--threads={threads}', '-b', f'127.0.0.1:{port}', 'app:server']
+    master = subprocess.Popen(
+        command, cwd=REPO_ROOT, env=dict(os.environ, **(env or {})), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(f'http://127.0.0.1:{port}')
+        time.sleep(1)  # Give every worker time to finish booting
+        yield master
+    finally:
+        master.terminate()
+        master.wait(timeout=30)
+
+
+def episode_uuids():
+    """Every enemy's uuid, grouped by tab id, for row click scenarios."""
+    sys.path.insert(0, REPO_ROOT)
+    # DB_PATH honours DATABASE_PATH the same way the app under test does, so the uuids come from the database it serves
+    from utils.db import DB_PATH, connect_readonly
+    from utils.schema import read_datasets
+    conn = connect_readonly(DB_PATH)
+    try:
+        return {
+            dataset.tab_id: [row[0] for row in conn.execute(f"SELECT uuid FROM {dataset.table_name} ORDER BY rowid")]
+            for dataset in read_datasets(conn)
+        }
+    finally:
+        conn.close()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Load test the app under gunicorn on localhost with a scripted scenario.
+
+Each simulated user loops through the same session: switch to a tab, then
+click a few rows in it. The users run in parallel threads (--concurrency)
+for a fixed number of sessions each. Latency percentiles, response sizes,
+throughput and errors are reported per interaction.
+
+Results are compared to benchmarks/baselines/load_test.json, and the script
+exits non-zero if any interaction regressed or any request failed. Record a
+new baseline with --update-baseline. Pass --url to test an instance that is
+already running instead of starting gunicorn.
+
+Usage:
+    python benchmarks/load_test.py [--concurrency 8] [--sessions 25] [--clicks 3] [--workers 4] [--update-baseline]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.dash_requests import cell_click_body, tab_switch_body
+from benchmarks.harness import compare_to_baseline, episode_uuids, gunicorn, load_baseline, percentiles, post, print_results, write_baseline
+
+BASELINE = 'load_test'
+
+
+def run_scenario(base_url, concurrency, sessions, clicks, uuids_by_tab, seed):
+    """Run every simulated user and collect (interaction, seconds, bytes, ok) samples."""
+    samples = []
+    lock = threading.Lock()
+    url = f'{base_url}/_dash-update-component'
+
+    def timed(interaction, body):
+        started = time.perf_counter()
+        try:
+            size, ok = len(post(url, body)), True
+        except OSError:
+            size, ok = 0, False
+        with lock:
+            samples.append((interaction, time.perf_counter() - started, size, ok))
+
+    def user(index):
+        # Each user gets its own seeded generator so runs are repeatable
+        rng = random.Random(seed + index)
+        for _ in range(sessions):
+            tab_id = rng.choice(list(uuids_by_tab))
+            timed('tab_switch', tab_switch_body(tab_id))
+            for uuid in rng.sample(uuids_by_tab[tab_id], min(clicks, len(uuids_by_tab[tab_id]))):
+                timed('row_click', cell_click_body(uuid))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(user, range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    results = {}
+    for interaction in sorted({sample[0] for sample in samples}):
+        matching = [sample for sample in samples if sample[0] == interaction]
+        ok = [sample for sample in matching if sample[3]]
+        results[interaction] = dict(
+            percentiles([sample[1] for sample in ok]),
+            bytes=max((sample[2] for sample in ok), default=0),
+            errors=len(matching) - len(ok),
+            throughput=len(ok) / elapsed,
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=8, help='Simulated users running at once')
+    parser.add_argument('--sessions', type=int, default=25, help='Tab switches per user')
+    parser.add_argument('--clicks', type=int, default=3, help='Row clicks after each tab switch')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('--port', type=int, default=8052)
+    parser.add_argument('--url', help='Test an already running instance instead of starting gunicorn')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--metric', choices=('p50', 'p90', 'p99'), default='p90', help='Which percentile is checked against the baseline')
+    parser.add_argument('--latency-tolerance', type=float, default=1.5, help='Fail if the checked percentile is this many times the baseline, or throughput this many times lower')
+    parser.add_argument('--size-tolerance', type=float, default=1.05, help='Fail if a response is this many times bigger than the baseline')
+    parser.add_argument('--update-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    # Grouped by tab so clicks only go to rows that are on screen
+    uuids_by_tab = episode_uuids()
+
+    def run(base_url):
+        return run_scenario(base_url, args.concurrency, args.sessions, args.clicks, uuids_by_tab, args.seed)
+
+    if args.url:
+        samples, elapsed = run(args.url.rstrip('/'))
+    else:
+        with gunicorn(args.port, args.workers, env={'LOGURU_LEVEL': 'WARNING'}):
+            samples, elapsed = run(f'http://127.0.0.1:{args.port}')
+
+    results = summarize(samples, elapsed)
+    baseline = load_baseline(BASELINE)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results, baseline, args.metric)
+        for interaction, result in results.items():
+            print(f"{interaction}: {result['throughput']:.1f} req/s, {result['errors']} errors")
+        print(f"{len(samples)} requests from {args.concurrency} users in {elapsed:.2f}s")
+
+    if args.update_baseline:
+        write_baseline(BASELINE, results)
+        print(f"Baseline written to benchmarks/baselines/{BASELINE}.json")
+        return
+    failures = compare_to_baseline(results, baseline, args.latency_tolerance, args.size_tolerance, args.metric)
+    if baseline is None:
+        print("No baseline recorded yet; run with --update-baseline to store one")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Check that a worker's memory stays flat as the number of datasets grows.
+
+This builds scratch copies of assets/xenosaga.db with --datasets tables
+registered in the datasets table. Each one is a copy of one of the episodes.
+For every size and DATASET_MEMORY_BUDGET it starts a fresh interpreter that
+imports app and loads the page, which lists every dataset as a tab. It then
+switches to every tab once, the way a crawler would. It reports the worker's
+resident memory before and after the tab switches, and the dataset cache's
+loads and evictions.
+
+The children read straight from SQLite (DATA_BACKEND=sqlite), since the
+scratch databases have no columnar copy.
+
+Usage:
+    python benchmarks/registry.py [--datasets 3 30 150] [--budgets 0 16]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from utils.db import DB_PATH
+from utils.schema import DATASETS, SCHEMA_TABLE, read_datasets, write_datasets
+
+# Runs in the child process; prints its memory and the dataset cache's stats
+CHILD = """
+import json, time
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmRSS:')) / 1024
+
+import app
+from benchmarks.dash_requests import tab_switch_body
+from utils.episodes import get_dataset_cache_stats, get_datasets
+client = app.server.test_client()
+started = time.perf_counter()
+assert client.get('/').status_code == 200
+layout = time.perf_counter() - started
+before = rss_mb()
+started = time.perf_counter()
+for tab_id in get_datasets():
+    assert client.post('/_dash-update-component', json=tab_switch_body(tab_id)).status_code == 200
+print(json.dumps({
+    'layout': layout,
+    'tab_switches': time.perf_counter() - started,
+    'rss_before': before,
+    'rss_after': rss_mb(),
+    **get_dataset_cache_stats(),
+}))
+"""
+
+
+def build_database(path, count):
+    """Copy xenosaga.db and register this many datasets in it, copying the episode tables round robin."""
+    shutil.copyfile(DB_PATH, path)
+    conn = sqlite3.connect(path)
+    try:
+        datasets = list(DATASETS)
+        for index in range(len(DATASETS), count):
+            source = DATASETS[index % len(DATASETS)]
+            table_name = f'{source.table_name}_copy{index}'
+            conn.execute(f"CREATE TABLE {table_name} AS SELECT * FROM {source.table_name}")
+            conn.execute(
+                f"INSERT INTO {SCHEMA_TABLE} (table_name, column_name, position, kind) "
+                f"SELECT ?, column_name, position, kind FROM {SCHEMA_TABLE} WHERE table_name = ?",
+                (table_name, source.table_name),
+            )
+            datasets.append(source._replace(tab_id=f'copy{index}', table_name=table_name, label=f'{source.label} ({index})'))
+        write_datasets(conn, datasets[:count])
+        conn.commit()
+        return len(read_datasets(conn))
+    finally:
+        conn.close()
+
+
+def run_child(db_path, budget):
+    env = dict(os.environ, DATABASE_PATH=db_path, DATA_BACKEND='sqlite', DATASET_MEMORY_BUDGET=str(budget), LOGURU_LEVEL='WARNING')
+    result = subprocess.run([sys.executable, '-c', CHILD], cwd=REPO_ROOT, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"Child failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure worker memory with more and more datasets, with and without a memory budget.')
+    parser.add_argument('--datasets', type=int, nargs='+', default=[3, 30, 150], help='How many datasets to register')
+    parser.add_argument('--budgets', type=float, nargs='+', default=[0, 16], help='DATASET_MEMORY_BUDGET values (MB) to run with, 0 for no limit')
+    args = parser.parse_args()
+
+    print(f"{'datasets':>8} {'budget MB':>9} {'layout ms':>9} {'switches s':>10} {'RSS before':>10} {'RSS after':>9} {'loads':>6} {'evictions':>9} {'cached MB':>9}")
+    with tempfile.TemporaryDirectory() as scratch:
+        for count in args.datasets:
+            db_path = os.path.join(scratch, f'xenosaga-{count}.db')
+            registered = build_database(db_path, count)
+            for budget in args.budgets:
+                result = run_child(db_path, budget)
+                print(
+                    f"{registered:>8} {budget or 'none':>9} {result['layout'] * 1000:>9.0f} {result['tab_switches']:>10.2f} "
+                    f"{result['rss_before']:>10.0f} {result['rss_after']:>9.0f} {result['misses']:>6} {result['evictions']:>9} {result['bytes'] / 1e6:>9.1f}"
+                )
+
+
+if __name__ == '__main__':
+    main()
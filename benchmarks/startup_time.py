@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Check that a fresh worker can answer its first request within a time budget.
+
+This runs a new interpreter that imports app, then serves one tab switch and
+one row click through the Flask test client. It measures the wall time from
+process start to the first response. It also reports the slowest imports (via
+python -X importtime) and whether pandas was imported on the way. The script
+exits non-zero if the time is over budget, or if pandas got imported while
+serving.
+
+Usage:
+    python benchmarks/startup_time.py [--budget 3.0] [--runs 3] [--top 15]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process; prints how long the import and the first requests took
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+from benchmarks.dash_requests import cell_click_body, tab_switch_body
+from utils.episodes import read_episode_rows
+client = app.server.test_client()
+assert client.post('/_dash-update-component', json=tab_switch_body('ep1')).status_code == 200
+first_response = time.perf_counter()
+uuid = read_episode_rows('ep1')[1][0]['uuid']
+assert client.post('/_dash-update-component', json=cell_click_body(uuid)).status_code == 200
+print(json.dumps({
+    'import': imported - started,
+    'first_response': first_response - started,
+    'first_click': time.perf_counter() - first_response,
+    'pandas_imported': 'pandas' in sys.modules,
+}))
+"""
+
+
+def run_once(importtime=False):
+    """Start a fresh interpreter and time it. Returns the wall time, the child's timings, and stderr."""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True, env=dict(os.environ, LOGURU_LEVEL='WARNING'))
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup check failed:\n{result.stderr}")
+    return wall, json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(importtime_output, top):
+    """Parse python -X importtime output into the modules app imports directly, slowest first (cumulative time)."""
+    totals = {}
+    for line in importtime_output.splitlines():
+        match = re.match(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\| (\s*)(\S+)', line)
+        # Nested imports are indented two spaces per level; keep the top level and one below it
+        if match and len(match.group(3)) <= 2:
+            totals[match.group(4)] = totals.get(match.group(4), 0) + int(match.group(2))
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=3.0, help='Maximum seconds from process start to the first response')
+    parser.add_argument('--runs', type=int, default=3, help='How many fresh processes to time (the best run is checked)')
+    parser.add_argument('--top', type=int, default=15, help='How many of the slowest imports to list')
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    best_wall, best, _ = min(runs, key=lambda run: run[0])
+    _, _, importtime_output = run_once(importtime=True)
+
+    print("Slowest imports (cumulative):")
+    for module, microseconds in slowest_imports(importtime_output, args.top):
+        print(f"  {microseconds / 1000:8.1f} ms  {module}")
+    print()
+    print(f"import app:            {best['import']:.3f}s")
+    print(f"first response:        {best['first_response']:.3f}s after the interpreter started importing app")
+    print(f"first row click:       {best['first_click'] * 1000:.1f}ms")
+    print(f"process start to first response: {best_wall:.3f}s (best of {args.runs}, budget {args.budget:.3f}s)")
+    print(f"pandas imported:       {best['pandas_imported']}")
+
+    failures = []
+    if best_wall > args.budget:
+        failures.append(f"time to first response {best_wall:.3f}s is over the {args.budget:.3f}s budget")
+    if best['pandas_imported']:
+        failures.append("pandas was imported while serving requests")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
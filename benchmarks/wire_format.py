@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Compare the two rowData wire formats for every episode: 'rows' (the list of
+dicts the grid takes, as to_dict('records') would give) and 'columns' (one
+array per column with categories dictionary encoded, see
+utils/payloads.build_row_columns).
+
+For each episode it reports the body size uncompressed, gzipped and brotli
+compressed, and how long the browser takes to get
+from the body to row objects. That's JSON.parse for 'rows', and JSON.parse
+plus expandRowColumns from assets/clientside.js for 'columns', timed in node.
+Without node, the script falls back to timing json.loads in Python and says so.
+
+Usage:
+    python benchmarks/wire_format.py [--runs 200]
+"""
+
+import argparse
+import brotli
+import gzip
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)
+
+from utils.episodes import get_datasets
+from utils.payloads import get_grid_payload
+
+# Runs in node: loads assets/clientside.js and times turning each body into row objects
+NODE_SCRIPT = """
+global.window = {};
+require(process.argv[1]);
+const expandRowColumns = window.dash_clientside.xenosaga.expandRowColumns;
+const bodies = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+const runs = Number(process.argv[2]);
+function median(parse) {
+    const samples = [];
+    for (let i = 0; i < runs; i++) {
+        const started = process.hrtime.bigint();
+        parse();
+        samples.push(Number(process.hrtime.bigint() - started) / 1e6);
+    }
+    samples.sort((a, b) => a - b);
+    return samples[Math.floor(samples.length / 2)];
+}
+const results = {};
+for (const [tab, body] of Object.entries(bodies)) {
+    // Check the expanded rows match before timing anything
+    if (JSON.stringify(expandRowColumns(JSON.parse(body.columns))) !== JSON.stringify(JSON.parse(body.rows))) {
+        throw new Error(`${tab}: the expanded rows don't match rowData`);
+    }
+    results[tab] = {
+        rows: median(() => JSON.parse(body.rows)),
+        columns: median(() => expandRowColumns(JSON.parse(body.columns))),
+    };
+}
+console.log(JSON.stringify(results));
+"""
+
+
+def sizes(body):
+    """The body's size in bytes uncompressed and in every encoding we can serve."""
+    return {
+        'raw': len(body),
+        'gzip': len(gzip.compress(body, compresslevel=9, mtime=0)),
+        'br': len(brotli.compress(body, quality=11)),
+    }
+
+
+def node_parse_times(bodies, runs):
+    """Median milliseconds to get row objects from each body in node, or None without node."""
+    node = shutil.which('node')
+    if node is None:
+        return None
+    script = os.path.join(REPO_ROOT, 'assets', 'clientside.js')
+    payload = json.dumps({tab: {name: body.decode('utf-8') for name, body in formats.items()} for tab, formats in bodies.items()})
+    result = subprocess.run([node, '-e', NODE_SCRIPT, script, str(runs)], input=payload, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def python_parse_times(bodies, runs):
+    """Median milliseconds for json.loads alone, as a rough stand-in when node isn't installed."""
+    results = {}
+    for tab, formats in bodies.items():
+        results[tab] = {}
+        for name, body in formats.items():
+            samples = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                json.loads(body)
+                samples.append((time.perf_counter() - started) * 1000)
+            results[tab][name] = statistics.median(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the 'rows' and 'columns' rowData wire formats.")
+    parser.add_argument('--runs', type=int, default=200, help='Parses to time per episode and format')
+    args = parser.parse_args()
+
+    bodies = {}
+    for tab_id in get_datasets():
+        payload = get_grid_payload(tab_id)
+        bodies[tab_id] = {'rows': payload.row_data_json, 'columns': payload.row_columns_json}
+
+    parse_times = node_parse_times(bodies, args.runs)
+    parser_name = 'node JSON.parse (+ expandRowColumns)'
+    if parse_times is None:
+        parse_times = python_parse_times(bodies, args.runs)
+        parser_name = 'Python json.loads (node not found, no expansion)'
+
+    encodings = list(sizes(b'').keys())
+    header = f"{'episode':<8} {'format':<8} " + ' '.join(f"{encoding + ' bytes':>11}" for encoding in encodings) + f" {'parse ms':>9}"
+    print(f"Parse time: median of {args.runs} runs with {parser_name}\n")
+    print(header)
+    for tab_id, formats in bodies.items():
+        for name, body in formats.items():
+            body_sizes = sizes(body)
+            print(f"{tab_id:<8} {name:<8} " + ' '.join(f"{body_sizes[encoding]:>11}" for encoding in encodings) + f" {parse_times[tab_id][name]:>9.3f}")
+        rows_sizes, columns_sizes = sizes(formats['rows']), sizes(formats['columns'])
+        savings = ' '.join(f"{1 - columns_sizes[encoding] / rows_sizes[encoding]:>11.0%}" for encoding in encodings)
+        print(f"{tab_id:<8} {'saved':<8} {savings}")
+
+
+if __name__ == '__main__':
+    main()
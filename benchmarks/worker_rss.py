@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Measure per-worker memory under gunicorn --preload for each data backend.
+
+This starts gunicorn on localhost once per backend (DATA_BACKEND=sqlite, then
+DATA_BACKEND=columnar), reads every worker's RSS, PSS and private memory from
+/proc/<pid>/smaps_rollup, sends a round of tab switches and row clicks, and
+reads them again. PSS and private memory are the numbers to compare: memory
+still shared copy-on-write with the master shows up in RSS but not in those.
+
+Linux only, since it relies on /proc.
+
+Usage:
+    python benchmarks/worker_rss.py [--workers 4] [--rounds 50] [--port 8051]
+"""
+
+import argparse
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.dash_requests import cell_click_body, tab_switch_body
+from benchmarks.harness import episode_uuids, gunicorn, post
+
+
+def worker_pids(master_pid):
+    """Return the pids of the gunicorn workers forked from the master."""
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def memory_kb(pid):
+    """Read Rss, Pss and private memory (in kB) for a process."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def summarize(pids):
+    samples = [memory_kb(pid) for pid in pids]
+    return {key: sum(sample[key] for sample in samples) / len(samples) for key in ('rss', 'pss', 'private')}
+
+
+def measure(backend, workers, rounds, port, uuids):
+    base_url = f'http://127.0.0.1:{port}'
+    with gunicorn(port, workers, env={'DATA_BACKEND': backend}) as master:
+        pids = worker_pids(master.pid)
+        before = summarize(pids)
+        # Enough requests that every worker serves some of them
+        for i in range(rounds * workers):
+            post(f'{base_url}/_dash-update-component', tab_switch_body(('ep1', 'ep2', 'ep3')[i % 3]))
+            post(f'{base_url}/_dash-update-component', cell_click_body(uuids[i % len(uuids)]))
+        after = summarize(pids)
+        return before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=50, help='Tab switches and row clicks per worker')
+    parser.add_argument('--port', type=int, default=8051)
+    args = parser.parse_args()
+
+    uuids = [uuid for tab_uuids in episode_uuids().values() for uuid in tab_uuids]
+
+    print(f"{'backend':<10} {'when':<7} {'rss kB':>10} {'pss kB':>10} {'private kB':>11}   (average per worker, {args.workers} workers)")
+    for backend in ('sqlite', 'columnar'):
+        before, after = measure(backend, args.workers, args.rounds, args.port, uuids)
+        for when, sample in (('before', before), ('after', after)):
+            print(f"{backend:<10} {when:<7} {sample['rss']:>10.0f} {sample['pss']:>10.0f} {sample['private']:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -25,17 +25,130 @@ title_card = dbc.Card(
   body = True
 )
 
-# Create a modal to display the selected enemy stats
-# The modal will be populated by the callback
-modal = dbc.Modal(
+# A search box that looks through every episode at once
+# The results are filled in by a callback and open the same modal as clicking a row
+search_bar = html.Div(
   [
-    dbc.ModalHeader(id="modal-header"),
-    dbc.ModalBody(id="modal-content"),
-    dbc.ModalFooter(
-        dbc.Button("Close", id="close", className="ml-auto", n_clicks=0)
+    dbc.Input(
+      id="search-input",
+      type="search",
+      placeholder="Search all episodes by name, drop, type or element...",
+      debounce=True,
     ),
+    html.Div(id="search-results"),
   ],
-  id="modal",
-  is_open=False,
-  scrollable=True,
-)
\ No newline at end of file
+  style={"margin": "10px 0px"},
+)
+
+def build_search_results(hits, episode_labels):
+  """
+  Build the list of search hits shown under the search box.
+
+  Args:
+    hits (list): The hits returned by utils.search.search(), with a 'tab_id' added to each one.
+    episode_labels (dict): Tab id to tab label mapping.
+
+  Returns:
+    The list of hits, or a short message if nothing matched.
+  """
+  if not hits:
+    return html.P("No enemies found.", className="text-muted", style={"margin": "5px 0px 0px 0px"})
+  return dbc.ListGroup(
+    [
+      dbc.ListGroupItem(
+        [
+          html.B(hit['name']),
+          html.Span(f" {episode_labels.get(hit['tab_id'], '')}", className="text-muted"),
+          html.Span(f" (matched {hit['matched']})", className="text-muted") if hit['matched'] != 'name' else None,
+        ],
+        id={"type": "search-result", "uuid": hit['uuid']},
+        action=True,
+        n_clicks=0,
+      )
+      for hit in hits
+    ],
+    style={"marginTop": "5px", "maxHeight": "40vh", "overflowY": "auto"},
+  )
+
+def build_modal(header=None, body=None):
+  """
+  Create the modal that displays the selected enemy's stats.
+  It's normally empty and populated by the callback, but a deep link to an enemy renders it already open.
+
+  Args:
+    header: The modal header's children, or None for a closed, empty modal.
+    body: The modal body's children.
+
+  Returns:
+    dbc.Modal: The modal.
+  """
+  return dbc.Modal(
+    [
+      dbc.ModalHeader(header, id="modal-header"),
+      dbc.ModalBody(body, id="modal-content"),
+      dbc.ModalFooter(
+          dbc.Button("Close", id="close", className="ml-auto", n_clicks=0)
+      ),
+    ],
+    id="modal",
+    is_open=header is not None,
+    scrollable=True,
+  )
+
+def format_value(value):
+  """Format the value for display. If the value is a number, format it with commas. Otherwise, return the value as is."""
+  if value is None or value == '':
+    return 'N/A'
+  try:
+    numeric_value = float(value)
+    if numeric_value.is_integer():
+      return f"{int(numeric_value):,}"
+    return f"{numeric_value:,}"
+  except (ValueError, TypeError):
+    return value
+
+def apply_element_style(text):
+  """Colorize the text based on the element. Preserves spaces and commas."""
+  color_styles = {
+    "Lightning": "yellow",
+    "Fire": "red",
+    "Ice": "lightblue",
+    "Yes": "green",
+    "No": "red",
+    "Cannot": "red",
+  }
+  parts = text.split(", ")
+  spans = []
+  for i, part in enumerate(parts):
+    color = color_styles.get(part, None)
+    if color:
+      spans.append(html.Span(part, style={'color': color}))
+    else:
+      spans.append(html.Span(part))
+    if i < len(parts) - 1:
+      spans.append(", ")
+  return spans
+
+def build_modal_content(row, hidden_columns=()):
+  """
+  Build the modal header and body for a single enemy.
+
+  Args:
+    row (dict): The enemy's row, with missing values as None.
+    hidden_columns (Iterable[str]): Columns to leave out of the body.
+
+  Returns:
+    tuple: The modal header (the enemy's name) and the modal body (the rest of the stats).
+  """
+  # The name is displayed in the modal header, so leave it (and the uuid) out of the body
+  content = []
+  for key, value in row.items():
+    if key in ("Name", "uuid") or key in hidden_columns:
+      continue
+    if isinstance(value, str):
+      spans = apply_element_style(value)
+      content.append(html.Div([html.B(f"{key}: "), *spans], style={'margin-bottom': '10px'}))
+    else:
+      content.append(html.Div([html.B(f"{key}: "), html.Span(f"{format_value(value) if value is not None else 'N/A'}")], style={'margin-bottom': '10px'}))
+
+  return html.H4(row['Name']), html.Div(content, className="modal-content-wrapper")
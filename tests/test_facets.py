@@ -0,0 +1,157 @@
+"""
+utils/facets.py's classification rules, on a few real rows from each episode: how cells split into values, how
+Episode II's damage percentages turn into weak/strong/absorbs/immune, the Thunder -> Lightning alias, and drop rates
+being stripped off item names.
+
+Usage:
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Copied from assets/json, trimmed to the columns the facets read
+ATTACK_DRONE = {
+    'Name': 'Attack Drone', 'Normal Drop': 'N/A', 'Rare Drop': 'N/A', 'Type': 'Mechanical', 'Weakness': 'Lightning',
+    'uuid': '3c002cc9-5f08-4b6b-9b62-a4ba3c122e25',
+}
+GRISLY = {
+    'Name': '0-78 Grisly', 'Beam': '150', 'Aura': '100', 'Thunder': '200', 'Fire': '75', 'Ice': '75', 'Pierce': '100',
+    'Slash': '100', 'Hit': '120', 'Physical': 'Normal', 'Ether': 'Weak', 'Slow': '10', 'Blind': '10', 'Heavy': '10',
+    'Weak': '10', 'EthPD': '25', 'EthDD': '25', 'Junk': '30', 'ResDw': '0', 'Lost': '0', 'Curse': '0',
+    'Enemy type': 'Mechanical', 'Item': 'Scrap Iron (50%)', 'Rare Item': 'N/A', 'uuid': '0f4623ad-b0c7-4b43-8dff-1528040e5e6e',
+}
+DELPHINUS = {
+    'Name': '0-88 Delphinus', 'Beam': '-100', 'Aura': '150', 'Thunder': '-100', 'Fire': '-100', 'Ice': '100',
+    'Pierce': '100', 'Slash': '150', 'Hit': '100', 'Physical': 'Weak', 'Ether': 'Normal', 'Slow': None, 'Blind': '85',
+    'Heavy': '60', 'Weak': '60', 'EthPD': '85', 'EthDD': '85', 'Junk': '95', 'ResDw': None, 'Lost': None, 'Curse': None,
+    'Enemy type': 'Mechanical', 'Item': 'Junked Circuit (100%)', 'Rare Item': 'G Power Charge (5%)',
+    'uuid': '4cf636bc-a158-448d-87d5-97a3f488d706',
+}
+DULLEA_SOUL = {
+    'Name': 'Dullea Soul', 'Beam': '50', 'Aura': '100', 'Thunder': '75', 'Fire': '-100', 'Ice': '200', 'Pierce': '150',
+    'Slash': '75', 'Hit': '75', 'Physical': 'Normal', 'Ether': 'Normal', 'Slow': '85', 'Blind': '90', 'Heavy': '90',
+    'Weak': '90', 'EthPD': '90', 'EthDD': '90', 'Junk': 'Immune', 'ResDw': '80', 'Lost': 'Immune', 'Curse': '40',
+    'Enemy type': 'Gnosis', 'Item': 'Skill Upgrade E (100%)', 'Rare Item': 'N/A', 'uuid': '48ebf7d6-ffb8-48e8-ad25-34f8c7aa9c7e',
+}
+AG_03 = {
+    'Name': 'AG-03', 'Normal Drop': 'Ether Core', 'Rare Drop': 'Skill Upgrade B', 'Stealable Item': 'N/A',
+    'Type': 'Mechanical', 'Absorbs Element': 'N/A', 'Weak to Element': 'Fire, Lightning', 'Strong Against Element': 'Ice',
+    'Not Affected by Element': 'N/A', 'uuid': 'e36c8820-b8c5-444e-aee2-881614304dca',
+}
+
+
+def setUpModule():
+    # utils.db reads DATABASE_PATH when it's first imported, and test_snapshot_reload points that at a scratch copy
+    # Importing utils.facets (which imports utils.db) here instead of at the top leaves that to whichever module needs it
+    global DATASETS, FacetIndex, _resistance_facet, build_bitmaps, row_facets, tokenize
+    from utils.facets import FacetIndex, _resistance_facet, build_bitmaps, row_facets, tokenize
+    from utils.schema import DATASETS
+    DATASETS = {dataset.tab_id: dataset for dataset in DATASETS}
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_tokenize(self):
+        cases = [
+            # Drops are always one item, with Episode II's drop rate stripped off
+            ('drop', 'Scrap Iron (50%)', ['Scrap Iron']),
+            ('drop', 'G Power Charge (5%)', ['G Power Charge']),
+            ('drop', 'Potion (12.5%)', ['Potion']),
+            ('drop', 'Skill Upgrade B', ['Skill Upgrade B']),
+            ('drop', 'Cure, Dispel (100%)', ['Cure, Dispel']),
+            # Lists split on commas and slashes, with asterisks around notes dropped
+            ('weak', 'Fire, Lightning', ['Fire', 'Lightning']),
+            ('weak', 'Spirit / Slash', ['Spirit', 'Slash']),
+            ('weak', '*Changes*', ['Changes']),
+            # Episode II's Thunder lines up with the other episodes' Lightning
+            ('weak', 'Thunder', ['Lightning']),
+            ('strong', 'Ice/Thunder', ['Ice', 'Lightning']),
+            # Missing values
+            ('drop', 'N/A', []),
+            ('type', '', []),
+            ('type', '  ', []),
+            ('type', None, []),
+        ]
+        for facet, value, expected in cases:
+            with self.subTest(facet=facet, value=value):
+                self.assertEqual(tokenize(facet, value), expected)
+
+    def test_resistance_thresholds(self):
+        cases = [
+            ('200', 'weak'),
+            ('101', 'weak'),
+            ('100', None),
+            ('100.0', None),
+            ('99', 'strong'),
+            ('50', 'strong'),
+            ('1', 'strong'),
+            ('0', 'immune'),
+            ('-100', 'absorbs'),
+            ('-1', 'absorbs'),
+            (150, 'weak'),
+            # Physical and Ether are words rather than percentages
+            ('Weak', 'weak'),
+            (' strong ', 'strong'),
+            ('Normal', None),
+            ('Immune', None),
+            ('N/A', None),
+            ('', None),
+            (None, None),
+        ]
+        for value, expected in cases:
+            with self.subTest(value=value):
+                self.assertEqual(_resistance_facet(value), expected)
+
+
+class RowFacetsTest(unittest.TestCase):
+    def test_real_rows(self):
+        cases = [
+            ('ep1', ATTACK_DRONE, {('type', 'Mechanical'), ('weak', 'Lightning')}),
+            ('ep2', GRISLY, {
+                ('type', 'Mechanical'), ('drop', 'Scrap Iron'),
+                ('weak', 'Beam'), ('weak', 'Lightning'), ('weak', 'Hit'), ('weak', 'Ether'),
+                ('strong', 'Fire'), ('strong', 'Ice'),
+            }),
+            ('ep2', DELPHINUS, {
+                ('type', 'Mechanical'), ('drop', 'Junked Circuit'), ('drop', 'G Power Charge'),
+                ('absorbs', 'Beam'), ('absorbs', 'Lightning'), ('absorbs', 'Fire'),
+                ('weak', 'Aura'), ('weak', 'Slash'), ('weak', 'Physical'),
+            }),
+            ('ep2', DULLEA_SOUL, {
+                ('type', 'Gnosis'), ('drop', 'Skill Upgrade E'),
+                ('strong', 'Beam'), ('strong', 'Lightning'), ('strong', 'Slash'), ('strong', 'Hit'),
+                ('absorbs', 'Fire'), ('weak', 'Ice'), ('weak', 'Pierce'),
+                ('status_immune', 'Junk'), ('status_immune', 'Lost'),
+            }),
+            ('ep3', AG_03, {
+                ('type', 'Mechanical'), ('drop', 'Ether Core'), ('drop', 'Skill Upgrade B'),
+                ('weak', 'Fire'), ('weak', 'Lightning'), ('strong', 'Ice'),
+            }),
+        ]
+        for tab_id, row, expected in cases:
+            with self.subTest(name=row['Name']):
+                self.assertEqual(set(row_facets(DATASETS[tab_id], row)), expected)
+
+    def test_index_across_episodes(self):
+        tables = [(DATASETS['ep1'], [ATTACK_DRONE]), (DATASETS['ep2'], [GRISLY, DELPHINUS, DULLEA_SOUL]), (DATASETS['ep3'], [AG_03])]
+        index = FacetIndex(*build_bitmaps(tables))
+        names = lambda filters: [hit['name'] for hit in index.query(filters).hits]
+        # Thunder in Episode II is matched as Lightning, and values are matched case-insensitively
+        self.assertEqual(names({'weak': 'lightning'}), ['Attack Drone', '0-78 Grisly', 'AG-03'])
+        self.assertEqual(names({'type': 'Mechanical', 'absorbs': 'Lightning'}), ['0-88 Delphinus'])
+        self.assertEqual(names({'drop': 'G Power Charge'}), ['0-88 Delphinus'])
+        self.assertEqual(names({'episode': 'ep2', 'status_immune': ['Junk', 'Slow']}), ['Dullea Soul'])
+        self.assertEqual(index.query({'type': 'Mechanical'}).counts['episode'], {'ep1': 1, 'ep2': 2, 'ep3': 1})
+
+    def test_unknown_facet_field(self):
+        dataset = DATASETS['ep1']._replace(facet_fields={'colour': ['Type']})
+        with self.assertRaises(ValueError):
+            build_bitmaps([(dataset, [ATTACK_DRONE])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+webscraping/faq_parser.py on small FAQ snippets: every value stays with its own enemy and on its own line, and broken
+blocks are kept apart instead of shifting the ones after them.
+
+Usage:
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'webscraping'))
+
+from faq_parser import Field, compile_fields, labelled, name_headless_blocks, parse_blocks, to_frame
+
+# Laid out like the Episode I FAQ, with Windows line endings
+EPISODE1_TEXT = (
+    "Enemies\r\n"
+    "Name: Gnosis Goblin\r\n"
+    "HP: 120\r\n"
+    "EP:\r\n"
+    "DEEP: not a stat\r\n"
+    "Item: Medical Kit S\r\n"
+    "\r\n"
+    "Name: Cherubim\r\n"
+    "HP: 4,000\r\n"
+    "EP: 12\r\n"
+    "Item:\r\n"
+    "\r\n"
+    "Name: Red Dragon\r\n"
+    "EP: 30\r\n"
+    "Item: Ether Pack\r\n"
+)
+
+EPISODE1_FIELDS = [
+    Field('Name', labelled('Name')),
+    Field('HP', labelled('HP')),
+    Field('EP', labelled('EP')),
+    Field('Normal Drop', labelled('Item')),
+]
+
+# Laid out like the Episode III FAQ: a dotted header per enemy, and one of them too short to match
+HEADER = r'\.{18,}([^\r\n]+)\.{12}\r\n'
+EPISODE3_TEXT = (
+    "....................61 Yuriev Soldier...................\r\n"
+    "HP: 900 | Exp: 10 |\r\n"
+    "\r\n"
+    ".......63 Yuriev Soldier A.......\r\n"
+    "HP: 950 | Exp: 12 |\r\n"
+    "\r\n"
+    "....................64 Yuriev Soldier B...................\r\n"
+    "HP: 1,000 | Exp: N/A |\r\n"
+)
+
+EPISODE3_FIELDS = [
+    Field('Name', HEADER),
+    Field('HP', labelled('HP', r'[\d,]+', r'[ \t]*', r'[^|\r\n]*')),
+    Field('EXP', labelled('Exp', r'[^|\s]+', r'[ \t]*', r'[^|\r\n]*')),
+]
+
+
+class ParseBlocksTest(unittest.TestCase):
+    def test_values_stay_with_their_enemy(self):
+        blocks = parse_blocks(EPISODE1_TEXT, EPISODE1_FIELDS, start='Name')
+        self.assertEqual([block.line for block in blocks], [2, 8, 13])
+        self.assertEqual(blocks[1].values, {'Name': 'Cherubim', 'HP': '4,000', 'EP': '12', 'Normal Drop': ''})
+
+    def test_empty_value_does_not_take_the_next_line(self):
+        blocks = parse_blocks(EPISODE1_TEXT, EPISODE1_FIELDS, start='Name')
+        # "EP:" is empty, so neither "DEEP: not a stat" nor the "Item:" line after it can end up in EP
+        self.assertEqual(blocks[0].values, {'Name': 'Gnosis Goblin', 'HP': '120', 'EP': '', 'Normal Drop': 'Medical Kit S'})
+
+    def test_incomplete_blocks_are_skipped(self):
+        blocks = parse_blocks(EPISODE1_TEXT, EPISODE1_FIELDS, start='Name')
+        df = to_frame(blocks, EPISODE1_FIELDS)
+        self.assertEqual(df['Name'].tolist(), ['Gnosis Goblin', 'Cherubim'])
+        with self.assertRaises(ValueError):
+            to_frame(blocks, EPISODE1_FIELDS, strict=True)
+
+    def test_unmatched_header_opens_a_block_of_its_own(self):
+        blocks = parse_blocks(EPISODE3_TEXT, EPISODE3_FIELDS, start='Name')
+        self.assertEqual(len(blocks), 3)
+        self.assertEqual(blocks[1].values, {'HP': '950', 'EXP': '12'})
+        # The header pattern leaves the extra periods on the name, for the episode script to strip
+        self.assertEqual(blocks[2].values, {'Name': '64 Yuriev Soldier B.......', 'HP': '1,000', 'EXP': 'N/A'})
+
+    def test_headless_block_is_named_from_the_header_above_it(self):
+        blocks = parse_blocks(EPISODE3_TEXT, EPISODE3_FIELDS, start='Name')
+        unnamed = name_headless_blocks(blocks, EPISODE3_TEXT, 'Name', r'\.{3,}(\d+ [^\r\n]*?)\.{3,}')
+        self.assertEqual(unnamed, [])
+        self.assertEqual(blocks[1].values['Name'], '63 Yuriev Soldier A')
+        self.assertEqual(to_frame(blocks, EPISODE3_FIELDS, strict=True)['HP'].tolist(), ['900', '950', '1,000'])
+
+    def test_headless_block_without_a_header_stays_unnamed(self):
+        text = EPISODE3_TEXT.replace(".......63 Yuriev Soldier A.......", "63 Yuriev Soldier A")
+        blocks = parse_blocks(text, EPISODE3_FIELDS, start='Name')
+        self.assertEqual(name_headless_blocks(blocks, text, 'Name', r'\.{3,}(\d+ [^\r\n]*?)\.{3,}'), [blocks[1]])
+
+    def test_pattern_needs_one_capture_group(self):
+        with self.assertRaises(ValueError):
+            compile_fields([Field('HP', r'HP: \d+')])
+
+
+if __name__ == '__main__':
+    unittest.main()
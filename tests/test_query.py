@@ -0,0 +1,206 @@
+"""
+utils/query.py turns the grid's filterModel and sortModel, which come straight from the browser, into SQL. Each model
+is run against a small in-memory table to check which rows it picks, and anything that isn't a known column or a
+supported filter is rejected with ValueError before it gets near the query.
+
+Usage:
+    python -m unittest discover tests
+"""
+
+import os
+import sqlite3
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from utils.query import MAX_BLOCK_SIZE, build_order_by, build_where_clause, fetch_block
+
+COLUMN_TYPES = {'Name': 'text', 'HP': 'numeric', 'EXP': 'range', 'uuid': 'text'}
+
+ROWS = [
+    ('Cyber Mech', 150, '10-20', 'a'),
+    ('Gnosis Goblin', 400, '100-200', 'b'),
+    ('Minitia', 2400, 'N/A', 'c'),
+    ('cherubim', None, '50', 'd'),
+    ('100% Guard_Bot', 900, '', 'e'),
+]
+
+
+def text(filter_type, value=None):
+    return {'filterType': 'text', 'type': filter_type, 'filter': value}
+
+
+def number(filter_type, value=None, value_to=None):
+    return {'filterType': 'number', 'type': filter_type, 'filter': value, 'filterTo': value_to}
+
+
+class QueryTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('CREATE TABLE episode (Name TEXT, HP INTEGER, EXP TEXT, uuid TEXT)')
+        self.conn.executemany('INSERT INTO episode VALUES (?, ?, ?, ?)', ROWS)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def names(self, filter_model=None, sort_model=None):
+        """Names of the rows the models pick, in the order they come back."""
+        where, params = build_where_clause(filter_model, COLUMN_TYPES)
+        order_by = build_order_by(sort_model, COLUMN_TYPES)
+        return [row[0] for row in self.conn.execute(f"SELECT Name FROM episode {where} {order_by}", params)]
+
+    def test_text_operators(self):
+        cases = [
+            ('contains', 'mi', ['Minitia']),
+            ('notContains', 'o', ['Cyber Mech', 'Minitia', 'cherubim']),
+            ('startsWith', 'C', ['Cyber Mech', 'cherubim']),
+            ('endsWith', 'bot', ['100% Guard_Bot']),
+            ('equals', 'MINITIA', ['Minitia']),
+            ('notEqual', 'Minitia', ['Cyber Mech', 'Gnosis Goblin', 'cherubim', '100% Guard_Bot']),
+        ]
+        for filter_type, value, expected in cases:
+            with self.subTest(filter_type=filter_type):
+                self.assertEqual(self.names({'Name': text(filter_type, value)}), expected)
+
+    def test_like_wildcards_match_literally(self):
+        self.assertEqual(self.names({'Name': text('contains', '%')}), ['100% Guard_Bot'])
+        self.assertEqual(self.names({'Name': text('contains', '_')}), ['100% Guard_Bot'])
+        self.assertEqual(self.names({'Name': text('startsWith', '_')}), [])
+
+    def test_number_operators(self):
+        cases = [
+            ('equals', 400, ['Gnosis Goblin']),
+            ('notEqual', 400, ['Cyber Mech', 'Minitia', '100% Guard_Bot']),
+            ('lessThan', 400, ['Cyber Mech']),
+            ('lessThanOrEqual', '400', ['Cyber Mech', 'Gnosis Goblin']),
+            ('greaterThan', 400, ['Minitia', '100% Guard_Bot']),
+            ('greaterThanOrEqual', 900.0, ['Minitia', '100% Guard_Bot']),
+        ]
+        for filter_type, value, expected in cases:
+            with self.subTest(filter_type=filter_type):
+                self.assertEqual(self.names({'HP': number(filter_type, value)}), expected)
+
+    def test_in_range_excludes_both_ends(self):
+        self.assertEqual(self.names({'HP': number('inRange', 150, 900)}), ['Gnosis Goblin'])
+
+    def test_ranges_filter_on_their_starting_number(self):
+        # "100-200" counts as 100, and "N/A" or '' as no value at all
+        self.assertEqual(self.names({'EXP': number('greaterThan', 40)}), ['Gnosis Goblin', 'cherubim'])
+        self.assertEqual(self.names({'EXP': number('blank')}), ['Minitia', '100% Guard_Bot'])
+
+    def test_blank(self):
+        self.assertEqual(self.names({'HP': number('blank')}), ['cherubim'])
+        self.assertEqual(self.names({'HP': number('notBlank')}), ['Cyber Mech', 'Gnosis Goblin', 'Minitia', '100% Guard_Bot'])
+        # On a range column "N/A" is as blank as ''
+        self.assertEqual(self.names({'EXP': text('blank')}), ['Minitia', '100% Guard_Bot'])
+        self.assertEqual(self.names({'EXP': text('notBlank')}), ['Cyber Mech', 'Gnosis Goblin', 'cherubim'])
+
+    def test_or_conditions(self):
+        model = {'filterType': 'number', 'operator': 'OR', 'conditions': [number('lessThan', 200), number('greaterThan', 1000)]}
+        self.assertEqual(self.names({'HP': model}), ['Cyber Mech', 'Minitia'])
+        # Older AG Grid versions send condition1 and condition2 instead
+        model = {'filterType': 'text', 'operator': 'or', 'condition1': text('startsWith', 'G'), 'condition2': text('equals', 'Minitia')}
+        self.assertEqual(self.names({'Name': model}), ['Gnosis Goblin', 'Minitia'])
+
+    def test_and_conditions_and_several_columns(self):
+        model = {'filterType': 'number', 'operator': 'AND', 'conditions': [number('greaterThan', 100), number('lessThan', 1000)]}
+        self.assertEqual(self.names({'HP': model}), ['Cyber Mech', 'Gnosis Goblin', '100% Guard_Bot'])
+        self.assertEqual(self.names({'HP': model, 'Name': text('contains', 'o')}), ['Gnosis Goblin', '100% Guard_Bot'])
+
+    def test_no_filter(self):
+        self.assertEqual(build_where_clause(None, COLUMN_TYPES), ('', []))
+        self.assertEqual(build_where_clause({}, COLUMN_TYPES), ('', []))
+
+    def test_sort(self):
+        self.assertEqual(self.names(sort_model=[{'colId': 'Name', 'sort': 'asc'}]), ['100% Guard_Bot', 'cherubim', 'Cyber Mech', 'Gnosis Goblin', 'Minitia'])
+        self.assertEqual(self.names(sort_model=[{'colId': 'HP', 'sort': 'desc'}]), ['Minitia', '100% Guard_Bot', 'Gnosis Goblin', 'Cyber Mech', 'cherubim'])
+        # Ranges sort on their starting number; rows that tie keep their table order
+        self.assertEqual(self.names(sort_model=[{'colId': 'EXP', 'sort': 'desc'}]), ['Gnosis Goblin', 'cherubim', 'Cyber Mech', 'Minitia', '100% Guard_Bot'])
+        self.assertEqual(build_order_by(None, COLUMN_TYPES), 'ORDER BY rowid ASC')
+
+    def test_values_are_parameters(self):
+        where, params = build_where_clause({'Name': text('equals', "'; DROP TABLE episode; --")}, COLUMN_TYPES)
+        self.assertNotIn('DROP', where)
+        self.assertEqual(params, ["'; DROP TABLE episode; --"])
+
+    def test_rejects_unknown_columns(self):
+        for filter_model in ({'rowid': text('equals', 'x')}, {'"Name"': text('equals', 'x')}, {'Name) OR (1=1': text('equals', 'x')}):
+            with self.subTest(filter_model=filter_model):
+                with self.assertRaises(ValueError):
+                    build_where_clause(filter_model, COLUMN_TYPES)
+        for sort_model in ([{'colId': 'rowid'}], [{'colId': 'Name; DROP TABLE episode'}], [{'colId': ['Name']}], [{}]):
+            with self.subTest(sort_model=sort_model):
+                with self.assertRaises(ValueError):
+                    build_order_by(sort_model, COLUMN_TYPES)
+
+    def test_rejects_bad_operators(self):
+        bad_models = [
+            {'Name': text('like', 'x')},
+            {'Name': text('contains', ['x'])},
+            {'HP': number('between', 1)},
+            {'HP': number('equals', 'lots')},
+            {'HP': number('equals', True)},
+            {'HP': number('equals')},
+            {'HP': number('inRange', 1)},
+            {'HP': {'filterType': 'number', 'operator': ['OR'], 'conditions': [number('equals', 1)]}},
+            {'HP': {'filterType': 'number', 'operator': 'OR', 'conditions': ['equals']}},
+            {'HP': 'equals'},
+        ]
+        for filter_model in bad_models:
+            with self.subTest(filter_model=filter_model):
+                with self.assertRaises(ValueError):
+                    build_where_clause(filter_model, COLUMN_TYPES)
+
+    def test_rejects_models_of_the_wrong_shape(self):
+        with self.assertRaises(ValueError):
+            build_where_clause([text('equals', 'x')], COLUMN_TYPES)
+        with self.assertRaises(ValueError):
+            build_order_by({'colId': 'Name'}, COLUMN_TYPES)
+        with self.assertRaises(ValueError):
+            build_order_by(['Name'], COLUMN_TYPES)
+
+
+class FetchBlockTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('CREATE TABLE episode (Name TEXT, HP INTEGER, EXP TEXT, uuid TEXT)')
+        self.conn.executemany('INSERT INTO episode VALUES (?, ?, ?, ?)', ROWS)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_block(self):
+        response = fetch_block(self.conn, 'episode', {'startRow': 1, 'endRow': 3, 'sortModel': [{'colId': 'HP', 'sort': 'asc'}]}, COLUMN_TYPES)
+        self.assertEqual([row['Name'] for row in response['rowData']], ['Cyber Mech', 'Gnosis Goblin'])
+        self.assertEqual(response['rowCount'], len(ROWS))
+
+    def test_end_row_zero_is_an_empty_block(self):
+        response = fetch_block(self.conn, 'episode', {'startRow': 0, 'endRow': 0}, COLUMN_TYPES)
+        self.assertEqual(response['rowData'], [])
+        self.assertEqual(response['rowCount'], len(ROWS))
+
+    def test_missing_bounds_default_to_the_first_block(self):
+        self.assertEqual(len(fetch_block(self.conn, 'episode', {}, COLUMN_TYPES)['rowData']), len(ROWS))
+
+    def test_row_count_is_filtered(self):
+        response = fetch_block(self.conn, 'episode', {'startRow': 0, 'endRow': 1, 'filterModel': {'HP': number('greaterThan', 300)}}, COLUMN_TYPES)
+        self.assertEqual(len(response['rowData']), 1)
+        self.assertEqual(response['rowCount'], 3)
+
+    def test_block_size_is_capped(self):
+        where = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2000) "
+        self.conn.execute(where + "INSERT INTO episode SELECT 'Copy', i, NULL, i FROM n")
+        response = fetch_block(self.conn, 'episode', {'startRow': 0, 'endRow': 5000}, COLUMN_TYPES)
+        self.assertEqual(len(response['rowData']), MAX_BLOCK_SIZE)
+
+    def test_rejects_bad_requests(self):
+        for request in (None, [], {'startRow': 'a'}, {'endRow': [100]}, {'filterModel': {'rowid': text('equals', 'x')}}):
+            with self.subTest(request=request):
+                with self.assertRaises(ValueError):
+                    fetch_block(self.conn, 'episode', request, COLUMN_TYPES)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+The database is swapped in the middle of a request: everything the request loads afterwards, including datasets it
+hadn't touched yet and ones the memory budget evicted, still comes from the snapshot it started on.
+
+Usage:
+    python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# utils.db reads DATABASE_PATH when it's first imported, so a test module that imported it earlier would point this one at the live database
+if 'utils.db' in sys.modules:
+    raise ImportError('utils.db was imported before test_snapshot_reload could point it at a scratch database')
+
+# Read straight from a scratch copy of the database, never check for new data on our own, and evict anything that isn't in use
+SCRATCH = tempfile.mkdtemp()
+DB = os.path.join(SCRATCH, 'xenosaga.db')
+shutil.copyfile(os.path.join(REPO_ROOT, 'assets', 'xenosaga.db'), DB)
+os.environ.update(DATABASE_PATH=DB, DATA_BACKEND='sqlite', DATA_RELOAD_INTERVAL='0', DATASET_MEMORY_BUDGET='0.01')
+
+from flask import Flask
+
+from utils.api import get_episode_bodies, register_episode_routes
+from utils.episodes import check_for_update, current_data_version, current_snapshot, register_data_reload
+from utils.payloads import get_grid_payload
+
+NEW_VERSION = 'f' * 16
+NEW_NAME = 'Renamed by the new version'
+
+
+def publish(update=None):
+    """Rename a copy of the database over the live one, the way json_to_sqlite.py does, optionally changing it first."""
+    path = os.path.join(SCRATCH, 'next.db')
+    shutil.copyfile(os.path.join(REPO_ROOT, 'assets', 'xenosaga.db'), path)
+    if update is not None:
+        conn = sqlite3.connect(path)
+        update(conn)
+        conn.commit()
+        conn.close()
+    os.replace(path, DB)
+
+
+def new_version(conn):
+    conn.execute("UPDATE episode2 SET Name = ? WHERE rowid = (SELECT MIN(rowid) FROM episode2)", (NEW_NAME,))
+    conn.execute("UPDATE metadata SET value = ? WHERE key = 'data_version'", (NEW_VERSION,))
+
+
+def tearDownModule():
+    shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+class SnapshotReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        publish()
+        self.old_version = check_for_update(force=True).version
+        self.server = Flask(__name__)
+        register_data_reload(self.server)
+        register_episode_routes(self.server)
+
+    def test_request_keeps_its_snapshot_after_the_swap(self):
+        with self.server.test_request_context('/'):
+            self.server.preprocess_request()
+            self.assertIsNotNone(get_grid_payload('ep1'))
+            publish(new_version)
+            # Not loaded before the swap, so it has to be read from the old file
+            self.assertNotIn(NEW_NAME, [row['Name'] for row in get_grid_payload('ep2').row_data])
+            self.assertTrue(get_episode_bodies('ep2'))
+            # The tiny budget evicted ep1 when ep2 came in, so this loads it again
+            self.assertEqual(len(get_grid_payload('ep1').row_data), len(current_snapshot().rows('ep1')[1]))
+            self.assertEqual(current_data_version(), self.old_version)
+            self.assertGreater(current_snapshot().dataset_cache_stats()['evictions'], 0)
+
+        self.assertEqual(check_for_update(force=True).version, NEW_VERSION)
+        with self.server.test_request_context('/'):
+            self.server.preprocess_request()
+            self.assertIn(NEW_NAME, [row['Name'] for row in get_grid_payload('ep2').row_data])
+
+    def test_endpoint_serves_the_old_snapshot_after_the_swap(self):
+        client = self.server.test_client()
+        self.assertEqual(client.get('/api/episode/ep1.json').status_code, 200)
+        publish(new_version)
+        response = client.get('/api/episode/ep2.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_etag()[0].split('-')[0], self.old_version)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork()')
+    def test_forked_worker_reads_its_own_connection(self):
+        for swapped in (False, True):
+            snapshot = check_for_update(force=True)
+            if swapped:
+                publish(new_version)
+            pid = os.fork()
+            if pid == 0:
+                # The worker starts on the loaded snapshot if its file is still there, and on the new data otherwise
+                ok = check_for_update() is not snapshot if swapped else len(snapshot.rows('ep2')[1]) > 0
+                os._exit(0 if ok else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0, f'swapped={swapped}')
+            publish()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+from flask import Flask, Response, abort, request
+from typing import Dict
+from utils.episodes import connect_current, current_data_version, current_snapshot, get_column_types, get_datasets
+from utils.export import EXPORT_FORMATS, build_export_queries, export_columns, stream_csv, stream_parquet
+from utils.facets import get_facet_index
+from utils.payloads import WIRE_FORMATS, build_episode_body, compress_body, get_grid_payload, read_payload_blobs
+import hashlib
+import json
+
+# Encodings in the order we'd rather serve them
+PREFERRED_ENCODINGS = ('br', 'gzip')
+
+# How long a versioned URL can be cached for; the URL changes whenever the data does
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Unversioned URLs can still be cached, but have to be revalidated with the ETag every time
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+def get_episode_bodies(tab_id: str, wire_format: str = 'rows') -> Dict[str, bytes]:
+  """
+  Get an episode's JSON body in every available encoding, reading the blobs json_to_sqlite.py precompressed.
+
+  Args:
+    tab_id (str): The tab id, e.g. 'ep1'.
+    wire_format (str): 'rows' or 'columns'.
+
+  Returns:
+    Dict[str, bytes]: Content-Encoding to body mapping.
+  """
+  snapshot = current_snapshot()
+
+  def build():
+    bodies = snapshot.read(read_payload_blobs, snapshot.datasets[tab_id].table_name, wire_format)
+    # Databases built before the blob table existed get compressed once here instead
+    return bodies or compress_body(build_episode_body(get_grid_payload(tab_id), wire_format))
+
+  return snapshot.dataset_cached(tab_id, ('bodies', wire_format), build, lambda bodies: sum(map(len, bodies.values())))
+
+def episode_url(tab_id: str, wire_format: str = 'rows') -> str:
+  """The versioned URL of an episode's JSON, safe to cache forever."""
+  url = f"/api/episode/{tab_id}.json?v={current_data_version()}"
+  return url if wire_format == 'rows' else f"{url}&format={wire_format}"
+
+def register_episode_routes(server: Flask) -> None:
+  """
+  Add the cacheable GET endpoints for the episode data to the Flask server.
+  Each response carries a strong ETag derived from the database content hash, so repeat visitors get a 304.
+  `?format=columns` serves the rows in the compact 'columns' wire format instead of a list of dicts.
+
+  Args:
+    server (Flask): The Dash app's Flask server.
+  """
+  @server.route('/api/episode/<tab_id>.json')
+  def episode_json(tab_id):
+    wire_format = request.args.get('format', 'rows')
+    if tab_id not in get_datasets() or wire_format not in WIRE_FORMATS:
+      abort(404)
+    version = current_data_version()
+    bodies = get_episode_bodies(tab_id, wire_format)
+    encoding = next((name for name in PREFERRED_ENCODINGS if name in bodies and request.accept_encodings[name]), 'identity')
+
+    # The ETag is per format and encoding, since each one is a different sequence of bytes
+    etag = f"{version}-{tab_id}-{wire_format}-{encoding}"
+    if request.if_none_match.contains(etag):
+      response = Response(status=304)
+    else:
+      response = Response(bodies[encoding], mimetype='application/json')
+      if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if request.args.get('v') == version else REVALIDATE_CACHE_CONTROL
+    return response
+
+def register_facet_routes(server: Flask) -> None:
+  """
+  Add the facet query endpoint to the Flask server.
+  `/api/facets?type=Mechanical&weak=Lightning` returns the matching enemies across every episode and the count of every facet value alongside them.
+  Each facet can be given more than once to match any of the values, and `limit` caps the number of hits (default 100).
+
+  Args:
+    server (Flask): The Dash app's Flask server.
+  """
+  @server.route('/api/facets')
+  def facet_query():
+    filters = {facet: request.args.getlist(facet) for facet in request.args if facet != 'limit'}
+    try:
+      limit = int(request.args.get('limit', 100))
+      result = get_facet_index().query(filters, limit=max(limit, 0))
+    except ValueError as e:
+      abort(400, description=str(e))
+    version = current_data_version()
+
+    # The same query gives the same answer until the data changes
+    query = json.dumps(sorted((facet, sorted(values)) for facet, values in filters.items())) + f"|{limit}"
+    etag = f"{version}-facets-{hashlib.sha256(query.encode('utf-8')).hexdigest()[:16]}"
+    if request.if_none_match.contains(etag):
+      response = Response(status=304)
+    else:
+      body = {'version': version, 'count': result.count, 'hits': result.hits, 'facets': result.counts}
+      response = Response(json.dumps(body, separators=(',', ':')), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+    return response
+
+def register_export_routes(server: Flask) -> None:
+  """
+  Add the data export endpoint to the Flask server.
+  `/api/export/<tab id|all>.<csv|parquet>` streams an episode (or every episode) straight from SQLite, a chunk of rows at a time.
+  `filterModel` and `sortModel` take the grid's models as JSON and filter and sort the same way the grid does.
+  Any facet (e.g. `type=Mechanical&weak=Lightning`, see /api/facets) narrows the export down to the enemies it matches.
+
+  Args:
+    server (Flask): The Dash app's Flask server.
+  """
+  @server.route('/api/export/<selection>.<export_format>')
+  def export(selection, export_format):
+    # Open the connection first, so the datasets and column types below come from the same version of the database as the rows
+    conn = connect_current()
+    datasets = get_datasets()
+    if (selection != 'all' and selection not in datasets) or export_format not in EXPORT_FORMATS:
+      abort(404)
+    tab_ids = list(datasets) if selection == 'all' else [selection]
+
+    try:
+      facet_filters = {facet: request.args.getlist(facet) for facet in request.args if facet not in ('filterModel', 'sortModel')}
+      uuids = None
+      if facet_filters:
+        index = get_facet_index()
+        uuids = [hit['uuid'] for hit in index.hits(index.select(facet_filters))]
+      tables = {datasets[tab_id].table_name: (datasets[tab_id].label, get_column_types(tab_id)) for tab_id in tab_ids}
+      queries = build_export_queries(
+        tables,
+        filter_model=json.loads(request.args.get('filterModel') or '{}'),
+        sort_model=json.loads(request.args.get('sortModel') or '[]'),
+        uuids=uuids,
+      )
+    except ValueError as e: # Bad JSON, an unknown facet, or a column or filter type one of the episodes doesn't have
+      abort(400, description=str(e))
+    columns = export_columns({table_name: column_types for table_name, (_, column_types) in tables.items()}, episode_column=len(tab_ids) > 1)
+
+    # The stream reads from this thread's pooled connection, and the thread doesn't take another request until the response is sent
+    stream = stream_csv if export_format == 'csv' else stream_parquet
+    response = Response(stream(conn, queries, columns), mimetype='text/csv' if export_format == 'csv' else 'application/vnd.apache.parquet')
+    response.headers['Content-Disposition'] = f'attachment; filename="xenosaga-{selection}-{current_data_version()}.{export_format}"'
+    return response
@@ -0,0 +1,223 @@
+from typing import TYPE_CHECKING, Any, Dict, List
+import json
+import mmap
+from utils.db import DB_PATH
+import numpy as np
+import os
+import struct
+
+# pandas is only needed to write the store or build dataframes from it, so reading rows doesn't import it
+if TYPE_CHECKING:
+  import pandas as pd
+
+# A small Arrow-like columnar file that every gunicorn worker can memory-map read-only
+# Numbers live in fixed-width buffers and text in an offsets + UTF-8 data pair, so none of it is a Python object until it's read
+# Layout: MAGIC, the header length (uint64), the JSON header, then the 64-byte aligned buffers
+MAGIC = b'XSCOLS01'
+ALIGNMENT = 64
+
+# Path to the columnar copy of xenosaga.db: next to the database, so it follows DATABASE_PATH and doesn't depend on the working directory
+# COLUMNAR_PATH puts it somewhere else
+STORE_PATH = os.getenv('COLUMNAR_PATH') or os.path.splitext(DB_PATH)[0] + '.columns'
+
+# The integer widths a column can be stored in
+INT_TYPES = ('int8', 'int16', 'int32', 'int64')
+
+def _encode_strings(values: List[Any]) -> Dict[str, bytes]:
+  # Offsets into one UTF-8 buffer, with missing values as empty strings
+  import pandas as pd
+  encoded = [value.encode('utf-8') if isinstance(value, str) else b'' if value is None or pd.isna(value) else str(value).encode('utf-8') for value in values]
+  offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+  offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+  return {'offsets': offsets.tobytes(), 'data': b''.join(encoded)}
+
+def _encode_column(series: 'pd.Series') -> Dict[str, Any]:
+  # Returns the column type, its raw buffers, and anything else needed to read them back
+  import pandas as pd
+  if isinstance(series.dtype, pd.CategoricalDtype):
+    # Dictionary encoded: each distinct value is stored once, and every row is a small integer code into them (-1 if missing)
+    codes = series.cat.codes.to_numpy()
+    dictionary = _encode_strings(series.cat.categories.tolist())
+    buffers = {'codes': codes.tobytes(), 'dictionary_offsets': dictionary['offsets'], 'dictionary_data': dictionary['data']}
+    return {'type': 'dictionary', 'buffers': buffers, 'index_type': str(codes.dtype), 'dictionary_size': len(series.cat.categories)}
+  if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_integer_dtype(series.dtype):
+    # Keep the column's own width, so an Int32 column takes 4 bytes a row instead of 8
+    dtype = getattr(series.dtype, 'numpy_dtype', series.dtype)
+    int_type = str(dtype) if str(dtype) in INT_TYPES else 'int64'
+    validity = series.notna().to_numpy(dtype=np.uint8)
+    values = series.fillna(0).to_numpy(dtype=int_type)
+    return {'type': int_type, 'buffers': {'values': values.tobytes(), 'validity': validity.tobytes()}}
+  if pd.api.types.is_float_dtype(series.dtype):
+    # NaN already means missing for floats, so there's no validity buffer
+    return {'type': 'float64', 'buffers': {'values': series.to_numpy(dtype=np.float64).tobytes()}}
+  validity = series.notna().to_numpy(dtype=np.uint8)
+  return {'type': 'utf8', 'buffers': {**_encode_strings(series.tolist()), 'validity': validity.tobytes()}}
+
+def write_columnar_store(tables: Dict[str, 'pd.DataFrame'], path: str = STORE_PATH, data_version: str = None) -> None:
+  """
+  Write dataframes to a columnar file that can be memory-mapped by every worker.
+
+  Args:
+    tables (Dict[str, pd.DataFrame]): Table name to dataframe mapping.
+    path (str): Where to write the file.
+    data_version (str): The version of xenosaga.db the tables came from, so readers can tell if the file is stale.
+  """
+  header = {'data_version': data_version, 'tables': {}}
+  chunks: List[bytes] = []
+  position = 0
+  for table_name, df in tables.items():
+    columns = []
+    for column_name in df.columns:
+      encoded = _encode_column(df[column_name])
+      buffers = {}
+      for buffer_name, data in encoded.pop('buffers').items():
+        padding = -position % ALIGNMENT
+        chunks.append(b'\0' * padding)
+        position += padding
+        buffers[buffer_name] = [position, len(data)]
+        chunks.append(data)
+        position += len(data)
+      columns.append({'name': column_name, **encoded, 'buffers': buffers})
+    header['tables'][table_name] = {'num_rows': len(df), 'columns': columns}
+
+  header_bytes = json.dumps(header).encode('utf-8')
+  prefix = MAGIC + struct.pack('<Q', len(header_bytes)) + header_bytes
+  prefix += b'\0' * (-len(prefix) % ALIGNMENT)
+  # Write next to the real file and rename it into place, so workers never map a half-written file
+  temp_path = f"{path}.tmp"
+  with open(temp_path, 'wb') as f:
+    f.write(prefix)
+    for chunk in chunks:
+      f.write(chunk)
+    f.flush()
+    os.fsync(f.fileno())
+  os.replace(temp_path, path)
+
+class ColumnarTable:
+  """One table in a ColumnarStore. Numeric columns are zero-copy views of the memory map."""
+
+  def __init__(self, buffer: mmap.mmap, data_start: int, meta: Dict[str, Any]):
+    self._buffer = buffer
+    self._data_start = data_start
+    self.num_rows = meta['num_rows']
+    self._columns = {column['name']: column for column in meta['columns']}
+    self.columns = list(self._columns)
+
+  def _array(self, column_name: str, buffer_name: str, dtype) -> np.ndarray:
+    offset, length = self._columns[column_name]['buffers'][buffer_name]
+    return np.frombuffer(self._buffer, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=self._data_start + offset)
+
+  def column_type(self, column_name: str) -> str:
+    """Return the stored type of a column: 'int8' to 'int64', 'float64', 'utf8', or 'dictionary'."""
+    return self._columns[column_name]['type']
+
+  def _strings(self, column_name: str, prefix: str = '') -> List[str]:
+    # Decode every string in a utf8 column, or a dictionary column's dictionary
+    offsets = self._array(column_name, f'{prefix}offsets', np.int64).tolist()
+    data_offset, data_length = self._columns[column_name]['buffers'][f'{prefix}data']
+    start = self._data_start + data_offset
+    text = self._buffer[start:start + data_length]
+    return [text[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+  def dictionary(self, column_name: str) -> List[str]:
+    """Return the distinct values of a dictionary column, in code order."""
+    return self._strings(column_name, 'dictionary_')
+
+  def _codes(self, column_name: str) -> np.ndarray:
+    return self._array(column_name, 'codes', self._columns[column_name]['index_type'])
+
+  def value(self, column_name: str, row: int) -> Any:
+    """
+    Read a single value without touching the rest of the column.
+
+    Args:
+      column_name (str): The column to read.
+      row (int): The row position.
+
+    Returns:
+      The value as a plain Python int, float or str, or None if it's missing.
+    """
+    column_type = self.column_type(column_name)
+    if column_type == 'float64':
+      value = float(self._array(column_name, 'values', np.float64)[row])
+      return None if np.isnan(value) else value
+    if column_type == 'dictionary':
+      code = int(self._codes(column_name)[row])
+      return None if code < 0 else self.dictionary(column_name)[code]
+    if not self._array(column_name, 'validity', np.uint8)[row]:
+      return None
+    if column_type in INT_TYPES:
+      return int(self._array(column_name, 'values', column_type)[row])
+    offsets = self._array(column_name, 'offsets', np.int64)
+    data_offset, _ = self._columns[column_name]['buffers']['data']
+    start = self._data_start + data_offset
+    return self._buffer[start + int(offsets[row]):start + int(offsets[row + 1])].decode('utf-8')
+
+  def row(self, row: int) -> Dict[str, Any]:
+    """Read one row as a dict, with missing values as None."""
+    return {column_name: self.value(column_name, row) for column_name in self.columns}
+
+  def column_values(self, column_name: str) -> List[Any]:
+    """Read a whole column as plain Python values, with missing values as None."""
+    column_type = self.column_type(column_name)
+    if column_type == 'float64':
+      return [None if value != value else value for value in self._array(column_name, 'values', np.float64).tolist()]
+    if column_type == 'dictionary':
+      # Each distinct value is decoded once, however many rows share it
+      dictionary = self.dictionary(column_name) + [None]
+      return [dictionary[code] for code in self._codes(column_name).tolist()]
+    validity = self._array(column_name, 'validity', np.uint8).tolist()
+    if column_type in INT_TYPES:
+      values = self._array(column_name, 'values', column_type).tolist()
+      return [value if valid else None for value, valid in zip(values, validity)]
+    return [value if valid else None for value, valid in zip(self._strings(column_name), validity)]
+
+  def to_pylist(self) -> List[Dict[str, Any]]:
+    """Read every row as a dict, a column at a time."""
+    columns = [self.column_values(column_name) for column_name in self.columns]
+    return [dict(zip(self.columns, values)) for values in zip(*columns)]
+
+  def to_pandas(self) -> 'pd.DataFrame':
+    """
+    Build a dataframe from the table, with the types it was written with.
+    Numeric columns without missing values and the codes of dictionary columns share memory with the map; other text has to be decoded into Python strings.
+    """
+    import pandas as pd
+    data = {}
+    for column_name in self.columns:
+      column_type = self.column_type(column_name)
+      if column_type == 'float64':
+        data[column_name] = self._array(column_name, 'values', np.float64)
+      elif column_type in INT_TYPES:
+        # Always nullable, so a column keeps the same dtype whether or not this version of the data has gaps in it
+        values = self._array(column_name, 'values', column_type)
+        validity = self._array(column_name, 'validity', np.uint8)
+        data[column_name] = pd.arrays.IntegerArray(values, validity == 0)
+      elif column_type == 'dictionary':
+        # -1 (missing) is -1 in pandas too
+        data[column_name] = pd.Categorical.from_codes(self._codes(column_name), categories=self.dictionary(column_name))
+      else:
+        data[column_name] = pd.array(self.column_values(column_name), dtype='string')
+    return pd.DataFrame(data, copy=False)
+
+class ColumnarStore:
+  """
+  A read-only, memory-mapped view of the columnar file.
+  Open it before gunicorn forks (--preload) and every worker shares the same physical pages through the OS page cache.
+  """
+
+  def __init__(self, path: str = STORE_PATH):
+    with open(path, 'rb') as f:
+      self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if self._buffer[:len(MAGIC)] != MAGIC:
+      raise ValueError(f"{path} is not a columnar store")
+    (header_length,) = struct.unpack('<Q', self._buffer[len(MAGIC):len(MAGIC) + 8])
+    header_end = len(MAGIC) + 8 + header_length
+    header = json.loads(self._buffer[len(MAGIC) + 8:header_end])
+    data_start = header_end + (-header_end % ALIGNMENT)
+    self.data_version = header.get('data_version')
+    self.tables = {name: ColumnarTable(self._buffer, data_start, meta) for name, meta in header['tables'].items()}
+
+  def table(self, table_name: str) -> ColumnarTable:
+    """Return one table from the store."""
+    return self.tables[table_name]
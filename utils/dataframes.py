@@ -1,9 +1,30 @@
+from utils.episodes import current_snapshot, get_column_types
+from utils.inference import apply_storage_types
+from utils.schema import storage_types
 import pandas as pd
-import sqlite3
-
-# Read the data from the SQLite database
-_conn = sqlite3.connect('assets/xenosaga.db')
-ep1_df = pd.read_sql_query("SELECT * FROM episode1", _conn)
-ep2_df = pd.read_sql_query("SELECT * FROM episode2", _conn)
-ep3_df = pd.read_sql_query("SELECT * FROM episode3", _conn)
-_conn.close()
\ No newline at end of file
+
+# Episode data as pandas dataframes, for scripts and tools that want them
+# The app itself doesn't import this module; it goes through utils/episodes.py and utils/payloads.py instead
+
+def get_episode_df(tab_id: str) -> pd.DataFrame:
+  """
+  Load an episode as a dataframe, once per snapshot of the data (or again after it was evicted).
+
+  Args:
+    tab_id (str): The tab id, e.g. 'ep1'.
+
+  Returns:
+    pd.DataFrame: The episode's table, with the storage types declared in utils/schema.py (nullable integers, categories and strings). Callers must not mutate it.
+  """
+  snapshot = current_snapshot()
+  table_name = snapshot.datasets[tab_id].table_name
+  column_types = get_column_types(tab_id)
+
+  def build():
+    if snapshot.store is not None:
+      return snapshot.store.table(table_name).to_pandas()
+    columns, rows = snapshot.rows(tab_id)
+    return apply_storage_types(pd.DataFrame(rows, columns=columns), storage_types(table_name, column_types))
+
+  # Counted against the dataset memory budget like the payloads, so it's evicted along with them
+  return snapshot.dataset_cached(tab_id, 'dataframe', build, lambda df: int(df.memory_usage(deep=True).sum()))
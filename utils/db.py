@@ -0,0 +1,166 @@
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+import hashlib
+import os
+import sqlite3
+import threading
+
+# Path to the SQLite database, anchored to the repo root so it doesn't depend on the working directory
+# DATABASE_PATH points the app at another database, e.g. a scratch copy for a benchmark
+DB_PATH = os.getenv('DATABASE_PATH') or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'xenosaga.db')
+
+# Key/value table json_to_sqlite.py writes the data version (and when it was built) to
+METADATA_TABLE = 'metadata'
+
+# Applied to every read-only connection. The whole database is well under the mmap size, so reads come straight from the page cache
+# The OS shares those pages between the gunicorn workers, and each connection's own page cache is only a fallback on top
+READONLY_PRAGMAS = (
+  'PRAGMA mmap_size = 268435456',
+  'PRAGMA cache_size = -8192',
+  'PRAGMA temp_store = MEMORY',
+  'PRAGMA query_only = ON',
+)
+
+# How many prepared statements each connection keeps, keyed by their SQL text
+# The queries below always use the same text with different parameters, so they're prepared once per connection
+STATEMENT_CACHE_SIZE = 256
+
+def connect_readonly(db_path: str = DB_PATH, immutable: bool = False, check_same_thread: bool = True) -> sqlite3.Connection:
+  """
+  Open a read-only connection to the database, for queries made while serving requests.
+
+  Args:
+    db_path (str): Path to the SQLite database.
+    immutable (bool): Tell SQLite the file never changes, so it skips locking and change detection.
+      json_to_sqlite.py only ever replaces the database by renaming a new file over it, so a connection to the published file is safe to open this way.
+    check_same_thread (bool): Only let the thread that opened the connection use it. Turn it off for a connection that's shared (under a lock) between threads.
+
+  Returns:
+    sqlite3.Connection: The connection, with READONLY_PRAGMAS applied.
+  """
+  uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro" + ('&immutable=1' if immutable else '')
+  conn = sqlite3.connect(uri, uri=True, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=check_same_thread)
+  for pragma in READONLY_PRAGMAS:
+    conn.execute(pragma)
+  return conn
+
+def _file_identity(db_path: str) -> Tuple[int, int, int]:
+  # A rename of a new database over the old one always changes the inode
+  stat = os.stat(db_path)
+  return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+_pool = threading.local()
+
+def pooled_connection(db_path: str = DB_PATH) -> sqlite3.Connection:
+  """
+  Get this thread's read-only connection to the database, opening it the first time and again whenever the file is replaced.
+  Reusing the connection keeps its page cache and prepared statements warm between requests.
+  The connection belongs to the pool: callers must not close it, and must not hand it to another thread.
+
+  Args:
+    db_path (str): Path to the SQLite database.
+
+  Returns:
+    sqlite3.Connection: The connection, opened as immutable.
+  """
+  connections = _pool.__dict__.setdefault('connections', {})
+  # The process id is part of the key: a connection must not be used across fork(), and a gunicorn worker's main thread inherits the master's
+  key = (db_path, os.getpid())
+  identity = _file_identity(db_path)
+  entry = connections.get(key)
+  if entry is not None and entry[1] == identity:
+    return entry[0]
+  if entry is not None:
+    entry[0].close()
+  for stale in [other for other in connections if other[1] != key[1]]:
+    # Left for the garbage collector rather than closed; only the process that opened them should
+    del connections[stale]
+  conn = connect_readonly(db_path, immutable=True)
+  # The file could be replaced between the stat and the open; if so, the next call notices and reopens
+  connections[key] = (conn, identity)
+  return conn
+
+def read_metadata(conn: sqlite3.Connection, key: str) -> Optional[str]:
+  """
+  Read one value from the metadata table.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    key (str): The key, e.g. 'data_version'.
+
+  Returns:
+    Optional[str]: The value, or None if it (or the table) doesn't exist.
+  """
+  try:
+    row = conn.execute(f"SELECT value FROM {METADATA_TABLE} WHERE key = ?", (key,)).fetchone()
+  except sqlite3.OperationalError:
+    return None
+  return row[0] if row else None
+
+def read_data_version(conn: sqlite3.Connection, db_path: str = DB_PATH) -> str:
+  """
+  Get the version of the database's content, so anything derived from it can be keyed on it.
+  json_to_sqlite.py records a hash of every row in the metadata table; older databases without one get the file hashed instead.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database. The version is read through it, so it matches what the connection sees.
+    db_path (str): Path to the SQLite database, only used for older databases.
+
+  Returns:
+    str: 16 hex characters that change whenever the data does.
+  """
+  version = read_metadata(conn, 'data_version')
+  if version:
+    return version
+  digest = hashlib.sha256()
+  with open(db_path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1 << 20), b''):
+      digest.update(chunk)
+  return digest.hexdigest()[:16]
+
+def get_data_version(db_path: str = DB_PATH) -> str:
+  """
+  Get the version of a database's content.
+
+  Args:
+    db_path (str): Path to the SQLite database.
+
+  Returns:
+    str: 16 hex characters that change whenever the data does.
+  """
+  conn = connect_readonly(db_path)
+  try:
+    return read_data_version(conn, db_path)
+  finally:
+    conn.close()
+
+def fetch_rows(conn: sqlite3.Connection, table_name: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+  """
+  Read every row of a table in table order.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    table_name (str): The table. Must be a known table, it is not parameterized.
+
+  Returns:
+    Tuple[List[str], List[Dict[str, Any]]]: The column names and the rows, with NULL as None.
+  """
+  cursor = conn.execute(f"SELECT * FROM {table_name} ORDER BY rowid")
+  columns = [description[0] for description in cursor.description]
+  return columns, [dict(zip(columns, row)) for row in cursor]
+
+def fetch_row(conn: sqlite3.Connection, table_name: str, uuid: str) -> Optional[Dict[str, Any]]:
+  """
+  Read one enemy's row by uuid, through the table's unique uuid index.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    table_name (str): The table. Must be a known table, it is not parameterized.
+    uuid (str): The enemy's uuid.
+
+  Returns:
+    Optional[Dict[str, Any]]: The row, or None if the uuid isn't in the table.
+  """
+  cursor = conn.execute(f"SELECT * FROM {table_name} WHERE uuid = ?", (uuid,))
+  row = cursor.fetchone()
+  return None if row is None else dict(zip((description[0] for description in cursor.description), row))
@@ -0,0 +1,371 @@
+from collections import OrderedDict
+from flask import g, has_request_context
+from loguru import logger
+from typing import Any, Callable, Dict, List, Tuple
+from utils.columnar import STORE_PATH, ColumnarStore
+from utils.db import DB_PATH, connect_readonly, fetch_rows, pooled_connection, read_data_version
+from utils.schema import Dataset, read_column_types, read_datasets
+import os
+import sqlite3
+import threading
+import time
+
+# The accessors the app uses to reach the episode data
+# Nothing here imports pandas, so serving a request never pays for it
+
+# Which datasets there are (one per tab) comes from the datasets table json_to_sqlite.py writes, see utils/schema.py
+# Only the registry is read up front; a dataset's rows, payloads and dataframes are loaded the first time something asks for them
+
+# How much memory (in MB) each worker may spend on loaded datasets before it evicts the least recently used ones. 0 never evicts
+DATASET_MEMORY_BUDGET = float(os.getenv('DATASET_MEMORY_BUDGET', '64'))
+if DATASET_MEMORY_BUDGET < 0:
+  raise ValueError(f"DATASET_MEMORY_BUDGET must be a number of megabytes, or 0 for no limit, not {DATASET_MEMORY_BUDGET!r}")
+
+# Where the episode data is read from:
+# 'columnar' memory-maps assets/xenosaga.columns so every preloaded gunicorn worker shares one copy of it,
+# 'sqlite' reads the rows straight from SQLite, and 'auto' (the default) uses the columnar file whenever it matches xenosaga.db
+DATA_BACKEND = os.getenv('DATA_BACKEND', 'auto')
+
+# How often (in seconds) a worker checks whether xenosaga.db or the columnar file were replaced. 0 never checks
+DATA_RELOAD_INTERVAL = float(os.getenv('DATA_RELOAD_INTERVAL', '2'))
+
+def _file_signature() -> Tuple:
+  # Cheap to check on every request: a rename or rewrite of either file changes its inode, size or mtime
+  signature = []
+  for path in (DB_PATH, STORE_PATH):
+    try:
+      stat = os.stat(path)
+      signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+    except FileNotFoundError:
+      signature.append(None)
+  return tuple(signature)
+
+class DataSnapshot:
+  """
+  One version of the episode data and everything derived from it (payloads, column definitions, rendered modals).
+  A snapshot never changes once it's loaded; picking up new data means loading a new snapshot and swapping it in.
+  Everything a snapshot reads comes from the same version of the files, so its caches can never mix old and new data.
+  It holds its own immutable connection to the database file it was loaded from, which stays readable after json_to_sqlite.py renames a new one over it,
+  so datasets loaded (or evicted and loaded again) long after the swap still come from this version.
+  """
+
+  def __init__(self, version: str, conn: sqlite3.Connection, store: ColumnarStore | None, datasets: List[Dataset], column_types: Dict[str, Dict[str, str]]):
+    self.version = version
+    self.store = store
+    self._conn = conn
+    self._conn_pid = os.getpid()
+    # Shared by every thread of the worker, one query at a time
+    self._conn_lock = threading.Lock()
+    self.datasets = {dataset.tab_id: dataset for dataset in datasets}
+    self._column_types = column_types
+    self._cache: Dict[Any, Any] = {}
+    # Per dataset, in least recently used order: its cached values and their estimated size in bytes
+    self._loaded: OrderedDict[str, Dict[Any, Tuple[Any, int]]] = OrderedDict()
+    self._loaded_bytes = 0
+    self._dataset_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    # Reentrant, since building one thing often needs another (a payload needs the column types)
+    self._lock = threading.RLock()
+
+  def cached(self, key: Any, build: Callable[[], Any]) -> Any:
+    """
+    Get something derived from this snapshot, building it the first time it's asked for.
+
+    Args:
+      key (Any): What to cache it under, e.g. ('column_types', 'ep1').
+      build (Callable[[], Any]): Builds the value from this snapshot. It must not read the current snapshot, only this one.
+
+    Returns:
+      Any: The cached value. Callers must not mutate it.
+    """
+    value = self._cache.get(key)
+    if value is None:
+      with self._lock:
+        value = self._cache.get(key)
+        if value is None:
+          value = self._cache[key] = build()
+    return value
+
+  def dataset_cached(self, tab_id: str, key: Any, build: Callable[[], Any], size: Callable[[Any], int]) -> Any:
+    """
+    Like cached(), for something that belongs to one dataset and is as big as it is (its payload, its dataframe).
+    Once everything loaded this way adds up to more than DATASET_MEMORY_BUDGET, the least recently used datasets are evicted whole, and built again if they're asked for again.
+
+    Args:
+      tab_id (str): The dataset it belongs to.
+      key (Any): What to cache it under within the dataset, e.g. 'payload'.
+      build (Callable[[], Any]): Builds the value from this snapshot. It must not read the current snapshot, only this one.
+      size (Callable[[Any], int]): Estimates how many bytes the value takes up.
+
+    Returns:
+      Any: The cached value. Callers must not mutate it.
+    """
+    with self._lock:
+      entries = self._loaded.get(tab_id)
+      if entries is not None and key in entries:
+        self._loaded.move_to_end(tab_id)
+        self._dataset_stats['hits'] += 1
+        return entries[key][0]
+      self._dataset_stats['misses'] += 1
+      value = build()
+      value_size = size(value)
+      # Building may have cached other things for this dataset (or evicted it), hence setdefault
+      self._loaded.setdefault(tab_id, {})[key] = (value, value_size)
+      self._loaded.move_to_end(tab_id)
+      self._loaded_bytes += value_size
+      budget = DATASET_MEMORY_BUDGET * 1024 * 1024
+      # The dataset just asked for always stays, even if it's bigger than the whole budget
+      while budget and self._loaded_bytes > budget and len(self._loaded) > 1:
+        evicted, evicted_entries = self._loaded.popitem(last=False)
+        self._loaded_bytes -= sum(entry_size for _, entry_size in evicted_entries.values())
+        self._dataset_stats['evictions'] += 1
+        logger.debug(f"Evicted dataset {evicted} to stay within DATASET_MEMORY_BUDGET")
+      return value
+
+  def dataset_cache_stats(self) -> Dict[str, int]:
+    """The dataset cache's hits, misses (each one a load) and evictions so far, plus how many datasets and bytes are loaded now."""
+    with self._lock:
+      return {**self._dataset_stats, 'size': len(self._loaded), 'bytes': self._loaded_bytes}
+
+  def read(self, query: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a query on this snapshot's version of the database.
+
+    Args:
+      query (Callable[..., Any]): Called as query(conn, *args), e.g. utils.db.fetch_rows. It must read everything it needs before returning.
+      *args (Any): The rest of its arguments.
+
+    Returns:
+      Any: Whatever the query returns.
+    """
+    if self._conn_pid != os.getpid():
+      raise RuntimeError(f"Data version {self.version} was loaded in another process")
+    with self._conn_lock:
+      return query(self._conn, *args)
+
+  def reopen(self) -> bool:
+    """
+    Open this process's own connection after a fork, since an SQLite connection mustn't be used on both sides of one.
+
+    Returns:
+      bool: False if the database was replaced since the snapshot was loaded, so this version can't be read any more.
+    """
+    conn = connect_readonly(DB_PATH, immutable=True, check_same_thread=False)
+    if read_data_version(conn) != self.version:
+      conn.close()
+      return False
+    # The parent's connection is left for the garbage collector; an immutable connection holds no locks to release
+    self._conn, self._conn_pid, self._conn_lock = conn, os.getpid(), threading.Lock()
+    return True
+
+  def rows(self, tab_id: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Read every row of an episode, as (columns, rows)."""
+    table_name = self.datasets[tab_id].table_name
+    if self.store is not None:
+      table = self.store.table(table_name)
+      return table.columns, table.to_pylist()
+    return self.read(fetch_rows, table_name)
+
+  def stored_column_types(self, tab_id: str) -> Dict[str, str]:
+    """The column types json_to_sqlite.py stored for an episode, or an empty dict for databases that predate them."""
+    return self._column_types[tab_id]
+
+def load_snapshot() -> DataSnapshot:
+  """
+  Load the registry of the episode data as it is on disk right now.
+  The version, the datasets and their column types are read through the snapshot's own connection, so they can't straddle an update.
+  The rows themselves are only read when they're needed, through the same connection.
+
+  Returns:
+    DataSnapshot: The snapshot.
+  """
+  conn = connect_readonly(DB_PATH, immutable=True, check_same_thread=False)
+  try:
+    version = read_data_version(conn)
+    datasets = read_datasets(conn)
+    column_types = {dataset.tab_id: read_column_types(conn, dataset.table_name) for dataset in datasets}
+    store = _open_store(version)
+  except BaseException:
+    conn.close()
+    raise
+  return DataSnapshot(version, conn, store, datasets, column_types)
+
+def _open_store(version: str) -> ColumnarStore | None:
+  # Only use the columnar file if it was built from the same version of the database
+  # The map keeps pointing at the file it was opened on even after json_to_sqlite.py replaces it
+  if DATA_BACKEND == 'sqlite' or not os.path.exists(STORE_PATH):
+    return None
+  store = ColumnarStore(STORE_PATH)
+  if store.data_version != version:
+    if DATA_BACKEND == 'columnar':
+      raise RuntimeError(f"{STORE_PATH} is stale, rerun utils/json_to_sqlite.py")
+    logger.warning(f"{STORE_PATH} doesn't match {DB_PATH}, reading from SQLite instead")
+    return None
+  return store
+
+_snapshot: DataSnapshot | None = None
+_signature: Tuple | None = None
+_next_check = 0.0
+_reload_lock = threading.Lock()
+
+def check_for_update(force: bool = False) -> DataSnapshot:
+  """
+  Swap in a new snapshot if xenosaga.db or the columnar file changed on disk, checking at most every DATA_RELOAD_INTERVAL seconds.
+  Requests already running keep the snapshot they started with.
+
+  Args:
+    force (bool): Check the files now, even if the interval hasn't passed.
+
+  Returns:
+    DataSnapshot: The latest snapshot.
+  """
+  global _snapshot, _signature, _next_check
+  now = time.monotonic()
+  if _snapshot is not None and not force and (DATA_RELOAD_INTERVAL <= 0 or now < _next_check):
+    return _snapshot
+  with _reload_lock:
+    _next_check = now + DATA_RELOAD_INTERVAL
+    signature = _file_signature()
+    if _snapshot is not None and signature == _signature:
+      return _snapshot
+    try:
+      snapshot = load_snapshot()
+    except (OSError, RuntimeError, sqlite3.Error) as e:
+      # Most likely caught halfway through an update (e.g. the database is new but the columnar file isn't yet)
+      if _snapshot is None:
+        raise
+      logger.warning(f"Keeping data version {_snapshot.version}, couldn't load the new data: {e}")
+      return _snapshot
+    if _snapshot is not None and snapshot.version != _snapshot.version:
+      logger.info(f"Reloaded episode data: version {_snapshot.version} -> {snapshot.version}")
+    # Swapping the reference is atomic, so every request sees either the old snapshot or the new one
+    _snapshot, _signature = snapshot, signature
+    return snapshot
+
+def _reopen_after_fork() -> None:
+  # Runs in every gunicorn worker as it's forked from the preloaded master
+  global _snapshot, _signature
+  if _snapshot is not None and not _snapshot.reopen():
+    # The files were replaced between the master loading them and this worker starting, and no request is pinned to the old snapshot yet
+    _snapshot = _signature = None
+
+os.register_at_fork(after_in_child=_reopen_after_fork)
+
+def current_snapshot() -> DataSnapshot:
+  """
+  The snapshot to use. Inside a request it's pinned on first use, so one callback never sees two versions of the data.
+
+  Returns:
+    DataSnapshot: The snapshot.
+  """
+  if has_request_context():
+    snapshot = g.get('data_snapshot')
+    if snapshot is None:
+      snapshot = g.data_snapshot = check_for_update()
+    return snapshot
+  return _snapshot if _snapshot is not None else check_for_update()
+
+def current_data_version() -> str:
+  """The version of the data being served, e.g. to key caches and URLs on."""
+  return current_snapshot().version
+
+def connect_current() -> sqlite3.Connection:
+  """
+  Get this thread's pooled read-only connection, on the same version of the database as the current snapshot.
+  If the file was replaced since the request pinned its snapshot, the request is moved onto the new snapshot instead,
+  so call this before reading anything else from the snapshot.
+
+  Returns:
+    sqlite3.Connection: The connection. It belongs to the pool (see utils.db.pooled_connection), so don't close it.
+  """
+  conn = pooled_connection()
+  if read_data_version(conn) != current_snapshot().version:
+    snapshot = check_for_update(force=True)
+    if has_request_context():
+      g.data_snapshot = snapshot
+  return conn
+
+def get_episode_store() -> ColumnarStore | None:
+  """
+  The memory-mapped columnar store of the current snapshot.
+
+  Returns:
+    ColumnarStore | None: The store, or None when reading straight from SQLite.
+  """
+  return current_snapshot().store
+
+def get_datasets() -> Dict[str, Dataset]:
+  """
+  Get every dataset the current snapshot holds, one per tab.
+
+  Returns:
+    Dict[str, Dataset]: Tab id to dataset mapping, in tab order. Callers must not mutate it.
+  """
+  return current_snapshot().datasets
+
+def get_dataset(tab_id: str) -> Dataset | None:
+  """
+  Look up one dataset of the current snapshot.
+
+  Args:
+    tab_id (str): The tab id, e.g. 'ep1'.
+
+  Returns:
+    Dataset | None: The dataset, or None if there's no such tab.
+  """
+  return current_snapshot().datasets.get(tab_id)
+
+def get_dataset_cache_stats() -> Dict[str, int]:
+  """
+  Report how the dataset cache is doing in this worker, for the current snapshot.
+
+  Returns:
+    Dict[str, int]: The hit, miss (load) and eviction counts, plus how many datasets and bytes are loaded.
+  """
+  return current_snapshot().dataset_cache_stats()
+
+def get_column_types(tab_id: str) -> Dict[str, str]:
+  """
+  Get the column types json_to_sqlite.py stored for an episode.
+
+  Args:
+    tab_id (str): The tab id, e.g. 'ep1'.
+
+  Returns:
+    Dict[str, str]: Column name to type mapping, in column order. Callers must not mutate it.
+  """
+  snapshot = current_snapshot()
+
+  def build():
+    column_types = snapshot.stored_column_types(tab_id)
+    if not column_types:
+      # Databases built before the schema table existed need pandas to infer the types
+      import pandas as pd
+      from utils.inference import infer_column_types
+      columns, rows = snapshot.rows(tab_id)
+      column_types = infer_column_types(pd.DataFrame(rows, columns=columns))
+    return column_types
+
+  return snapshot.cached(('column_types', tab_id), build)
+
+def read_episode_rows(tab_id: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+  """
+  Read every row of an episode, from the columnar store if there is one and from SQLite otherwise.
+
+  Args:
+    tab_id (str): The tab id, e.g. 'ep1'.
+
+  Returns:
+    Tuple[List[str], List[Dict[str, Any]]]: The column names and the rows (in table order, with NULL as None).
+  """
+  return current_snapshot().rows(tab_id)
+
+def register_data_reload(server) -> None:
+  """
+  Check for new data at the start of every request (throttled by DATA_RELOAD_INTERVAL) and pin the request to one snapshot.
+
+  Args:
+    server (Flask): The Dash app's Flask server.
+  """
+  @server.before_request
+  def pin_snapshot():
+    g.data_snapshot = check_for_update()
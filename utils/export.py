@@ -0,0 +1,175 @@
+from typing import Any, Dict, Iterator, List, Tuple
+from utils.query import build_order_by, build_where_clause, quote_identifier
+from utils.schema import RANGE_BOUND, storage_types
+import csv
+import io
+import json
+import sqlite3
+
+EXPORT_FORMATS = ('csv', 'parquet')
+
+# How many rows are read from SQLite at a time, which is also the size of each Parquet row group
+# Only one chunk is ever held in memory, however big the export is
+CHUNK_ROWS = 1000
+
+# The column that says which game each row is from, added to exports that span several episodes
+EPISODE_COLUMN = 'Episode'
+
+# The Parquet type of each storage type. Categories are plain strings, since Parquet dictionary encodes strings anyway
+_ARROW_TYPES = {'int32': 'int32', 'float64': 'float64', 'category': 'string', 'string': 'string'}
+
+# (episode label, SQL, parameters) for every episode in an export, in order
+ExportQuery = Tuple[str, str, List[Any]]
+
+def export_columns(tables: Dict[str, Dict[str, str]], episode_column: bool = False) -> Dict[str, str]:
+  """
+  Work out the columns of an export and their storage types.
+  The range min/max columns are left out, they're only there for the grid to sort and filter on.
+
+  Args:
+    tables (Dict[str, Dict[str, str]]): Table name to column types (as stored by json_to_sqlite.py) for every episode in the export.
+    episode_column (bool): Start with an 'Episode' column saying which game each row is from.
+
+  Returns:
+    Dict[str, str]: Column name to storage type, in order: every episode's columns in the order they first appear, then the uuid.
+    A column stored as different types in different episodes is exported as text.
+  """
+  columns = {EPISODE_COLUMN: 'string'} if episode_column else {}
+  for table_name, column_types in tables.items():
+    for column, storage_type in storage_types(table_name, column_types).items():
+      if column_types.get(column) == RANGE_BOUND:
+        continue
+      columns[column] = storage_type if columns.get(column, storage_type) == storage_type else 'string'
+  # Keep the uuid last, rather than between the first episode's columns and the rest
+  if 'uuid' in columns:
+    columns['uuid'] = columns.pop('uuid')
+  return columns
+
+def build_export_queries(
+  tables: Dict[str, Tuple[str, Dict[str, str]]],
+  filter_model: Dict[str, Any] | None = None,
+  sort_model: List[Dict[str, Any]] | None = None,
+  uuids: List[str] | None = None,
+) -> List[ExportQuery]:
+  """
+  Build the query for every episode in an export, with the grid's filter and sort semantics.
+
+  Args:
+    tables (Dict[str, Tuple[str, Dict[str, str]]]): Table name to (episode label, column types) for every episode in the export, in order.
+    filter_model (Dict[str, Any] | None): An AG Grid filterModel, applied to every episode.
+    sort_model (List[Dict[str, Any]] | None): An AG Grid sortModel. Rows are sorted within each episode, and the episodes follow each other in order.
+    uuids (List[str] | None): Only export these enemies, e.g. the matches of a facet query.
+
+  Returns:
+    List[ExportQuery]: (episode label, SQL, parameters) per episode.
+
+  Raises:
+    ValueError: If the models name a column one of the episodes doesn't have, or an unsupported filter.
+  """
+  queries = []
+  for table_name, (label, column_types) in tables.items():
+    where, params = build_where_clause(filter_model, column_types)
+    if uuids is not None:
+      # One parameter however many uuids there are, instead of a placeholder each
+      where = f"{where} AND uuid IN (SELECT value FROM json_each(?))" if where else "WHERE uuid IN (SELECT value FROM json_each(?))"
+      params = params + [json.dumps(uuids)]
+    columns = ', '.join(quote_identifier(column) for column, kind in column_types.items() if kind != RANGE_BOUND)
+    queries.append((label, f"SELECT {columns} FROM {table_name} {where} {build_order_by(sort_model, column_types)}", params))
+  return queries
+
+def _chunks(conn: sqlite3.Connection, queries: List[ExportQuery], columns: Dict[str, str]) -> Iterator[List[Tuple[Any, ...]]]:
+  # Read each episode's rows a chunk at a time, lined up with the export's columns (None where an episode doesn't have one)
+  for label, sql, params in queries:
+    cursor = conn.execute(sql, params)
+    names = [description[0] for description in cursor.description]
+    positions = [names.index(column) if column in names else None for column in columns]
+    while rows := cursor.fetchmany(CHUNK_ROWS):
+      yield [
+        tuple(label if column == EPISODE_COLUMN and position is None else (row[position] if position is not None else None) for column, position in zip(columns, positions))
+        for row in rows
+      ]
+
+def stream_csv(conn: sqlite3.Connection, queries: List[ExportQuery], columns: Dict[str, str]) -> Iterator[bytes]:
+  """
+  Stream an export as CSV, starting with the header row.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    queries (List[ExportQuery]): From build_export_queries().
+    columns (Dict[str, str]): From export_columns().
+
+  Yields:
+    bytes: UTF-8 CSV, one chunk of rows at a time. Missing values are empty.
+  """
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(columns)
+  # The header goes out before the first query runs
+  yield buffer.getvalue().encode('utf-8')
+  for rows in _chunks(conn, queries, columns):
+    buffer.seek(0)
+    buffer.truncate()
+    writer.writerows(rows)
+    yield buffer.getvalue().encode('utf-8')
+
+class _ChunkSink:
+  # A write-only file for pyarrow that hands back whatever was written since the last drain, so nothing piles up
+  closed = False
+
+  def __init__(self):
+    self._parts: List[bytes] = []
+    self._position = 0
+
+  def write(self, data) -> int:
+    data = bytes(data)
+    self._parts.append(data)
+    self._position += len(data)
+    return len(data)
+
+  def tell(self) -> int:
+    return self._position
+
+  def writable(self) -> bool:
+    return True
+
+  def flush(self) -> None:
+    pass
+
+  def close(self) -> None:
+    self.closed = True
+
+  def drain(self) -> bytes:
+    data = b''.join(self._parts)
+    self._parts.clear()
+    return data
+
+def stream_parquet(conn: sqlite3.Connection, queries: List[ExportQuery], columns: Dict[str, str]) -> Iterator[bytes]:
+  """
+  Stream an export as a Parquet file, one row group per chunk of rows.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    queries (List[ExportQuery]): From build_export_queries().
+    columns (Dict[str, str]): From export_columns().
+
+  Yields:
+    bytes: The file, a row group at a time, with the footer last.
+  """
+  # pyarrow is only needed for Parquet, so the workers don't import it until someone asks for one
+  import pyarrow as pa
+  import pyarrow.parquet as pq
+  schema = pa.schema([(column, getattr(pa, _ARROW_TYPES[storage_type])()) for column, storage_type in columns.items()])
+  text_columns = [_ARROW_TYPES[storage_type] == 'string' for storage_type in columns.values()]
+  sink = _ChunkSink()
+  writer = pq.ParquetWriter(sink, schema)
+  yield sink.drain()
+  for rows in _chunks(conn, queries, columns):
+    arrays = [
+      # Text columns can hold numbers in SQLite (e.g. a column that's only text in some episodes), so make them strings
+      pa.array([None if value is None else str(value) for value in values] if is_text else list(values), type=field.type)
+      for values, is_text, field in zip(zip(*rows), text_columns, schema)
+    ]
+    writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=CHUNK_ROWS)
+    yield sink.drain()
+  writer.close()
+  yield sink.drain()
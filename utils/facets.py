@@ -0,0 +1,285 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+from utils.db import fetch_rows
+from utils.episodes import current_snapshot
+from utils.schema import Dataset
+import re
+import sqlite3
+
+# Every enemy in every episode gets a row id, in table order, and each (facet, value) pair gets a bitmap with a bit set for every row that has it
+# The bitmaps are Python ints, so intersecting two of them is one & and counting one is int.bit_count()
+ROWS_TABLE = 'facet_rows'
+BITMAP_TABLE = 'facet_bitmaps'
+
+# Which columns feed each facet is part of each dataset's registry entry (facet_fields and resistance_fields, see DATASETS in utils/schema.py)
+# With resistance_fields the column is the value and the cell decides the facet, so "Fire: 150" puts Fire under 'weak' and "Slow: Immune" puts Slow under 'status_immune'
+
+# Episode II calls Lightning "Thunder", so it's indexed as Lightning to line up with the other episodes
+VALUE_ALIASES = {'Thunder': 'Lightning'}
+
+# Every facet, in the order they're reported. 'episode' is the tab id, so a query can be narrowed to one game
+FACETS = ('episode', 'type', 'drop', 'weak', 'strong', 'absorbs', 'immune', 'status_immune')
+
+# Cells are lists like "Fire, Lightning" or "Spirit / Slash", sometimes with asterisks around a note ("*Changes*")
+_SEPARATOR = re.compile(r'\s*(?:,|/)\s*')
+# Episode II's drops carry their drop rate, e.g. "Scrap Iron (50%)"
+_DROP_RATE = re.compile(r'\s*\(\d+(?:\.\d+)?%\)$')
+
+def tokenize(facet: str, value: Any) -> List[str]:
+  """
+  Split a cell into the facet values it holds.
+
+  Args:
+    facet (str): The facet the cell feeds, e.g. 'drop'.
+    value (Any): The cell, e.g. "Fire, Lightning" or "Scrap Iron (50%)".
+
+  Returns:
+    List[str]: The values, e.g. ['Fire', 'Lightning']. Missing values ('N/A', '', None) give an empty list.
+  """
+  if value is None:
+    return []
+  text = str(value).strip()
+  if text in ('', 'N/A'):
+    return []
+  if facet == 'drop':
+    # Item names can contain commas or slashes of their own, so a drop cell is always one item
+    return [_DROP_RATE.sub('', text)]
+  tokens = [token.strip('*') for token in _SEPARATOR.split(text)]
+  return [VALUE_ALIASES.get(token, token) for token in tokens if token and token != 'N/A']
+
+def _resistance_facet(value: Any) -> str | None:
+  # An element's damage percentage: over 100 is a weakness, under 0 heals (absorbs), 0 does nothing and anything else is resisted
+  text = str(value).strip().lower() if value is not None else ''
+  if text in ('weak', 'strong'):
+    return text
+  try:
+    percent = float(text)
+  except ValueError:
+    return None
+  if percent > 100:
+    return 'weak'
+  if percent < 0:
+    return 'absorbs'
+  if percent == 0:
+    return 'immune'
+  return 'strong' if percent < 100 else None
+
+def row_facets(dataset: Dataset, row: Dict[str, Any]) -> Iterable[Tuple[str, str]]:
+  """
+  List every (facet, value) pair an enemy has, apart from its episode.
+
+  Args:
+    dataset (Dataset): The dataset the row is from. Its facet_fields and resistance_fields say which columns feed which facet.
+    row (Dict[str, Any]): The row.
+
+  Returns:
+    Iterable[Tuple[str, str]]: The pairs, possibly with duplicates.
+  """
+  for facet, columns in dataset.facet_fields.items():
+    for column in columns:
+      for value in tokenize(facet, row.get(column)):
+        yield facet, value
+  resistances = dataset.resistance_fields
+  for column in resistances.get('elements', []):
+    facet = _resistance_facet(row.get(column))
+    if facet is not None:
+      yield facet, VALUE_ALIASES.get(column, column)
+  for column in resistances.get('statuses', []):
+    if str(row.get(column)).strip().lower() == 'immune':
+      yield 'status_immune', column
+
+def build_bitmaps(tables: Iterable[Tuple[Dataset, List[Dict[str, Any]]]]) -> Tuple[List[Tuple[str, str, str]], Dict[str, Dict[str, int]]]:
+  """
+  Tokenize every episode into per-value bitmaps.
+
+  Args:
+    tables (Iterable[Tuple[Dataset, List[Dict[str, Any]]]]): (dataset, rows) for every episode, in order.
+
+  Returns:
+    Tuple[List[Tuple[str, str, str]], Dict[str, Dict[str, int]]]: The (tab id, uuid, name) of every row id, and the bitmap of every value of every facet.
+  """
+  refs: List[Tuple[str, str, str]] = []
+  bitmaps: Dict[str, Dict[str, int]] = {facet: {} for facet in FACETS}
+  for dataset, rows in tables:
+    unknown = set(dataset.facet_fields) - set(FACETS)
+    if unknown:
+      raise ValueError(f"{dataset.table_name} feeds unknown facets: {sorted(unknown)}")
+    for row in rows:
+      bit = 1 << len(refs)
+      refs.append((dataset.tab_id, row['uuid'], row['Name']))
+      bitmaps['episode'][dataset.tab_id] = bitmaps['episode'].get(dataset.tab_id, 0) | bit
+      for facet, value in row_facets(dataset, row):
+        bitmaps[facet][value] = bitmaps[facet].get(value, 0) | bit
+  return refs, bitmaps
+
+class FacetResult(NamedTuple):
+  """
+  The enemies matching a facet query.
+
+  Attributes:
+    count (int): How many enemies matched.
+    hits (List[Dict[str, str]]): The matches (up to the limit), in episode then table order, each with the uuid, name and tab id.
+    counts (Dict[str, Dict[str, int]]): For every facet, how many enemies each of its values would match alongside the other facets' filters.
+      A facet's own filter is left out of its counts, so the UI can show what picking a different value would give.
+  """
+  count: int
+  hits: List[Dict[str, str]]
+  counts: Dict[str, Dict[str, int]]
+
+class FacetIndex:
+  """
+  Bitmap indexes over the enemies' types, drops, elements and status immunities, across every episode.
+  Values within a facet are matched case-insensitively and or-ed together; facets are and-ed.
+  """
+
+  def __init__(self, refs: List[Tuple[str, str, str]], bitmaps: Dict[str, Dict[str, int]]):
+    self._refs = refs
+    self._bitmaps = {facet: bitmaps.get(facet, {}) for facet in FACETS}
+    # Map each value's casefolded spelling back to its bitmap, so "revive dx" finds "Revive DX"
+    self._lookup = {
+      facet: {value.casefold(): bitmap for value, bitmap in values.items()}
+      for facet, values in self._bitmaps.items()
+    }
+    self._all = (1 << len(refs)) - 1
+
+  def values(self, facet: str) -> Dict[str, int]:
+    """Every value of a facet and how many enemies have it."""
+    return {value: bitmap.bit_count() for value, bitmap in self._bitmaps[facet].items()}
+
+  def select(self, filters: Dict[str, str | List[str]]) -> int:
+    """
+    The bitmap of the enemies matching some filters.
+
+    Args:
+      filters (Dict[str, str | List[str]]): Facet to value (or list of values, any of which can match) mapping, e.g. {'type': 'Mechanical', 'weak': 'Lightning'}.
+
+    Returns:
+      int: Bit n is set if the enemy with row id n matches.
+    """
+    selection = self._all
+    for facet, bitmap in self._facet_bitmaps(filters).items():
+      selection &= bitmap
+    return selection
+
+  def query(self, filters: Dict[str, str | List[str]], limit: int | None = None) -> FacetResult:
+    """
+    Find the enemies matching some filters, with the counts of every facet value alongside them.
+
+    Args:
+      filters (Dict[str, str | List[str]]): Facet to value (or list of values, any of which can match) mapping, e.g. {'episode': 'ep2', 'status_immune': 'Slow'}.
+      limit (int | None): The most hits to return. The count is always the full count.
+
+    Returns:
+      FacetResult: The count, hits and per-value counts.
+    """
+    facet_bitmaps = self._facet_bitmaps(filters)
+    selection = self._all
+    for bitmap in facet_bitmaps.values():
+      selection &= bitmap
+
+    counts = {}
+    for facet, values in self._bitmaps.items():
+      # Everything but this facet's own filter
+      others = self._all
+      for other, bitmap in facet_bitmaps.items():
+        if other != facet:
+          others &= bitmap
+      counts[facet] = {value: count for value, bitmap in values.items() if (count := (others & bitmap).bit_count())}
+
+    return FacetResult(selection.bit_count(), self.hits(selection, limit), counts)
+
+  def hits(self, selection: int, limit: int | None = None) -> List[Dict[str, str]]:
+    """
+    List the enemies in a selection from select(), in episode then table order.
+
+    Args:
+      selection (int): The bitmap.
+      limit (int | None): The most hits to return.
+
+    Returns:
+      List[Dict[str, str]]: Each hit's uuid, name and tab id.
+    """
+    hits = []
+    remaining = selection
+    while remaining and (limit is None or len(hits) < limit):
+      lowest = remaining & -remaining
+      tab_id, uuid, name = self._refs[lowest.bit_length() - 1]
+      hits.append({'uuid': uuid, 'name': name, 'tab_id': tab_id})
+      remaining ^= lowest
+    return hits
+
+  def _facet_bitmaps(self, filters: Dict[str, str | List[str]]) -> Dict[str, int]:
+    # Or together the values asked for in each facet. Unknown values match nothing, unknown facets are a caller error
+    result = {}
+    for facet, values in filters.items():
+      if facet not in self._lookup:
+        raise ValueError(f"Unknown facet {facet!r}, expected one of {', '.join(FACETS)}")
+      if isinstance(values, str):
+        values = [values]
+      bitmap = 0
+      for value in values:
+        bitmap |= self._lookup[facet].get(value.strip().casefold(), 0)
+      result[facet] = bitmap
+    return result
+
+def write_facet_index(conn: sqlite3.Connection, datasets: List[Dataset]) -> None:
+  """
+  Tokenize every episode into the facet bitmaps at ETL time, so the app only has to read them.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database, with the episode tables already written.
+    datasets (List[Dataset]): The datasets to index, in tab order.
+  """
+  refs, bitmaps = build_bitmaps(
+    (dataset, fetch_rows(conn, dataset.table_name)[1]) for dataset in datasets
+  )
+
+  conn.execute(f"DROP TABLE IF EXISTS {ROWS_TABLE}")
+  conn.execute(f"DROP TABLE IF EXISTS {BITMAP_TABLE}")
+  conn.execute(f"CREATE TABLE {ROWS_TABLE} (row_id INTEGER PRIMARY KEY, tab_id TEXT NOT NULL, uuid TEXT NOT NULL, name TEXT NOT NULL)")
+  conn.execute(f"CREATE TABLE {BITMAP_TABLE} (facet TEXT NOT NULL, value TEXT NOT NULL, bitmap BLOB NOT NULL, PRIMARY KEY (facet, value))")
+  conn.executemany(f"INSERT INTO {ROWS_TABLE} (row_id, tab_id, uuid, name) VALUES (?, ?, ?, ?)", [(row_id, *ref) for row_id, ref in enumerate(refs)])
+  # Little-endian, so byte 0 holds row ids 0 to 7
+  conn.executemany(
+    f"INSERT INTO {BITMAP_TABLE} (facet, value, bitmap) VALUES (?, ?, ?)",
+    [(facet, value, bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')) for facet, values in bitmaps.items() for value, bitmap in values.items()],
+  )
+
+def read_facet_index(conn: sqlite3.Connection) -> FacetIndex | None:
+  """
+  Read the facet bitmaps json_to_sqlite.py wrote.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+
+  Returns:
+    FacetIndex | None: The index, or None if the database predates the facet tables.
+  """
+  try:
+    refs = [tuple(row) for row in conn.execute(f"SELECT tab_id, uuid, name FROM {ROWS_TABLE} ORDER BY row_id")]
+    rows = conn.execute(f"SELECT facet, value, bitmap FROM {BITMAP_TABLE}").fetchall()
+  except sqlite3.OperationalError:
+    return None
+  bitmaps: Dict[str, Dict[str, int]] = {}
+  for facet, value, bitmap in rows:
+    bitmaps.setdefault(facet, {})[value] = int.from_bytes(bitmap, 'little')
+  return FacetIndex(refs, bitmaps)
+
+def get_facet_index() -> FacetIndex:
+  """
+  Get the facet index for the current snapshot, reading the bitmaps json_to_sqlite.py wrote.
+
+  Returns:
+    FacetIndex: The index. Callers must not mutate it.
+  """
+  snapshot = current_snapshot()
+
+  def build():
+    index = snapshot.read(read_facet_index)
+    if index is None:
+      # Databases built before the facet tables existed get tokenized once here instead
+      index = FacetIndex(*build_bitmaps(
+        (dataset, snapshot.rows(tab_id)[1]) for tab_id, dataset in snapshot.datasets.items()
+      ))
+    return index
+
+  return snapshot.cached('facet_index', build)
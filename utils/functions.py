@@ -1,29 +1,35 @@
-import pandas as pd
+from typing import Any, Dict, List
+from utils.schema import RANGE_BOUND, range_bound_columns
+import json
 
-# Create a function to generate the column definitions based on the dataframe
-def generate_column_defs(df):
-  # Determine if a column is numeric based on a sampling of 100 values from the column
-  # I did this way because I'm too lazy to properly cast dtypes for the 30+ columns across all 3 episode dataframes
-  def is_numeric_col(df, column_name):
-    # If dtype is already numeric, return True
-    if pd.api.types.is_numeric_dtype(df[column_name].dtype):
-      return True
-    # If dtype is object, sample some rows and test if they can be converted to numbers
-    non_na_values = df[column_name].dropna() # Drop NA values
-    sample_values = non_na_values.sample(min(100, len(non_na_values))).tolist()
-    try:
-      # Try converting the sample values to numbers
-      [float(x) for x in sample_values]
-      return True
-    except ValueError:
-      # If conversion fails, it's not a numeric column
-      return False
+# Create a function to generate the column definitions based on the table's columns
+def generate_column_defs(columns: List[str], column_types: Dict[str, str]) -> List[Dict[str, Any]]:
+  """
+  Generate the AG Grid column definitions for an episode table.
 
-  # Extracts the starting number from a cell's content, especially if the content represents a range like "100-200"
-  # This is used to sort the numeric columns properly
+  Args:
+    columns (List[str]): The table's columns, in order.
+    column_types (Dict[str, str]): Column name to type ('numeric', 'range', 'range_bound', or 'text') mapping, as stored by json_to_sqlite.py.
+
+  Returns:
+    List[Dict[str, Any]]: The column definitions.
+  """
+  def is_numeric_col(column_name):
+    return column_types.get(column_name) in ('numeric', 'range')
+
+  # json_to_sqlite.py stores a numeric min column next to every range like "100-200"
+  # The grid sorts and filters on that number and only uses the original text for display
+  def get_range_min_column(column_name):
+    min_column, _ = range_bound_columns(column_name)
+    if column_types.get(column_name) == 'range' and column_types.get(min_column) == RANGE_BOUND:
+      return min_column
+    return None
+
+  # Databases built before the min/max columns existed still need ranges parsed in the browser
+  # parseFloat() takes the starting number of a range and handles negative numbers like "-100"
   def get_value_getter(column_name):
-    if is_numeric_col(df, column_name):
-      return {"function": f"return params.data.{column_name} && params.data.{column_name}.split('-')[0] ? Number(params.data.{column_name}.split('-')[0]) : null"}
+    if column_types.get(column_name) == 'range' and get_range_min_column(column_name) is None:
+      return {"function": f"params.data[{json.dumps(column_name)}] == null ? null : parseFloat(params.data[{json.dumps(column_name)}])"}
     else:
       return None
   
@@ -43,25 +49,31 @@ def generate_column_defs(df):
       "suppressMenu": True
     }
   ]
-  # Add other columns except the "Name" or "uuid" column
-  for i in df.columns:
-    if i not in ["Name", "uuid"]:
+  # Add other columns except the "Name" or "uuid" column, and the range min/max columns which are never shown on their own
+  for i in columns:
+    if i not in ["Name", "uuid"] and column_types.get(i) != RANGE_BOUND:
       column_def = {
         "field": i,
-        "filter": "agNumberColumnFilter" if is_numeric_col(df, i) else "agTextColumnFilter",
+        "filter": "agNumberColumnFilter" if is_numeric_col(i) else "agTextColumnFilter",
         "floatingFilter": True,
-        "floatingFilterComponentParams": {"suppressFilterButton": False} if is_numeric_col(df, i) else {"filterPlaceholder": "Search..."},
+        "floatingFilterComponentParams": {"suppressFilterButton": False} if is_numeric_col(i) else {"filterPlaceholder": "Search..."},
         "minWidth": 120,
         "resizable": True,
         "sortable": True,
         "suppressMenu": True,
         "tooltipField": i, # Set the tooltip field to the column name
-        "type": "numericColumn" if is_numeric_col(df, i) else "textColumn",
-        "valueFormatter": {"function": "d3.format(',.0f')(params.value)"} if is_numeric_col(df, i) else None,
+        "type": "numericColumn" if is_numeric_col(i) else "textColumn",
+        "valueFormatter": {"function": "d3.format(',.0f')(params.value)"} if is_numeric_col(i) else None,
         "valueGetter": get_value_getter(i),
       }
+      # Point range columns at their numeric min column, but keep showing the original text
+      min_column = get_range_min_column(i)
+      if min_column is not None:
+        column_def["field"] = min_column
+        column_def["headerName"] = i
+        column_def["valueFormatter"] = {"function": f"params.data[{json.dumps(i)}]"}
       # Only add tooltipComponent for string columns
-      if not is_numeric_col(df, i):
+      if not is_numeric_col(i):
         column_def["tooltipComponent"] = "CustomTooltip"
       
       column_defs.append(column_def)
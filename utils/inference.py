@@ -0,0 +1,130 @@
+from typing import Dict, Tuple
+from utils.schema import EPISODE_SCHEMAS, MISSING_VALUES, PANDAS_DTYPES, RANGE_BOUND, RANGE_PATTERN, range_bound_columns, storage_types
+import pandas as pd
+
+# Column type inference and normalization, run by json_to_sqlite.py
+# Kept apart from utils/schema.py so the app can read the stored types without importing pandas
+
+def infer_column_type(series: pd.Series) -> str:
+  """
+  Work out whether a column holds numbers, numeric ranges, or text.
+  Every value in the column is checked, so the answer is the same every time.
+
+  Args:
+    series (pd.Series): The column to inspect.
+
+  Returns:
+    str: 'numeric', 'range', or 'text'.
+    Columns added by normalize_numeric_columns() are typed 'range_bound' instead.
+  """
+  if pd.api.types.is_numeric_dtype(series.dtype):
+    return 'numeric'
+  values = series.dropna().astype(str).str.strip()
+  values = values[~values.isin(MISSING_VALUES)]
+  if values.empty:
+    return 'text'
+  parsed = pd.to_numeric(values, errors='coerce')
+  if parsed.notna().all():
+    return 'numeric'
+  # Anything that isn't a plain number has to be a range for the column to count as one
+  ranges = values[parsed.isna()].str.extract(RANGE_PATTERN)
+  if ranges.notna().all(axis=None):
+    return 'range'
+  return 'text'
+
+def infer_column_types(df: pd.DataFrame) -> Dict[str, str]:
+  """
+  Infer the type of every column in a dataframe.
+
+  Args:
+    df (pd.DataFrame): The dataframe to inspect.
+
+  Returns:
+    Dict[str, str]: Column name to type mapping, in column order.
+  """
+  return {column: infer_column_type(df[column]) for column in df.columns}
+
+def normalize_numeric_columns(df: pd.DataFrame, column_types: Dict[str, str]) -> Tuple[pd.DataFrame, Dict[str, str]]:
+  """
+  Store numbers as numbers so the grid can sort and filter them without parsing strings in the browser.
+  Numeric columns held as text are cast to numbers, and every range column gets a numeric min and max column next to it.
+  The original range text is kept for display.
+
+  Args:
+    df (pd.DataFrame): The episode dataframe.
+    column_types (Dict[str, str]): Column name to type mapping from infer_column_types().
+
+  Returns:
+    Tuple[pd.DataFrame, Dict[str, str]]: The normalized dataframe and its updated column types.
+  """
+  df = df.copy()
+  normalized_types = {}
+  for column, kind in column_types.items():
+    normalized_types[column] = kind
+    if kind == 'numeric' and not pd.api.types.is_numeric_dtype(df[column].dtype):
+      df[column] = pd.to_numeric(df[column].replace(MISSING_VALUES, None), errors='coerce')
+    elif kind == 'range':
+      values = df[column].astype('string').str.strip().replace(MISSING_VALUES, pd.NA)
+      single = pd.to_numeric(values, errors='coerce')
+      bounds = values.str.extract(RANGE_PATTERN).apply(pd.to_numeric, errors='coerce')
+      # Plain numbers are their own min and max, ranges get both ends (whichever way round they were written)
+      low = single.fillna(bounds[[0, 1]].min(axis=1))
+      high = single.fillna(bounds[[0, 1]].max(axis=1))
+      min_column, max_column = range_bound_columns(column)
+      df.insert(df.columns.get_loc(column) + 1, min_column, low.astype('float64'))
+      df.insert(df.columns.get_loc(min_column) + 1, max_column, high.astype('float64'))
+      normalized_types[min_column] = RANGE_BOUND
+      normalized_types[max_column] = RANGE_BOUND
+  return df, normalized_types
+
+def apply_storage_types(df: pd.DataFrame, types: Dict[str, str]) -> pd.DataFrame:
+  """
+  Cast columns to their storage types: nullable integers, categoricals and strings instead of floats and Python objects.
+
+  Args:
+    df (pd.DataFrame): The dataframe.
+    types (Dict[str, str]): Column name to storage type mapping, from utils.schema.storage_types(). Other columns are left alone.
+
+  Returns:
+    pd.DataFrame: The cast dataframe.
+
+  Raises:
+    ValueError: If a column can't be cast without losing data, e.g. a fraction or a number too big for 'int32'.
+  """
+  df = df.copy()
+  for column, storage_type in types.items():
+    series = df[column]
+    if storage_type in ('int32', 'float64') and not pd.api.types.is_numeric_dtype(series.dtype):
+      series = pd.to_numeric(series.replace(MISSING_VALUES, None), errors='raise')
+    try:
+      df[column] = series.astype(PANDAS_DTYPES[storage_type])
+    except (TypeError, ValueError) as e:
+      raise ValueError(f"{column} can't be stored as {storage_type}: {e}") from e
+  return df
+
+def enforce_schema(df: pd.DataFrame, table_name: str, column_types: Dict[str, str]) -> Tuple[pd.DataFrame, Dict[str, str]]:
+  """
+  Check a normalized episode dataframe against its declared schema and cast it to the declared storage types.
+
+  Args:
+    df (pd.DataFrame): The dataframe from normalize_numeric_columns().
+    table_name (str): The table, e.g. 'episode1'.
+    column_types (Dict[str, str]): Column name to type mapping from normalize_numeric_columns().
+
+  Returns:
+    Tuple[pd.DataFrame, Dict[str, str]]: The cast dataframe, and its column name to storage type mapping.
+
+  Raises:
+    ValueError: If columns are missing or undeclared, a range column is declared as an integer, or a value doesn't fit its type.
+  """
+  schema = EPISODE_SCHEMAS[table_name]
+  columns = [column for column, kind in column_types.items() if kind != RANGE_BOUND]
+  missing = [column for column in schema if column not in columns]
+  undeclared = [column for column in columns if column not in schema]
+  if missing or undeclared:
+    raise ValueError(f"{table_name} doesn't match its schema (missing: {missing}, undeclared: {undeclared}); update EPISODE_SCHEMAS in utils/schema.py")
+  for column in columns:
+    if column_types[column] == 'range' and schema[column] != 'string':
+      raise ValueError(f"{table_name}.{column} holds ranges like \"100-200\", so it has to be declared as 'string', not {schema[column]!r}")
+  types = storage_types(table_name, column_types)
+  return apply_storage_types(df, types), types
@@ -3,68 +3,307 @@
 Script to convert JSON episode data files to SQLite database.
 
 This script reads the JSON files from assets/json/ and creates a SQLite database
-at assets/xenosaga.db with three tables: episode1, episode2, and episode3.
+at assets/xenosaga.db with a table per dataset listed in DATASETS
+(utils/schema.py): episode1, episode2, and episode3. The datasets table records
+them, which is where the app gets its tabs from.
+It also infers the type of every column once and stores the result in the
+column_types table, so the app never has to guess at request time. Range
+values like "100-200" get numeric min/max columns stored next to them. Every
+table is checked against its declared schema (EPISODE_SCHEMAS in
+utils/schema.py) and stored with those types: whole numbers as INTEGER, and
+low-cardinality text as categories in the columnar copy. It builds
+the FTS5 search indexes used by the cross-episode search box and the bitmap
+facet indexes behind /api/facets, precompresses
+each episode's JSON for the /api/episode endpoints, and writes a memory-mapped
+columnar copy of the tables to assets/xenosaga.columns.
+
+By default the update is incremental: rows are upserted by uuid, and rows whose
+content hash hasn't changed are skipped. If nothing changed at all the database
+is left alone. Either way the new database is built in a temporary file and
+renamed over the old one, so the app never sees a missing or half-written file.
+A hash of every row is recorded as the data_version in the metadata table,
+which is what the app's caches are keyed on.
 
 Usage:
-    python utils/json_to_sqlite.py
+    python utils/json_to_sqlite.py [--full]
 """
 
+import argparse
+import datetime
+import hashlib
+import json
 import os
+import shutil
 import sqlite3
+import sys
 import pandas as pd
 
+# Allow running as a script from the repo root (python utils/json_to_sqlite.py)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from utils.columnar import STORE_PATH, ColumnarStore, write_columnar_store
+from utils.db import DB_PATH, METADATA_TABLE, read_metadata
+from utils.facets import write_facet_index
+from utils.inference import apply_storage_types, enforce_schema, infer_column_types, normalize_numeric_columns
+from utils.payloads import write_payload_blobs
+from utils.query import quote_identifier
+from utils.schema import DATASETS, SQLITE_TYPES, read_column_types, storage_types, write_column_types, write_datasets
+from utils.search import build_search_index
+
+# Where the episode JSON files are read from, anchored to the repo root like DB_PATH
+JSON_DIR = os.path.join(REPO_ROOT, 'assets', 'json')
+
+# Bump this when anything derived from the tables (column types, search and facet indexes, payload blobs) changes format,
+# so the data version changes too and every cache keyed on it is thrown away
+ETL_VERSION = 8
+
+# The content hash of every row, used to skip unchanged rows and to compute the data version
+HASH_TABLE = 'row_hashes'
+
+# The database is built in a private temporary file, so durability can wait until it's renamed into place
+BUILD_PRAGMAS = (
+    'PRAGMA journal_mode = MEMORY',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA locking_mode = EXCLUSIVE',
+)
+
+
+def row_hash(values):
+    """Hash a row's values, in column order."""
+    return hashlib.sha256(json.dumps(values, default=str, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def table_columns(conn, table_name):
+    """Return a table's (column, SQLite type) pairs in order, or an empty list if it doesn't exist."""
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA table_info({quote_identifier(table_name)})")]
+
+
+def create_table(conn, table_name, types):
+    """(Re)create an episode table with the declared column types, and index it on uuid and Name."""
+    conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+    conn.execute(f"DELETE FROM {HASH_TABLE} WHERE table_name = ?", (table_name,))
+    # Create it empty, then fill it with upserts like any other run
+    columns = ', '.join(f"{quote_identifier(column)} {SQLITE_TYPES[storage_type]}" for column, storage_type in types.items())
+    conn.execute(f"CREATE TABLE {table_name} ({columns})")
+    conn.execute(f"CREATE UNIQUE INDEX idx_{table_name}_uuid ON {table_name} (uuid)")
+    conn.execute(f"CREATE INDEX idx_{table_name}_name ON {table_name} (\"Name\")")
+
+
+def upsert_table(conn, table_name, df, types):
+    """
+    Bring a table in line with a dataframe, touching only the rows that changed.
+
+    Rows are matched on uuid. Changed rows are updated in place and keep their
+    position; new rows are added at the end. If the columns or their types
+    changed, the table is rebuilt from scratch.
+
+    Args:
+        types (dict): Column name to storage type mapping, from enforce_schema().
+
+    Returns:
+        dict: How many rows were inserted, updated, deleted and left unchanged.
+    """
+    columns = list(df.columns)
+    if table_columns(conn, table_name) != [(column, SQLITE_TYPES[types[column]]) for column in columns]:
+        create_table(conn, table_name, types)
+
+    known = dict(conn.execute(f"SELECT uuid, hash FROM {HASH_TABLE} WHERE table_name = ?", (table_name,)))
+    # Plain Python values, with None for anything missing, so sqlite3 can bind them
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    uuid_index = columns.index('uuid')
+    changed, hashes, seen = [], [], set()
+    for row in rows:
+        uuid = row[uuid_index]
+        seen.add(uuid)
+        digest = row_hash(row)
+        if known.get(uuid) != digest:
+            changed.append(row)
+            hashes.append((table_name, uuid, digest))
+
+    quoted = [quote_identifier(column) for column in columns]
+    updates = ', '.join(f"{column} = excluded.{column}" for column in quoted if column != '"uuid"')
+    conn.executemany(
+        f"INSERT INTO {table_name} ({', '.join(quoted)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT (uuid) DO UPDATE SET {updates}",
+        changed,
+    )
+    conn.executemany(
+        f"INSERT INTO {HASH_TABLE} (table_name, uuid, hash) VALUES (?, ?, ?) "
+        "ON CONFLICT (table_name, uuid) DO UPDATE SET hash = excluded.hash",
+        hashes,
+    )
 
-def convert_json_to_sqlite():
-    """Convert JSON episode files to SQLite database."""
-    # Paths
-    json_dir = 'assets/json'
-    db_path = 'assets/xenosaga.db'
+    removed = [(uuid,) for uuid in known if uuid not in seen]
+    conn.executemany(f"DELETE FROM {table_name} WHERE uuid = ?", removed)
+    conn.executemany(f"DELETE FROM {HASH_TABLE} WHERE table_name = ? AND uuid = ?", [(table_name, uuid) for (uuid,) in removed])
 
-    # Episode configuration - mapping table names to JSON files
-    episodes = {
-        'episode1': 'episode1.json',
-        'episode2': 'episode2.json',
-        'episode3': 'episode3.json',
+    inserted = sum(1 for _, uuid, _ in hashes if uuid not in known)
+    return {
+        'inserted': inserted,
+        'updated': len(hashes) - inserted,
+        'deleted': len(removed),
+        'unchanged': len(seen) - len(hashes),
     }
 
+
+def compute_data_version(conn, table_names):
+    """Hash the ETL version, the dataset registry, every table's column types and every row hash into the data version."""
+    digest = hashlib.sha256(f'etl:{ETL_VERSION}'.encode('utf-8'))
+    # A renamed or reordered tab changes the layout, so it's a new version too
+    digest.update(json.dumps(DATASETS).encode('utf-8'))
+    for table_name in table_names:
+        digest.update(table_name.encode('utf-8'))
+        digest.update(json.dumps(read_column_types(conn, table_name)).encode('utf-8'))
+        for uuid, row_digest in conn.execute(f"SELECT uuid, hash FROM {HASH_TABLE} WHERE table_name = ? ORDER BY uuid", (table_name,)):
+            digest.update(f'{uuid}:{row_digest}'.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def write_metadata(conn, values):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {METADATA_TABLE} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.executemany(
+        f"INSERT INTO {METADATA_TABLE} (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+        list(values.items()),
+    )
+
+
+def publish(temp_path, db_path):
+    """Flush the finished database to disk and atomically rename it over the live one."""
+    with open(temp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, db_path)
+    # Make the rename itself durable
+    directory = os.open(os.path.dirname(os.path.abspath(db_path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def columnar_store_version(path):
+    try:
+        return ColumnarStore(path).data_version
+    except (OSError, ValueError):
+        return None
+
+
+def convert_json_to_sqlite(full=False, json_dir=JSON_DIR, db_path=DB_PATH, store_path=STORE_PATH):
+    """
+    Convert JSON episode files to SQLite database.
+
+    Args:
+        full (bool): Rebuild every table from scratch instead of upserting the rows that changed.
+        json_dir (str): Directory with one <table_name>.json file per dataset.
+        db_path (str): Where to publish the database. Defaults to the one the app serves.
+        store_path (str): Where to write the columnar copy. Defaults to the one the app serves.
+    """
+    temp_path = f'{db_path}.tmp'
+
     try:
-        # Read the JSON files
+        # Read the JSON files, one per dataset
         dataframes = {}
-        for table_name, json_file in episodes.items():
-            json_path = os.path.join(json_dir, json_file)
-            dataframes[table_name] = pd.read_json(json_path, lines=True)
+        for dataset in DATASETS:
+            json_path = os.path.join(json_dir, f'{dataset.table_name}.json')
+            dataframes[dataset.table_name] = pd.read_json(json_path, lines=True)
 
-        # Remove existing database if it exists
-        if os.path.exists(db_path):
-            os.remove(db_path)
+        # Start from a copy of the live database (or an empty one), and leave the live one alone until the end
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if not full and os.path.exists(db_path):
+            shutil.copyfile(db_path, temp_path)
 
-        # Connect to the database and write dataframes
-        conn = sqlite3.connect(db_path)
+        conn = sqlite3.connect(temp_path)
         try:
+            for pragma in BUILD_PRAGMAS:
+                conn.execute(pragma)
+            previous_version = read_metadata(conn, 'data_version')
+
+            # Everything goes in one transaction
+            conn.execute('BEGIN')
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {HASH_TABLE} "
+                "(table_name TEXT NOT NULL, uuid TEXT NOT NULL, hash TEXT NOT NULL, PRIMARY KEY (table_name, uuid))"
+            )
             for table_name, df in dataframes.items():
-                df.to_sql(table_name, conn, index=False, if_exists='replace')
-
-            # Verify the tables were created
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = cursor.fetchall()
-            print(f"Tables created: {[t[0] for t in tables]}")
-
-            # Verify data counts using parameterized approach
-            for table_name in episodes.keys():
-                # Table names are validated against our known list, safe to use
-                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                count = cursor.fetchone()[0]
-                print(f"  {table_name}: {count} rows")
+                # Infer the column types over the full column once, here, instead of per request
+                # Then store numbers as numbers, with numeric min/max columns next to any range like "100-200"
+                df, column_types = normalize_numeric_columns(df, infer_column_types(df))
+                # Then check the columns against the declared schema, and cast them to it
+                df, types = enforce_schema(df, table_name, column_types)
+                counts = upsert_table(conn, table_name, df, types)
+                write_column_types(conn, table_name, column_types)
+                print(f"  {table_name}: {counts['inserted']} inserted, {counts['updated']} updated, {counts['deleted']} deleted, {counts['unchanged']} unchanged")
+
+            data_version = compute_data_version(conn, list(dataframes))
+            up_to_date = data_version == previous_version
+            if not up_to_date:
+                # Build the cross-episode search indexes
+                build_search_index(conn, DATASETS)
+                # Tokenize the drops, types, elements and status immunities into the facet bitmaps
+                write_facet_index(conn, DATASETS)
+                # Serialize and compress each episode's grid payload for the /api/episode endpoints
+                write_payload_blobs(conn, list(dataframes))
+                # Record which tables the app should serve, and as which tabs
+                write_datasets(conn, DATASETS)
+                write_metadata(conn, {
+                    'data_version': data_version,
+                    'etl_version': str(ETL_VERSION),
+                    'built_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                })
+            conn.commit()
+
+            if not up_to_date:
+                # Refresh the query planner's statistics and compact the file before it goes live
+                conn.execute('ANALYZE')
+                conn.execute('VACUUM')
+
+                # Verify the data counts
+                for table_name in dataframes:
+                    # Table names are validated against our known list, safe to use
+                    count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+                    print(f"  {table_name}: {count} rows")
         finally:
             conn.close()
 
-        print(f"\nDatabase created at: {db_path}")
+        if up_to_date:
+            os.remove(temp_path)
+            print(f"\nDatabase at {db_path} is already up to date (data version {data_version})")
+        else:
+            publish(temp_path, db_path)
+            print(f"\nDatabase published at: {db_path} (data version {data_version})")
+
+        if columnar_store_version(store_path) != data_version:
+            # Write the memory-mapped columnar copy that the gunicorn workers share
+            # It's read back from the database so the types match exactly what the app would load from SQLite
+            # SQLite doesn't know about nullable integers or categories, so the declared types are put back on the way out
+            conn = sqlite3.connect(db_path)
+            try:
+                tables = {
+                    table_name: apply_storage_types(
+                        pd.read_sql_query(f"SELECT * FROM {table_name} ORDER BY rowid", conn),
+                        storage_types(table_name, read_column_types(conn, table_name)),
+                    )
+                    for table_name in dataframes
+                }
+            finally:
+                conn.close()
+            write_columnar_store(tables, store_path, data_version=data_version)
+            print(f"Columnar store created at: {store_path}")
 
-    except (sqlite3.Error, pd.errors.EmptyDataError, FileNotFoundError) as e:
+    except Exception as e:
+        # Includes schema violations from enforce_schema (ValueError), not just I/O and SQLite errors
         print(f"Error converting JSON to SQLite: {e}")
         raise
+    finally:
+        # Published or not, never leave a half-built database next to the live one
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
 
 if __name__ == '__main__':
-    convert_json_to_sqlite()
+    parser = argparse.ArgumentParser(description='Convert the episode JSON files to the SQLite database.')
+    parser.add_argument('--full', action='store_true', help='Rebuild every table from scratch instead of upserting the rows that changed')
+    convert_json_to_sqlite(full=parser.parse_args().full)
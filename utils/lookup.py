@@ -0,0 +1,80 @@
+from components.html_components import build_modal_content
+from dash import html
+from functools import lru_cache
+from typing import Any, Dict, Tuple
+from utils.db import fetch_row
+from utils.episodes import current_snapshot, get_column_types
+from utils.schema import RANGE_BOUND, find_dataset
+import os
+
+# How many rendered modals to keep around per worker (and per version of the data)
+MODAL_CACHE_SIZE = int(os.getenv('MODAL_CACHE_SIZE', '512'))
+
+def find_enemy(uuid: str) -> str | None:
+  """
+  Find which dataset an enemy is in, through the uuid table json_to_sqlite.py writes, without loading any dataset.
+
+  Args:
+    uuid (str): The enemy's uuid.
+
+  Returns:
+    str | None: The tab id, or None if the uuid isn't in any dataset.
+  """
+  if not isinstance(uuid, str):
+    return None
+  snapshot = current_snapshot()
+  return snapshot.read(find_dataset, uuid, list(snapshot.datasets.values()))
+
+def get_row(uuid: str) -> Dict[str, Any] | None:
+  """
+  Look up a single enemy's row by uuid, straight from SQLite.
+
+  Args:
+    uuid (str): The enemy's uuid.
+
+  Returns:
+    Dict[str, Any] | None: The row, or None if the uuid isn't in any dataset.
+  """
+  tab_id = find_enemy(uuid)
+  return None if tab_id is None else _fetch_row(tab_id, uuid)
+
+def _fetch_row(tab_id: str, uuid: str) -> Dict[str, Any] | None:
+  # One indexed query on the snapshot's own connection, so a modal never loads (or counts against the budget) its whole dataset
+  snapshot = current_snapshot()
+  return snapshot.read(fetch_row, snapshot.datasets[tab_id].table_name, uuid)
+
+def _modal_cache():
+  # Each snapshot gets its own bounded cache, so modals rendered from old data go away with it
+  return current_snapshot().cached('modal_cache', lambda: lru_cache(maxsize=MODAL_CACHE_SIZE)(_render_modal))
+
+def render_modal(uuid: str) -> Tuple[html.H4, html.Div] | None:
+  """
+  Render the modal header and body for an enemy, memoized per uuid.
+  The returned components are shared between requests, so callers must not mutate them.
+
+  Args:
+    uuid (str): The enemy's uuid.
+
+  Returns:
+    Tuple[html.H4, html.Div] | None: The header and body, or None if the uuid isn't in any episode.
+  """
+  return _modal_cache()(uuid)
+
+def _render_modal(uuid: str) -> Tuple[html.H4, html.Div] | None:
+  tab_id = find_enemy(uuid)
+  row = None if tab_id is None else _fetch_row(tab_id, uuid)
+  if row is None:
+    return None
+  # The range min/max columns are only there for sorting and filtering, the original text is already in the row
+  hidden_columns = {column for column, kind in get_column_types(tab_id).items() if kind == RANGE_BOUND}
+  return build_modal_content(row, hidden_columns)
+
+def get_modal_cache_stats() -> Dict[str, int]:
+  """
+  Report how the modal cache is doing in this worker, for the current snapshot.
+
+  Returns:
+    Dict[str, int]: The hit and miss counts plus the current and maximum size.
+  """
+  info = _modal_cache().cache_info()
+  return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxsize': info.maxsize}
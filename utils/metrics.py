@@ -0,0 +1,193 @@
+from dash import Dash
+from flask import Response, abort, g, request
+from typing import Callable, Dict, List
+import mmap
+import multiprocessing
+import numpy as np
+import os
+import threading
+import time
+
+# 'local' serves /metrics to loopback clients only, 'public' to anyone (e.g. a Prometheus in another container), 'off' disables it
+METRICS_ENDPOINT = os.getenv('METRICS_ENDPOINT', 'local')
+if METRICS_ENDPOINT not in ('local', 'public', 'off'):
+  raise ValueError(f"METRICS_ENDPOINT must be 'local', 'public' or 'off', not {METRICS_ENDPOINT!r}")
+
+# Histogram bucket upper bounds; +Inf is implied
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# How many gunicorn workers can have a slot at once; a slot left by a dead worker is reused by the next one
+MAX_WORKERS = 64
+
+DASH_UPDATE_PATH = '/_dash-update-component'
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+class SharedMetrics:
+  """
+  Counters in an anonymous shared memory map, created before gunicorn forks (--preload) so every worker writes into the same map.
+  Each worker claims one row of counters and only ever adds to it, so recording takes no lock shared between processes, and /metrics in any worker sums every row.
+  """
+
+  def __init__(self, callbacks: List[str], caches: List[str]):
+    self.callbacks = callbacks
+    self.caches = caches
+    # Per callback: calls, errors, duration sum, size sum, then the duration and size bucket counts (+Inf included)
+    self._callback_width = 4 + len(DURATION_BUCKETS) + 1 + len(SIZE_BUCKETS) + 1
+    # Per cache: hits, misses and evictions
+    width = self._callback_width * len(callbacks) + 3 * len(caches)
+    self._buffer = mmap.mmap(-1, MAX_WORKERS * (width + 1) * 8)
+    self._values = np.frombuffer(self._buffer, dtype=np.float64, count=MAX_WORKERS * width).reshape(MAX_WORKERS, width)
+    self._pids = np.frombuffer(self._buffer, dtype=np.int64, count=MAX_WORKERS, offset=MAX_WORKERS * width * 8)
+    self._slot = None
+    self._slot_pid = None
+    # Shared by every worker, and only taken when a worker claims its slot
+    self._claim_lock = multiprocessing.Lock()
+    # Only guards this worker's own row, for gunicorn's threaded workers
+    self._lock = threading.Lock()
+    self._last_cache_info: Dict[str, tuple] = {}
+
+  def _row(self) -> np.ndarray:
+    pid = os.getpid()
+    if self._slot_pid != pid:
+      # First write since this process was forked, so claim a free slot (or one whose worker has exited)
+      # Counters are never reset, so a reused slot keeps counting up and Prometheus sees no counter reset
+      with self._claim_lock:
+        for slot in range(MAX_WORKERS):
+          owner = int(self._pids[slot])
+          if owner == 0 or owner == pid or not _is_alive(owner):
+            self._pids[slot] = pid
+            self._slot, self._slot_pid = slot, pid
+            self._last_cache_info = {}
+            break
+        else:
+          raise RuntimeError(f"More than {MAX_WORKERS} workers are recording metrics")
+    return self._values[self._slot]
+
+  def observe_callback(self, callback: str, duration: float, size: int, error: bool) -> None:
+    """Record one callback call: how long it took, how many bytes it sent back, and whether it failed."""
+    start = self._callback_width * self.callbacks.index(callback)
+    duration_bucket = np.searchsorted(DURATION_BUCKETS, duration)
+    size_bucket = np.searchsorted(SIZE_BUCKETS, size)
+    with self._lock:
+      row = self._row()
+      row[start] += 1
+      row[start + 1] += error
+      row[start + 2] += duration
+      row[start + 3] += size
+      row[start + 4 + duration_bucket] += 1
+      row[start + 4 + len(DURATION_BUCKETS) + 1 + size_bucket] += 1
+
+  def observe_cache(self, cache: str, hits: int, misses: int, evictions: int = 0) -> None:
+    """Record a cache's cumulative hits, misses and evictions in this worker. Counts going down mean the cache was replaced, e.g. by a data reload."""
+    start = self._callback_width * len(self.callbacks) + 3 * self.caches.index(cache)
+    with self._lock:
+      row = self._row()
+      last_hits, last_misses, last_evictions = self._last_cache_info.get(cache, (0, 0, 0))
+      if hits < last_hits or misses < last_misses or evictions < last_evictions:
+        last_hits = last_misses = last_evictions = 0
+      row[start] += hits - last_hits
+      row[start + 1] += misses - last_misses
+      row[start + 2] += evictions - last_evictions
+      self._last_cache_info[cache] = (hits, misses, evictions)
+
+  def render(self) -> str:
+    """Sum every worker's counters and format them in the Prometheus text exposition format."""
+    totals = self._values.sum(axis=0)
+    lines = [
+      '# HELP xenosaga_callback_calls_total Dash callback calls.',
+      '# TYPE xenosaga_callback_calls_total counter',
+    ]
+    lines += [f'xenosaga_callback_calls_total{{callback="{name}"}} {totals[self._callback_width * i]:.0f}' for i, name in enumerate(self.callbacks)]
+    lines += [
+      '# HELP xenosaga_callback_errors_total Dash callback calls that failed with a server error.',
+      '# TYPE xenosaga_callback_errors_total counter',
+    ]
+    lines += [f'xenosaga_callback_errors_total{{callback="{name}"}} {totals[self._callback_width * i + 1]:.0f}' for i, name in enumerate(self.callbacks)]
+    for metric, help_text, buckets, sum_offset, bucket_offset in (
+      ('xenosaga_callback_duration_seconds', 'Time to answer a Dash callback request.', DURATION_BUCKETS, 2, 4),
+      ('xenosaga_callback_response_bytes', 'Size of the serialized Dash callback response.', SIZE_BUCKETS, 3, 4 + len(DURATION_BUCKETS) + 1),
+    ):
+      lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+      for i, name in enumerate(self.callbacks):
+        start = self._callback_width * i
+        counts = np.cumsum(totals[start + bucket_offset:start + bucket_offset + len(buckets) + 1])
+        for bound, count in zip(list(buckets) + ['+Inf'], counts):
+          lines.append(f'{metric}_bucket{{callback="{name}",le="{bound}"}} {count:.0f}')
+        lines.append(f'{metric}_sum{{callback="{name}"}} {totals[start + sum_offset]:.6f}')
+        lines.append(f'{metric}_count{{callback="{name}"}} {totals[start]:.0f}')
+    for metric, help_text, offset in (
+      ('xenosaga_cache_hits_total', 'Cache hits.', 0),
+      ('xenosaga_cache_misses_total', 'Cache misses. For the datasets cache, each one loaded something (e.g. a payload) for a dataset.', 1),
+      ('xenosaga_cache_evictions_total', 'Entries evicted to stay within a memory budget. For the datasets cache, each one is a whole dataset.', 2),
+    ):
+      lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+      start = self._callback_width * len(self.callbacks)
+      lines += [f'{metric}{{cache="{name}"}} {totals[start + 3 * i + offset]:.0f}' for i, name in enumerate(self.caches)]
+    lines.append('# HELP xenosaga_workers Gunicorn workers that have recorded metrics and are still running.')
+    lines.append('# TYPE xenosaga_workers gauge')
+    lines.append(f'xenosaga_workers {sum(1 for pid in self._pids.tolist() if pid and _is_alive(pid))}')
+    return '\n'.join(lines) + '\n'
+
+def _is_alive(pid: int) -> bool:
+  try:
+    os.kill(pid, 0)
+  except ProcessLookupError:
+    return False
+  except PermissionError:
+    return True
+  return True
+
+def callback_names(app: Dash) -> Dict[str, str]:
+  """
+  Map each server-side callback's output id, which is how Dash identifies the callback in a request, to the callback's function name.
+
+  Args:
+    app (Dash): The Dash app, with its callbacks registered.
+
+  Returns:
+    Dict[str, str]: Output id to function name mapping.
+  """
+  return {output: entry['callback'].__name__ for output, entry in app.callback_map.items() if 'callback' in entry}
+
+def register_metrics(app: Dash, caches: Dict[str, Callable]) -> None:
+  """
+  Time every server-side Dash callback and serve the numbers on /metrics.
+  Call it after every callback is registered, and before gunicorn forks, so the counters are shared by every worker.
+
+  Args:
+    app (Dash): The Dash app.
+    caches (Dict[str, Callable]): Cache name to a function returning its stats ({'hits': ..., 'misses': ...} and optionally 'evictions') in this worker.
+  """
+  if METRICS_ENDPOINT == 'off':
+    return
+
+  callbacks = callback_names(app)
+  metrics = SharedMetrics(sorted(set(callbacks.values())), list(caches))
+  server = app.server
+
+  @server.before_request
+  def start_timer():
+    if request.path.endswith(DASH_UPDATE_PATH):
+      g.callback_started = time.perf_counter()
+
+  @server.after_request
+  def record_callback(response):
+    started = g.pop('callback_started', None)
+    if started is None:
+      return response
+    body = request.get_json(silent=True) or {}
+    callback = callbacks.get(body.get('output'))
+    if callback is not None:
+      size = 0 if response.is_streamed else response.calculate_content_length() or 0
+      metrics.observe_callback(callback, time.perf_counter() - started, size, response.status_code >= 500)
+      for name, cache_stats in caches.items():
+        stats = cache_stats()
+        metrics.observe_cache(name, stats['hits'], stats['misses'], stats.get('evictions', 0))
+    return response
+
+  @server.route('/metrics')
+  def serve_metrics():
+    if METRICS_ENDPOINT == 'local' and request.remote_addr not in LOOPBACK_ADDRESSES:
+      abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
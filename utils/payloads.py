@@ -0,0 +1,186 @@
+from typing import Any, Dict, List, NamedTuple
+from utils.db import fetch_rows
+from utils.episodes import current_snapshot, get_column_types
+from utils.functions import generate_column_defs
+from utils.schema import read_column_types, storage_types
+import brotli
+import gzip
+import json
+import sqlite3
+
+# The table in xenosaga.db holding each episode's JSON body, precompressed by json_to_sqlite.py
+BLOB_TABLE = 'payload_blobs'
+
+# How rowData goes over the wire: 'rows' is the list of dicts the grid takes, repeating every key in every row,
+# 'columns' is one array per column, with category columns dictionary encoded (see build_row_columns), expanded back into rows by assets/clientside.js
+WIRE_FORMATS = ('rows', 'columns')
+
+class GridPayload(NamedTuple):
+  """
+  Everything the grid needs for one episode, built once and reused for every request.
+
+  Attributes:
+    row_data (List[Dict[str, Any]]): The rows, with missing values as None.
+    column_defs (List[Dict[str, Any]]): The AG Grid column definitions.
+    row_data_json (bytes): `row_data` serialized to JSON.
+    column_defs_json (bytes): `column_defs` serialized to JSON.
+    row_columns (Dict[str, Any]): The same rows in the 'columns' wire format.
+    row_columns_json (bytes): `row_columns` serialized to JSON.
+  """
+  row_data: List[Dict[str, Any]]
+  column_defs: List[Dict[str, Any]]
+  row_data_json: bytes
+  column_defs_json: bytes
+  row_columns: Dict[str, Any]
+  row_columns_json: bytes
+
+def _to_json_bytes(obj: Any) -> bytes:
+  # Compact separators since these bytes go straight over the wire
+  return json.dumps(obj, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+def build_row_columns(columns: List[str], rows: List[Dict[str, Any]], types: Dict[str, str]) -> Dict[str, Any]:
+  """
+  Encode rows in the 'columns' wire format, so each column name is sent once instead of once per row.
+
+  Args:
+    columns (List[str]): The table's columns, in order.
+    rows (List[Dict[str, Any]]): The rows, with missing values as None.
+    types (Dict[str, str]): Column name to storage type mapping. 'category' columns are dictionary encoded.
+
+  Returns:
+    Dict[str, Any]: {"length": <rows>, "columns": [...]}, where each column is either {"name": ..., "values": [...]}
+    or {"name": ..., "dictionary": [distinct values], "codes": [index into the dictionary, -1 if missing]}.
+  """
+  encoded = []
+  for column in columns:
+    values = [row[column] for row in rows]
+    if types.get(column) == 'category':
+      # In order of first appearance, so the codes don't depend on how the values sort
+      dictionary = list(dict.fromkeys(value for value in values if value is not None))
+      index = {value: code for code, value in enumerate(dictionary)}
+      encoded.append({'name': column, 'dictionary': dictionary, 'codes': [-1 if value is None else index[value] for value in values]})
+    else:
+      encoded.append({'name': column, 'values': values})
+  return {'length': len(rows), 'columns': encoded}
+
+def build_grid_payload(table_name: str, columns: List[str], rows: List[Dict[str, Any]], column_types: Dict[str, str]) -> GridPayload:
+  """
+  Turn an episode's rows into a ready-to-serve grid payload.
+
+  Args:
+    table_name (str): The episode table, e.g. 'episode1'.
+    columns (List[str]): The table's columns, in order.
+    rows (List[Dict[str, Any]]): The rows, with missing values as None.
+    column_types (Dict[str, str]): Column name to type mapping for the table.
+
+  Returns:
+    GridPayload: The rowData (in both wire formats) and columnDefs, both as Python objects and as JSON bytes.
+  """
+  column_defs = generate_column_defs(columns, column_types)
+  row_columns = build_row_columns(columns, rows, storage_types(table_name, column_types))
+  return GridPayload(rows, column_defs, _to_json_bytes(rows), _to_json_bytes(column_defs), row_columns, _to_json_bytes(row_columns))
+
+def payload_size(payload: GridPayload) -> int:
+  """
+  Estimate how much memory a payload takes up, for the dataset memory budget.
+
+  Args:
+    payload (GridPayload): The payload.
+
+  Returns:
+    int: Bytes. The rows as Python objects take about six times their JSON size, and the JSON itself comes on top.
+  """
+  return 6 * len(payload.row_data_json) + len(payload.row_data_json) + len(payload.column_defs_json) + len(payload.row_columns_json)
+
+def get_grid_payload(tab_id: str) -> GridPayload | None:
+  """
+  Get the payload for a tab, building it the first time the current snapshot is asked for it (or after it was evicted).
+
+  Args:
+    tab_id (str): The tab id, e.g. 'ep1'.
+
+  Returns:
+    GridPayload | None: The payload, or None if the tab is unknown.
+  """
+  snapshot = current_snapshot()
+  dataset = snapshot.datasets.get(tab_id)
+  if dataset is None:
+    return None
+
+  def build():
+    columns, rows = snapshot.rows(tab_id)
+    return build_grid_payload(dataset.table_name, columns, rows, get_column_types(tab_id))
+
+  return snapshot.dataset_cached(tab_id, 'payload', build, payload_size)
+
+def build_episode_body(payload: GridPayload, wire_format: str = 'rows') -> bytes:
+  """
+  Build the JSON body served by the /api/episode endpoints, straight from the pre-serialized bytes.
+
+  Args:
+    payload (GridPayload): The episode's payload.
+    wire_format (str): 'rows' or 'columns'.
+
+  Returns:
+    bytes: {"rowData": [...], "columnDefs": [...]} as JSON, or {"rowColumns": {...}, "columnDefs": [...]} in the 'columns' format.
+  """
+  if wire_format == 'columns':
+    return b'{"rowColumns":' + payload.row_columns_json + b',"columnDefs":' + payload.column_defs_json + b'}'
+  return b'{"rowData":' + payload.row_data_json + b',"columnDefs":' + payload.column_defs_json + b'}'
+
+def compress_body(body: bytes) -> Dict[str, bytes]:
+  """
+  Compress a body with every encoding we can serve.
+
+  Args:
+    body (bytes): The uncompressed body.
+
+  Returns:
+    Dict[str, bytes]: Content-Encoding ('identity', 'gzip' and 'br') to body mapping.
+  """
+  # mtime=0 keeps the output identical between builds
+  return {
+    'identity': body,
+    'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+    'br': brotli.compress(body, quality=11),
+  }
+
+def write_payload_blobs(conn: sqlite3.Connection, table_names: List[str]) -> None:
+  """
+  Build, serialize and compress every episode's body at ETL time so the endpoints only have to read bytes.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database, with the episode tables and column types already written.
+    table_names (List[str]): The episode tables.
+  """
+  conn.execute(f"DROP TABLE IF EXISTS {BLOB_TABLE}")
+  conn.execute(
+    f"CREATE TABLE {BLOB_TABLE} (table_name TEXT NOT NULL, wire_format TEXT NOT NULL, encoding TEXT NOT NULL, body BLOB NOT NULL, "
+    "PRIMARY KEY (table_name, wire_format, encoding))"
+  )
+  for table_name in table_names:
+    columns, rows = fetch_rows(conn, table_name)
+    payload = build_grid_payload(table_name, columns, rows, read_column_types(conn, table_name))
+    for wire_format in WIRE_FORMATS:
+      conn.executemany(
+        f"INSERT INTO {BLOB_TABLE} (table_name, wire_format, encoding, body) VALUES (?, ?, ?, ?)",
+        [(table_name, wire_format, encoding, body) for encoding, body in compress_body(build_episode_body(payload, wire_format)).items()],
+      )
+
+def read_payload_blobs(conn: sqlite3.Connection, table_name: str, wire_format: str = 'rows') -> Dict[str, bytes]:
+  """
+  Read the precompressed bodies for an episode.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    table_name (str): The episode table.
+    wire_format (str): 'rows' or 'columns'.
+
+  Returns:
+    Dict[str, bytes]: Content-Encoding to body mapping, or an empty dict if the database predates the blob table (or its wire_format column).
+  """
+  try:
+    rows = conn.execute(f"SELECT encoding, body FROM {BLOB_TABLE} WHERE table_name = ? AND wire_format = ?", (table_name, wire_format)).fetchall()
+  except sqlite3.OperationalError:
+    return {}
+  return {encoding: bytes(body) for encoding, body in rows}
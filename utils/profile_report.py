@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Aggregate the callback profiles written with PROFILE_DIR into one report.
+
+Every .prof file in the directory (optionally only those for one callback)
+is merged. The report shows how the time splits between broad areas (pandas,
+building Dash components, JSON encoding, SQLite, the app's own code), then the
+top N functions by their own time and by cumulative time.
+
+Usage:
+    python utils/profile_report.py PROFILE_DIR [--callback open_and_populate_modal] [--top 25]
+"""
+
+import argparse
+import glob
+import io
+import os
+import pstats
+import sys
+
+# Allow running as a script from the repo root (python utils/profile_report.py)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Where self time is attributed, by the first path fragment that matches the function's file
+AREAS = [
+    ('pandas', ('/pandas/',)),
+    ('numpy', ('/numpy/',)),
+    ('json encoding', ('/json/', '/plotly/io/', '_plotly_utils', 'orjson')),
+    ('dash components', ('/dash/development/', '/dash/html/', '/dash/dcc/', 'dash_bootstrap_components', 'dash_ag_grid')),
+    ('dash dispatch', ('/dash/',)),
+    ('flask/werkzeug', ('/flask/', '/werkzeug/')),
+    ('sqlite', ('sqlite3',)),
+    ('app code', (os.path.join(REPO_ROOT, ''),)),
+]
+
+
+def area_of(filename, function_name):
+    """Name the area a function belongs to, from its file."""
+    if filename == '~':
+        # Built-ins; the C accelerated json encoder shows up here
+        return 'json encoding' if 'json' in function_name else 'sqlite' if 'sqlite3' in function_name else 'builtins'
+    for area, fragments in AREAS:
+        if any(fragment in filename for fragment in fragments):
+            return area
+    return 'other'
+
+
+def load_stats(profile_dir, callback=None):
+    pattern = f'{callback}-*.prof' if callback else '*.prof'
+    paths = sorted(glob.glob(os.path.join(profile_dir, pattern)))
+    if not paths:
+        return None, 0
+    stats = pstats.Stats(paths[0], stream=io.StringIO())
+    for path in paths[1:]:
+        stats.add(path)
+    return stats, len(paths)
+
+
+def area_totals(stats):
+    """Sum every function's own time (tottime) per area."""
+    totals = {}
+    for (filename, _, function_name), (_, _, tottime, _, _) in stats.stats.items():
+        area = area_of(filename, function_name)
+        totals[area] = totals.get(area, 0.0) + tottime
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def print_top(stats, sort_key, top):
+    output = io.StringIO()
+    stats.stream = output
+    stats.sort_stats(sort_key).print_stats(top)
+    # Skip pstats' preamble and keep the table
+    lines = output.getvalue().splitlines()
+    start = next((i for i, line in enumerate(lines) if line.strip().startswith('ncalls')), 0)
+    print('\n'.join(lines[start:]).rstrip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('profile_dir', help='The PROFILE_DIR the app wrote profiles to')
+    parser.add_argument('--callback', help='Only include profiles of this callback, e.g. open_and_populate_modal')
+    parser.add_argument('--top', type=int, default=25, help='How many functions to list')
+    args = parser.parse_args()
+
+    stats, count = load_stats(args.profile_dir, args.callback)
+    if stats is None:
+        print(f"No profiles found in {args.profile_dir}")
+        sys.exit(1)
+
+    total = sum(tottime for _, (_, _, tottime, _, _) in stats.stats.items()) or 1.0
+    print(f"{count} profiles, {total:.3f}s of profiled time ({total / count * 1000:.2f}ms per request)")
+    print()
+    print("Time by area (own time):")
+    for area, seconds in area_totals(stats):
+        print(f"  {area:<18} {seconds:8.3f}s  {seconds / total:6.1%}")
+    print()
+    print(f"Top {args.top} functions by own time:")
+    print_top(stats, 'tottime', args.top)
+    print()
+    print(f"Top {args.top} functions by cumulative time:")
+    print_top(stats, 'cumulative', args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+from dash import Dash
+from flask import g, request
+from loguru import logger
+from utils.metrics import DASH_UPDATE_PATH, callback_names
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+
+# Profiling is off unless PROFILE_DIR is set; profiles are written there, one .prof file per profiled request
+PROFILE_DIR = os.getenv('PROFILE_DIR')
+# The fraction of callback requests (0 to 1) to profile
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+if not 0 <= PROFILE_SAMPLE_RATE <= 1:
+  raise ValueError(f"PROFILE_SAMPLE_RATE must be between 0 and 1, not {PROFILE_SAMPLE_RATE}")
+# Requests sending this header are always profiled. If PROFILE_TOKEN is set, the header's value has to match it
+PROFILE_HEADER = 'X-Profile'
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+
+# cProfile can only profile one thing at a time per process, so requests that arrive while another is being profiled are skipped
+_profiling = threading.Lock()
+
+def _wants_profile() -> bool:
+  header = request.headers.get(PROFILE_HEADER)
+  if header is not None and (PROFILE_TOKEN is None or header == PROFILE_TOKEN):
+    return True
+  return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def profile_path(profile_dir: str, callback: str) -> str:
+  """
+  Build the file name for a profile, tagged by callback so profile_report.py can filter on it.
+
+  Args:
+    profile_dir (str): Where profiles are written.
+    callback (str): The callback's function name.
+
+  Returns:
+    str: e.g. <profile_dir>/open_and_populate_modal-1760793600123456789-4242.prof
+  """
+  return os.path.join(profile_dir, f"{re.sub(r'[^A-Za-z0-9_]', '_', callback)}-{time.time_ns()}-{os.getpid()}.prof")
+
+def register_profiling(app: Dash) -> None:
+  """
+  Profile Dash callback requests with cProfile when PROFILE_DIR is set.
+  The profile covers the whole request: decoding the inputs, the callback itself and encoding the response.
+
+  Args:
+    app (Dash): The Dash app, with its callbacks registered.
+  """
+  if not PROFILE_DIR:
+    return
+  os.makedirs(PROFILE_DIR, exist_ok=True)
+  callbacks = callback_names(app)
+  server = app.server
+  logger.info(f"Profiling callback requests to {PROFILE_DIR} (sample rate {PROFILE_SAMPLE_RATE}, or send {PROFILE_HEADER})")
+
+  @server.before_request
+  def start_profile():
+    if not request.path.endswith(DASH_UPDATE_PATH) or not _wants_profile():
+      return
+    if not _profiling.acquire(blocking=False):
+      return
+    profiler = cProfile.Profile()
+    try:
+      profiler.enable()
+    except ValueError: # Another profiler (e.g. a debugger) is already running
+      _profiling.release()
+      return
+    g.profiler = profiler
+
+  @server.teardown_request
+  def stop_profile(_):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+      return
+    profiler.disable()
+    _profiling.release()
+    body = request.get_json(silent=True) or {}
+    callback = callbacks.get(body.get('output'), 'unknown')
+    try:
+      profiler.dump_stats(profile_path(PROFILE_DIR, callback))
+    except OSError as e:
+      logger.warning(f"Couldn't write the profile for {callback}: {e}")
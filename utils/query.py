@@ -0,0 +1,207 @@
+from typing import Any, Dict, List, Tuple
+from utils.schema import MISSING_VALUES
+import sqlite3
+
+# Never hand back more than this many rows for a single block request
+MAX_BLOCK_SIZE = 1000
+
+# AG Grid number filter types and the SQL operator each one maps to
+NUMBER_OPERATORS = {
+  'equals': '=',
+  'notEqual': '!=',
+  'lessThan': '<',
+  'lessThanOrEqual': '<=',
+  'greaterThan': '>',
+  'greaterThanOrEqual': '>=',
+}
+
+def quote_identifier(column_name: str) -> str:
+  """Quote a column name for use in SQL. Only ever called with names that are known columns."""
+  return '"' + column_name.replace('"', '""') + '"'
+
+def _escape_like(value: str) -> str:
+  # Escape the LIKE wildcards so user input is matched literally
+  return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def column_expression(column_name: str, column_types: Dict[str, str]) -> str:
+  """
+  Build the SQL expression used to filter and sort a column.
+  Ranges like "100-200" are compared on their starting number, the same as the grid's valueGetter.
+
+  Args:
+    column_name (str): The column name.
+    column_types (Dict[str, str]): Column name to type mapping.
+
+  Returns:
+    str: The SQL expression.
+  """
+  column = quote_identifier(column_name)
+  if column_types.get(column_name) == 'range':
+    # CAST takes the longest numeric prefix, so '100-200' becomes 100 and '-100' stays -100
+    missing = ', '.join("'" + value.replace("'", "''") + "'" for value in MISSING_VALUES)
+    return f"(CASE WHEN {column} IN ({missing}) THEN NULL ELSE CAST({column} AS REAL) END)"
+  return column
+
+def _number(value: Any) -> float:
+  # JSON booleans are ints to Python, but not numbers to the grid
+  if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+    raise ValueError(f"Number filters need a number, not {value!r}")
+  try:
+    return float(value)
+  except ValueError:
+    raise ValueError(f"Number filters need a number, not {value!r}") from None
+
+def _text_condition(expression: str, condition: Dict[str, Any]) -> Tuple[str, List[Any]]:
+  filter_type = condition.get('type')
+  value = condition.get('filter')
+  if value is not None and not isinstance(value, (str, int, float)):
+    raise ValueError(f"Text filters need a string, not {value!r}")
+  value = str(value or '')
+  if filter_type == 'blank':
+    return f"({expression} IS NULL OR {expression} = '')", []
+  if filter_type == 'notBlank':
+    return f"({expression} IS NOT NULL AND {expression} != '')", []
+  # SQLite's LIKE is case-insensitive for ASCII, which matches AG Grid's text filter
+  patterns = {
+    'contains': f'%{_escape_like(value)}%',
+    'notContains': f'%{_escape_like(value)}%',
+    'startsWith': f'{_escape_like(value)}%',
+    'endsWith': f'%{_escape_like(value)}',
+    'equals': _escape_like(value),
+    'notEqual': _escape_like(value),
+  }
+  if filter_type not in patterns:
+    raise ValueError(f"Unsupported text filter type: {filter_type}")
+  if filter_type in ('notContains', 'notEqual'):
+    # AG Grid treats empty cells as passing the negative filters
+    return f"({expression} IS NULL OR {expression} NOT LIKE ? ESCAPE '\\')", [patterns[filter_type]]
+  return f"{expression} LIKE ? ESCAPE '\\'", [patterns[filter_type]]
+
+def _number_condition(expression: str, condition: Dict[str, Any]) -> Tuple[str, List[Any]]:
+  filter_type = condition.get('type')
+  if filter_type == 'blank':
+    return f"{expression} IS NULL", []
+  if filter_type == 'notBlank':
+    return f"{expression} IS NOT NULL", []
+  if filter_type == 'inRange':
+    # AG Grid's inRange excludes both ends by default
+    return f"({expression} > ? AND {expression} < ?)", [_number(condition.get('filter')), _number(condition.get('filterTo'))]
+  if filter_type not in NUMBER_OPERATORS:
+    raise ValueError(f"Unsupported number filter type: {filter_type}")
+  return f"{expression} {NUMBER_OPERATORS[filter_type]} ?", [_number(condition.get('filter'))]
+
+def build_where_clause(filter_model: Dict[str, Any], column_types: Dict[str, str]) -> Tuple[str, List[Any]]:
+  """
+  Translate an AG Grid filterModel into a parameterized SQL WHERE clause.
+
+  Args:
+    filter_model (Dict[str, Any]): The grid's filterModel, keyed by column.
+    column_types (Dict[str, str]): Column name to type mapping. Columns not in here are rejected.
+
+  Returns:
+    Tuple[str, List[Any]]: The WHERE clause (empty if there's nothing to filter) and its parameters.
+
+  Raises:
+    ValueError: If the model isn't shaped like a filterModel, names an unknown column, or uses an unsupported filter or operand.
+  """
+  # The model comes straight from the browser (or a URL), so anything that isn't shaped like one is rejected the same way as an unknown column
+  if not isinstance(filter_model, (dict, type(None))):
+    raise ValueError(f"filterModel must be an object, not {type(filter_model).__name__}")
+  clauses, params = [], []
+  for column_name, model in (filter_model or {}).items():
+    if column_name not in column_types:
+      raise ValueError(f"Unknown column: {column_name}")
+    if not isinstance(model, dict):
+      raise ValueError(f"The filter on {column_name} must be an object")
+    expression = column_expression(column_name, column_types)
+    build_condition = _number_condition if model.get('filterType') == 'number' else _text_condition
+    # Combined filters come as operator + conditions (or condition1/condition2 in older AG Grid versions)
+    conditions = model.get('conditions') or [model[key] for key in ('condition1', 'condition2') if key in model] or [model]
+    if not isinstance(conditions, list) or not all(isinstance(condition, dict) for condition in conditions):
+      raise ValueError(f"The conditions of the filter on {column_name} must be objects")
+    parts = []
+    for condition in conditions:
+      sql, condition_params = build_condition(expression, condition)
+      parts.append(sql)
+      params += condition_params
+    operator = model.get('operator', 'AND')
+    if not isinstance(operator, str):
+      raise ValueError(f"Unsupported filter operator: {operator!r}")
+    joiner = ' OR ' if operator.upper() == 'OR' else ' AND '
+    clauses.append('(' + joiner.join(parts) + ')')
+  if not clauses:
+    return '', []
+  return 'WHERE ' + ' AND '.join(clauses), params
+
+def build_order_by(sort_model: List[Dict[str, Any]], column_types: Dict[str, str]) -> str:
+  """
+  Translate an AG Grid sortModel into an ORDER BY clause.
+
+  Args:
+    sort_model (List[Dict[str, Any]]): The grid's sortModel, e.g. [{"colId": "HP", "sort": "desc"}].
+    column_types (Dict[str, str]): Column name to type mapping. Columns not in here are rejected.
+
+  Returns:
+    str: The ORDER BY clause. rowid is always the tie breaker so paging is stable.
+
+  Raises:
+    ValueError: If the model isn't a list of sorts or names an unknown column.
+  """
+  if not isinstance(sort_model, (list, type(None))) or not all(isinstance(sort, dict) for sort in sort_model or []):
+    raise ValueError('sortModel must be a list of objects')
+  terms = []
+  for sort in sort_model or []:
+    column_name = sort.get('colId')
+    if not isinstance(column_name, str) or column_name not in column_types:
+      raise ValueError(f"Unknown column: {column_name}")
+    direction = 'DESC' if sort.get('sort') == 'desc' else 'ASC'
+    expression = column_expression(column_name, column_types)
+    collate = ' COLLATE NOCASE' if column_types[column_name] == 'text' else ''
+    terms.append(f"{expression}{collate} {direction}")
+  terms.append('rowid ASC')
+  return 'ORDER BY ' + ', '.join(terms)
+
+def fetch_block(
+  conn: sqlite3.Connection,
+  table_name: str,
+  request: Dict[str, Any],
+  column_types: Dict[str, str],
+) -> Dict[str, Any]:
+  """
+  Answer an AG Grid infinite row model getRowsRequest straight from SQLite.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    table_name (str): The episode table to query. Must be a known table, it is not parameterized.
+    request (Dict[str, Any]): The grid's getRowsRequest (startRow, endRow, filterModel, sortModel).
+    column_types (Dict[str, str]): Column name to type mapping for the table.
+
+  Returns:
+    Dict[str, Any]: A getRowsResponse with the requested block of rows and the total filtered row count.
+
+  Raises:
+    ValueError: If the request isn't shaped like a getRowsRequest, or its models are invalid (see build_where_clause and build_order_by).
+  """
+  if not isinstance(request, dict):
+    raise ValueError('getRowsRequest must be an object')
+  start_row, end_row = request.get('startRow'), request.get('endRow')
+  try:
+    start_row = max(int(start_row), 0) if start_row is not None else 0
+    # endRow=0 is a request for no rows, so only a missing one falls back to a default block
+    end_row = int(end_row) if end_row is not None else start_row + 100
+  except (TypeError, ValueError):
+    raise ValueError(f"Invalid block bounds: {request.get('startRow')!r} to {request.get('endRow')!r}") from None
+  limit = min(max(end_row - start_row, 0), MAX_BLOCK_SIZE)
+
+  where, where_params = build_where_clause(request.get('filterModel'), column_types)
+  order_by = build_order_by(request.get('sortModel'), column_types)
+  columns = ', '.join(quote_identifier(column) for column in column_types)
+
+  cursor = conn.execute(
+    f"SELECT {columns} FROM {table_name} {where} {order_by} LIMIT ? OFFSET ?",
+    where_params + [limit, start_row],
+  )
+  names = [description[0] for description in cursor.description]
+  rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+  row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name} {where}", where_params).fetchone()[0]
+  return {'rowData': rows, 'rowCount': row_count}
@@ -0,0 +1,266 @@
+from typing import Dict, List, NamedTuple, Tuple
+import json
+import sqlite3
+
+# The table in xenosaga.db that stores the inferred type of every column
+SCHEMA_TABLE = 'column_types'
+
+# The table in xenosaga.db listing every dataset the app serves, in tab order
+DATASETS_TABLE = 'datasets'
+
+# The table in xenosaga.db saying which dataset each uuid is in, so one enemy can be looked up without loading any dataset whole
+DATASET_ROWS_TABLE = 'dataset_rows'
+
+class Dataset(NamedTuple):
+  """
+  One table the app serves, as a tab of its own.
+
+  Attributes:
+    tab_id (str): The tab id used in URLs and callbacks, e.g. 'ep1'.
+    table_name (str): The table in xenosaga.db, loaded by json_to_sqlite.py from assets/json/<table_name>.json.
+    label (str): The label shown on the tab.
+    search_fields (Dict[str, List[str]]): Which columns feed each field of the search index ('drops', 'types' and 'elements'), see utils/search.py.
+    facet_fields (Dict[str, List[str]]): Which columns feed each facet, e.g. {'drop': ['Normal Drop', 'Rare Drop']}. A cell can hold several values, e.g. "Fire, Lightning".
+    resistance_fields (Dict[str, List[str]]): Columns holding a damage percentage per element ('elements') or a resistance per status effect ('statuses'),
+      for datasets that have a column per element instead of lists of them. Here the column is the value and the cell decides the facet, see utils/facets.py.
+  """
+  tab_id: str
+  table_name: str
+  label: str
+  search_fields: Dict[str, List[str]] = {}
+  facet_fields: Dict[str, List[str]] = {}
+  resistance_fields: Dict[str, List[str]] = {}
+
+# Every dataset json_to_sqlite.py loads, in tab order. It records them in the datasets table, which is what the app reads
+# Adding one means adding its JSON file, an entry here and its schema below
+DATASETS: List[Dataset] = [
+  Dataset(
+    'ep1', 'episode1', 'Episode I',
+    search_fields={
+      'drops': ['Normal Drop', 'Rare Drop'],
+      'types': ['Type'],
+      'elements': ['Weakness'],
+    },
+    facet_fields={
+      'type': ['Type'],
+      'drop': ['Normal Drop', 'Rare Drop'],
+      'weak': ['Weakness'],
+    },
+  ),
+  Dataset(
+    'ep2', 'episode2', 'Episode II',
+    search_fields={
+      'drops': ['Item', 'Rare Item'],
+      'types': ['Enemy type'],
+      'elements': ['Beam', 'Aura', 'Thunder', 'Fire', 'Ice', 'Pierce', 'Slash', 'Hit', 'Physical', 'Ether'],
+    },
+    facet_fields={
+      'type': ['Enemy type'],
+      'drop': ['Item', 'Rare Item'],
+    },
+    resistance_fields={
+      'elements': ['Beam', 'Aura', 'Thunder', 'Fire', 'Ice', 'Pierce', 'Slash', 'Hit', 'Physical', 'Ether'],
+      'statuses': ['Slow', 'Blind', 'Heavy', 'Weak', 'EthPD', 'EthDD', 'Junk', 'ResDw', 'Lost', 'Curse'],
+    },
+  ),
+  Dataset(
+    'ep3', 'episode3', 'Episode III',
+    search_fields={
+      'drops': ['Normal Drop', 'Rare Drop', 'Stealable Item'],
+      'types': ['Type'],
+      'elements': ['Absorbs Element', 'Weak to Element', 'Strong Against Element', 'Not Affected by Element'],
+    },
+    facet_fields={
+      'type': ['Type'],
+      'drop': ['Normal Drop', 'Rare Drop', 'Stealable Item'],
+      'weak': ['Weak to Element'],
+      'strong': ['Strong Against Element'],
+      'absorbs': ['Absorbs Element'],
+      'immune': ['Not Affected by Element'],
+    },
+  ),
+]
+
+# Values the scrapers use to mean "no value", so they shouldn't count against a column being numeric
+MISSING_VALUES = ['N/A', '']
+
+# Matches a numeric range like "100-200" (either end can be negative or a decimal)
+RANGE_PATTERN = r'^\s*(-?\d+(?:\.\d+)?)\s*-\s*(-?\d+(?:\.\d+)?)\s*$'
+
+# The type given to the numeric min/max columns stored alongside every range column
+RANGE_BOUND = 'range_bound'
+
+# The storage type of every column, enforced by json_to_sqlite.py and kept when the tables are loaded as dataframes:
+# 'int32' is a nullable 32-bit integer, 'category' is text with a handful of distinct values (dictionary encoded in the columnar store),
+# and 'string' is any other text. The min/max columns added next to range columns aren't listed, they're always 'float64'
+STORAGE_TYPES = ('int32', 'float64', 'category', 'string')
+
+# What each storage type is in SQLite and in pandas
+SQLITE_TYPES = {'int32': 'INTEGER', 'float64': 'REAL', 'category': 'TEXT', 'string': 'TEXT'}
+PANDAS_DTYPES = {'int32': 'Int32', 'float64': 'float64', 'category': 'category', 'string': 'string'}
+
+# Episode II's elemental and status resistances are percentages, except for the odd "Immune", so they're categories too
+_EPISODE2_RESISTANCES = [
+  'Beam', 'Aura', 'Thunder', 'Fire', 'Ice', 'Pierce', 'Slash', 'Hit', 'Physical', 'Ether',
+  'Slow', 'Blind', 'Heavy', 'Weak', 'EthPD', 'EthDD', 'Junk', 'ResDw', 'Lost', 'Curse',
+]
+
+EPISODE_SCHEMAS: Dict[str, Dict[str, str]] = {
+  'episode1': {
+    'Name': 'string',
+    **dict.fromkeys(['HP', 'EXP', 'TP', 'EP', 'SP', 'Cash'], 'int32'),
+    'Normal Drop': 'string',
+    'Rare Drop': 'string',
+    'Type': 'category',
+    'Weakness': 'category',
+    'uuid': 'string',
+  },
+  'episode2': {
+    'Name': 'string',
+    **dict.fromkeys(['HP', 'EXP', 'CPTS', 'SPTS', 'STR', 'VIT', 'POWER', 'ARMOR', 'EATK', 'EDEF', 'DEX', 'EVA', 'AGL'], 'int32'),
+    **dict.fromkeys(_EPISODE2_RESISTANCES, 'category'),
+    'Enemy type': 'category',
+    'Hit zone': 'category',
+    'Break': 'category',
+    **dict.fromkeys(['Boost?', 'Cboost?', 'Air effect?', 'Down effect?'], 'category'),
+    'Item': 'string',
+    'Rare Item': 'string',
+    'uuid': 'string',
+  },
+  'episode3': {
+    'Name': 'string',
+    **dict.fromkeys(['HP', 'EXP', 'EP', 'SP', 'Gold', 'Break Limit'], 'int32'),
+    'Normal Drop': 'string',
+    'Rare Drop': 'string',
+    'Stealable Item': 'string',
+    'Type': 'category',
+    **dict.fromkeys(['Absorbs Element', 'Weak to Element', 'Strong Against Element', 'Not Affected by Element'], 'category'),
+    'uuid': 'string',
+  },
+}
+
+def range_bound_columns(column_name: str) -> Tuple[str, str]:
+  """Return the names of the min and max companion columns for a range column."""
+  return f"{column_name}_min", f"{column_name}_max"
+
+def storage_types(table_name: str, column_types: Dict[str, str]) -> Dict[str, str]:
+  """
+  Get the storage type of every column in a table, including the range min/max columns.
+
+  Args:
+    table_name (str): The table, e.g. 'episode1'.
+    column_types (Dict[str, str]): Column name to type mapping, as stored by json_to_sqlite.py.
+
+  Returns:
+    Dict[str, str]: Column name to storage type mapping, in column order. Columns the schema doesn't declare are left out.
+  """
+  schema = EPISODE_SCHEMAS.get(table_name, {})
+  return {
+    column: 'float64' if kind == RANGE_BOUND else schema[column]
+    for column, kind in column_types.items()
+    if kind == RANGE_BOUND or column in schema
+  }
+
+def write_column_types(conn: sqlite3.Connection, table_name: str, column_types: Dict[str, str]) -> None:
+  """
+  Persist the inferred column types for a table, replacing any previous entries.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    table_name (str): The table the types describe.
+    column_types (Dict[str, str]): Column name to type mapping.
+  """
+  conn.execute(
+    f"CREATE TABLE IF NOT EXISTS {SCHEMA_TABLE} ("
+    "table_name TEXT NOT NULL, column_name TEXT NOT NULL, position INTEGER NOT NULL, kind TEXT NOT NULL, "
+    "PRIMARY KEY (table_name, column_name))"
+  )
+  conn.execute(f"DELETE FROM {SCHEMA_TABLE} WHERE table_name = ?", (table_name,))
+  conn.executemany(
+    f"INSERT INTO {SCHEMA_TABLE} (table_name, column_name, position, kind) VALUES (?, ?, ?, ?)",
+    [(table_name, column, position, kind) for position, (column, kind) in enumerate(column_types.items())],
+  )
+
+def read_column_types(conn: sqlite3.Connection, table_name: str) -> Dict[str, str]:
+  """
+  Read the persisted column types for a table.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    table_name (str): The table to look up.
+
+  Returns:
+    Dict[str, str]: Column name to type mapping, or an empty dict if nothing has been stored.
+  """
+  try:
+    rows = conn.execute(
+      f"SELECT column_name, kind FROM {SCHEMA_TABLE} WHERE table_name = ? ORDER BY position",
+      (table_name,),
+    ).fetchall()
+  except sqlite3.OperationalError: # The schema table doesn't exist in databases built before it was added
+    return {}
+  return dict(rows)
+
+def write_datasets(conn: sqlite3.Connection, datasets: List[Dataset]) -> None:
+  """
+  Record which datasets the database holds, and which one each uuid is in, replacing any previous entries.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database, with the dataset tables already written.
+    datasets (List[Dataset]): The datasets, in tab order. A uuid is expected in only one of them; if it's in several, the first one wins.
+  """
+  # Recreated rather than emptied, since older databases have it without the field columns
+  conn.execute(f"DROP TABLE IF EXISTS {DATASETS_TABLE}")
+  conn.execute(
+    f"CREATE TABLE {DATASETS_TABLE} ("
+    "tab_id TEXT PRIMARY KEY, table_name TEXT NOT NULL UNIQUE, label TEXT NOT NULL, position INTEGER NOT NULL, "
+    "search_fields TEXT NOT NULL, facet_fields TEXT NOT NULL, resistance_fields TEXT NOT NULL)"
+  )
+  conn.executemany(
+    f"INSERT INTO {DATASETS_TABLE} (tab_id, table_name, label, position, search_fields, facet_fields, resistance_fields) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    [
+      (dataset.tab_id, dataset.table_name, dataset.label, position, json.dumps(dataset.search_fields), json.dumps(dataset.facet_fields), json.dumps(dataset.resistance_fields))
+      for position, dataset in enumerate(datasets)
+    ],
+  )
+  conn.execute(f"DROP TABLE IF EXISTS {DATASET_ROWS_TABLE}")
+  conn.execute(f"CREATE TABLE {DATASET_ROWS_TABLE} (uuid TEXT PRIMARY KEY, tab_id TEXT NOT NULL) WITHOUT ROWID")
+  for dataset in datasets:
+    conn.execute(f"INSERT OR IGNORE INTO {DATASET_ROWS_TABLE} (uuid, tab_id) SELECT uuid, ? FROM {dataset.table_name}", (dataset.tab_id,))
+
+def read_datasets(conn: sqlite3.Connection) -> List[Dataset]:
+  """
+  Read the datasets the database holds.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+
+  Returns:
+    List[Dataset]: The datasets in tab order, or DATASETS for databases built before the datasets table (or its field columns) existed.
+  """
+  try:
+    rows = conn.execute(
+      f"SELECT tab_id, table_name, label, search_fields, facet_fields, resistance_fields FROM {DATASETS_TABLE} ORDER BY position"
+    ).fetchall()
+  except sqlite3.OperationalError:
+    return list(DATASETS)
+  return [Dataset(tab_id, table_name, label, *map(json.loads, fields)) for tab_id, table_name, label, *fields in rows]
+
+def find_dataset(conn: sqlite3.Connection, uuid: str, datasets: List[Dataset]) -> str | None:
+  """
+  Find which dataset an enemy is in.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    uuid (str): The enemy's uuid.
+    datasets (List[Dataset]): The database's datasets, from read_datasets().
+
+  Returns:
+    str | None: The dataset's tab id, or None if the uuid isn't in any of them.
+  """
+  try:
+    row = conn.execute(f"SELECT tab_id FROM {DATASET_ROWS_TABLE} WHERE uuid = ?", (uuid,)).fetchone()
+  except sqlite3.OperationalError:
+    # Databases built before the table existed get each dataset's unique uuid index asked in turn
+    return next((dataset.tab_id for dataset in datasets if conn.execute(f"SELECT 1 FROM {dataset.table_name} WHERE uuid = ?", (uuid,)).fetchone()), None)
+  return row[0] if row else None
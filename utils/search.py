@@ -0,0 +1,138 @@
+from difflib import SequenceMatcher
+from typing import Any, Dict, List
+from utils.schema import Dataset
+import re
+import sqlite3
+
+# Full-text index over every episode, with prefix matching on whole words
+SEARCH_TABLE = 'search_index'
+# Trigram index over enemy names, used to rank near misses when someone makes a typo
+TRIGRAM_TABLE = 'search_trigram'
+
+# How much a match in each field counts towards the bm25 rank (name, drops, types, elements)
+FIELD_WEIGHTS = (10.0, 2.0, 1.0, 1.0)
+
+# Typo matches less similar than this (0 to 1) to the query are dropped
+MIN_SIMILARITY = 0.6
+
+def _field_text(row: Dict[str, Any], columns: List[str], label_columns: bool = False) -> str:
+  # Join the non-missing values of the columns, optionally prefixed by the column name (e.g. "Weak to Element: Fire")
+  parts = []
+  for column in columns:
+    value = row.get(column)
+    if value is None or str(value) in ('', 'N/A'):
+      continue
+    # Episode II's element columns are mostly damage percentages, which are noise for text search
+    # Only keep the descriptive ones like "Fire: Weak"
+    if label_columns and re.fullmatch(r'-?\d+(\.\d+)?', str(value)):
+      continue
+    parts.append(f"{column}: {value}" if label_columns else str(value))
+  return ' | '.join(parts)
+
+def build_search_index(conn: sqlite3.Connection, datasets: List[Dataset]) -> None:
+  """
+  (Re)build the full-text and trigram search indexes over every episode table.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    datasets (List[Dataset]): The datasets to index. Their search_fields say which columns go into each field.
+  """
+  conn.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+  conn.execute(f"DROP TABLE IF EXISTS {TRIGRAM_TABLE}")
+  conn.execute(
+    f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+    "name, drops, types, elements, table_name UNINDEXED, uuid UNINDEXED, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+  )
+  conn.execute(f"CREATE VIRTUAL TABLE {TRIGRAM_TABLE} USING fts5(name, table_name UNINDEXED, uuid UNINDEXED, tokenize = 'trigram')")
+
+  for dataset in datasets:
+    table_name, fields = dataset.table_name, dataset.search_fields
+    cursor = conn.execute(f"SELECT * FROM {table_name}")
+    columns = [description[0] for description in cursor.description]
+    rows = [
+      (
+        row['Name'],
+        _field_text(row, fields.get('drops', [])),
+        _field_text(row, fields.get('types', [])),
+        _field_text(row, fields.get('elements', []), label_columns=True),
+        table_name,
+        row['uuid'],
+      )
+      for row in (dict(zip(columns, values)) for values in cursor.fetchall())
+    ]
+    conn.executemany(f"INSERT INTO {SEARCH_TABLE} VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.executemany(f"INSERT INTO {TRIGRAM_TABLE} VALUES (?, ?, ?)", [(row[0], row[4], row[5]) for row in rows])
+
+  # Merge the index segments since the index is read-only from here on
+  conn.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+  conn.execute(f"INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}) VALUES ('optimize')")
+
+def _trigrams(text: str) -> set:
+  text = text.lower()
+  return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _similarity(words: List[str], name: str) -> float:
+  # Compare the query against every run of the same number of words in the name, so "grsly" still scores well against "0-78 Grisly 2"
+  query = ' '.join(words).lower()
+  name_words = re.findall(r'\w+', name.lower())
+  width = min(len(words), len(name_words)) or 1
+  windows = [' '.join(name_words[i:i + width]) for i in range(max(len(name_words) - width + 1, 1))]
+  return max(SequenceMatcher(None, query, window).ratio() for window in windows)
+
+def search(conn: sqlite3.Connection, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+  """
+  Search every episode for enemies matching a query.
+  Whole words (and word prefixes) are matched against names, drops, types and elements first.
+  If that doesn't fill the limit, enemy names that share enough trigrams with the query are added, so typos still find something.
+
+  Args:
+    conn (sqlite3.Connection): An open connection to the database.
+    query (str): What the user typed.
+    limit (int): The maximum number of hits to return.
+
+  Returns:
+    List[Dict[str, Any]]: The hits, best first, each with the uuid, name, table name and which field matched.
+  """
+  words = re.findall(r'\w+', query)
+  if not words:
+    return []
+
+  # Quote every word so FTS5 syntax in the query is taken literally, and let the last word match as a prefix
+  match = ' '.join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+  rows = conn.execute(
+    f"SELECT uuid, name, table_name, drops, types, elements FROM {SEARCH_TABLE} "
+    f"WHERE {SEARCH_TABLE} MATCH ? ORDER BY bm25({SEARCH_TABLE}, {', '.join(str(w) for w in FIELD_WEIGHTS)}) LIMIT ?",
+    (match.strip(), limit),
+  ).fetchall()
+  hits = [
+    {'uuid': uuid, 'name': name, 'table_name': table_name, 'matched': _matched_field(words, name, drops, types, elements)}
+    for uuid, name, table_name, drops, types, elements in rows
+  ]
+
+  remaining = limit - len(hits)
+  query_trigrams = _trigrams(' '.join(words))
+  if remaining > 0 and query_trigrams:
+    seen = {hit['uuid'] for hit in hits}
+    candidates = conn.execute(
+      f"SELECT uuid, name, table_name FROM {TRIGRAM_TABLE} WHERE {TRIGRAM_TABLE} MATCH ? ORDER BY bm25({TRIGRAM_TABLE}) LIMIT ?",
+      (' OR '.join(f'"{gram}"' for gram in sorted(query_trigrams) if '"' not in gram), limit * 5),
+    ).fetchall()
+    # The trigram index only narrows down the candidates, so re-rank them on how close they really are to the query
+    scored = []
+    for uuid, name, table_name in candidates:
+      if uuid in seen:
+        continue
+      similarity = _similarity(words, name)
+      if similarity >= MIN_SIMILARITY:
+        scored.append((similarity, {'uuid': uuid, 'name': name, 'table_name': table_name, 'matched': 'name'}))
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    hits += [hit for _, hit in scored[:remaining]]
+
+  return hits
+
+def _matched_field(words: List[str], name: str, drops: str, types: str, elements: str) -> str:
+  # Report the field that contains the most query words (earlier fields win ties), so the UI can say why an enemy came up
+  fields = (('name', name), ('drops', drops), ('types', types), ('elements', elements))
+  counts = [(sum(word.lower() in (text or '').lower() for word in words), -i, field) for i, (field, text) in enumerate(fields)]
+  return max(counts)[2]
@@ -1,98 +1,53 @@
 from bs4 import BeautifulSoup as bs4
-import requests
-import re
-import pandas as pd
-
-# Pretend like we're human
-# https://stackoverflow.com/a/43441551
-headers = requests.utils.default_headers()
-headers.update({
-    'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:52.0) Gecko/20100101 Firefox/52.0',
-})
-
-url = "https://gamefaqs.gamespot.com/ps2/929933-xenosaga-episode-iii-also-sprach-zarathustra/faqs/45192"
+from faq_parser import Field, labelled, name_headless_blocks, parse_blocks, to_frame
+from fetch import SOURCES, fetch
 
-
-response = requests.get(url, headers=headers)
-soup = bs4(response.content, "html.parser")
+# Goes through the shared on-disk cache, so rerunning this after a regex tweak doesn't hit the site again
+# Set SCRAPE_OFFLINE=1 to run it without any network access
+url = SOURCES['episode3']
+content = fetch(url)
+soup = bs4(content, "html.parser")
 
 # Find the div/class with the id "faqtext"
 text = soup.find_all("div", class_="faqtext", id="faqtext")
-# This regex will match any string that starts with 18 or more periods, followed by one or more characters that are not line breaks, but only if it's followed by 12 periods and a line break.
-names = re.findall(r'\.{18,}([^\r\n]+)\.{12}\r\n', str(text))
-# Remove the first five elements because they're not enemies
-names = names[5:]
-# Remove leading and trailing dots from all elements in the list
-names = [elem.strip(".") for elem in names]
-# Remove everything before the first whitespace
-names = [elem.split(" ", 1)[1] for elem in names]
-# The regex didn't capture enemy #63 Yuriev Soldier A so we're gonna have to insert that manually
-names.insert(61, "Yuriev Soldier A")
-# And now we have the right amount of names... finally
-# Craft a Python regex to get all numbers and commas after "HP: " but before any number of whitespaces followed by "|"
-hp = re.findall(r'HP:\s*([\d,]+)[^|]*', str(text))
-# Some of the other stat values are N/A, so we need to use a different regex
-# Craft a Python regex to get all text after EXP: but before any number of whitespaces followed by |
-exp = re.findall(r'Exp:\s*([^|\s]+)[^|]*', str(text))
-ep = re.findall(r'EP:\s*([^|\s]+)[^|]*', str(text))
-sp = re.findall(r'SP:\s*([^|\s]+)[^|]*', str(text))
-gold = re.findall(r'Gold:\s*([^|\s]+)[^|]*', str(text))
-bl = re.findall(r'BL:\s*([^|\s]+)[^|]*', str(text))
-# This regex will match any string that starts with "S:" followed by zero or more whitespaces, followed by one or more characters that are not "|", but only if it's followed by zero or more whitespaces and a "|" character
-item = re.findall(r'N:\s*([^|]+)(?=\s*\|)', str(text))
-rare = re.findall(r'R:\s*([^|]+)(?=\s*\|)', str(text))
-superrare = re.findall(r'S:\s*([^|]+)(?=\s*\|)', str(text))
-# Remove the first element in the above item lists because it's empty
-del item[0]
-del rare[0]
-del superrare[0]
-# Strip leading and trailing whitespaces from the item names
-item = [x.strip() for x in item]
-rare = [x.strip() for x in rare]
-superrare = [x.strip() for x in superrare]
-# Craft a Python regex to get a single letter after Enemy Type: but before any number of whitespaces followed by |
-type = re.findall(r'Enemy Type:([A-Z\s]+)[^|]*', str(text))
-# Strip whitespaces from the enemy type
-type = [x.replace(" ", "") for x in type]
-# Remove the first element in the type list because it's empty
-del type[0]
-# This regex will match any string that starts with "AB: " followed by one or more characters that are not "|" 
-ab = re.findall(r'AB:\s([^|]+)', str(text))
-# and so on...
-wk = re.findall(r'WK:\s([^|]+)', str(text))
-sg = re.findall(r'SG:\s([^|]+)', str(text))
-ne = re.findall(r'NE:\s([^|]+)', str(text))
-# Remove trailing whitespaces from these lists
-ab = [x.strip() for x in ab]
-wk = [x.strip() for x in wk]
-sg = [x.strip() for x in sg]
-ne = [x.strip() for x in ne]
-# Again, drop the first element because it's empty
-del ab[0]
-del wk[0]
-del sg[0]
-
-
-# And now, all of our lists have the same length, so we can create a Pandas DataFrame
-df = pd.DataFrame(
-    {
-        'Name': names,
-        'HP': hp,
-        'EXP': exp,
-        'EP': ep,
-        'SP': sp,
-        'Gold': gold,
-        'Break Limit': bl,
-        'Normal Drop': item,
-        'Rare Drop': rare,
-        'Stealable Item': superrare,
-        'Type': type,
-        'Absorbs Element': ab,
-        'Weak to Element': wk,
-        'Strong Against Element': sg,
-        'Not Affected by Element': ne
-    }
-)
+# One pattern per field, all matched in a single pass over the text
+# Each enemy's header line starts a new block, and every stat after it up to the next header belongs to that enemy
+# Stats sit on lines like "HP: 1,234 | Exp: 56 | ...", so each value stops at the next "|" or the end of its line
+fields = [
+    # 18 or more periods, the enemy's number and name, then 12 periods and a line break
+    Field('Name', r'\.{18,}([^\r\n]+)\.{12}\r\n'),
+    # Only numbers and commas after "HP: "
+    Field('HP', labelled('HP', r'[\d,]+', r'[ \t]*', r'[^|\r\n]*')),
+    # Some of the other stat values are N/A, so they take anything up to the next whitespace
+    Field('EXP', labelled('Exp', r'[^|\s]+', r'[ \t]*', r'[^|\r\n]*')),
+    Field('EP', labelled('EP', r'[^|\s]+', r'[ \t]*', r'[^|\r\n]*')),
+    Field('SP', labelled('SP', r'[^|\s]+', r'[ \t]*', r'[^|\r\n]*')),
+    Field('Gold', labelled('Gold', r'[^|\s]+', r'[ \t]*', r'[^|\r\n]*')),
+    Field('Break Limit', labelled('BL', r'[^|\s]+', r'[ \t]*', r'[^|\r\n]*')),
+    # Item names are anything that's followed by zero or more spaces and a "|"
+    Field('Normal Drop', labelled('N', r'[^|\r\n]+', r'[ \t]*', r'(?=[ \t]*\|)'), str.strip),
+    Field('Rare Drop', labelled('R', r'[^|\r\n]+', r'[ \t]*', r'(?=[ \t]*\|)'), str.strip),
+    Field('Stealable Item', labelled('S', r'[^|\r\n]+', r'[ \t]*', r'(?=[ \t]*\|)'), str.strip),
+    # A single letter, with the spaces around it stripped
+    Field('Type', labelled('Enemy Type', r'[A-Z \t]+', '', r'[^|\r\n]*'), lambda x: x.replace(" ", "")),
+    Field('Absorbs Element', labelled('AB', r'[^|\r\n]+', r'[ \t]'), str.strip),
+    Field('Weak to Element', labelled('WK', r'[^|\r\n]+', r'[ \t]'), str.strip),
+    Field('Strong Against Element', labelled('SG', r'[^|\r\n]+', r'[ \t]'), str.strip),
+    Field('Not Affected by Element', labelled('NE', r'[^|\r\n]+', r'[ \t]'), str.strip),
+]
+blocks = parse_blocks(str(text), fields, start='Name')
+# The regex doesn't match the header of enemy #63 Yuriev Soldier A, so its stats come out as a block with no name
+# Name it from the closest line above it that looks like a header: some periods, the enemy's number and name, then periods again
+name_headless_blocks(blocks, str(text), 'Name', r'\.{3,}(\d+ [^\r\n]*?)\.{3,}')
+# Remove the first five blocks because they're not enemies (the legend explaining the abbreviations is in one of them)
+blocks = blocks[5:]
+for block in blocks:
+    if 'Name' in block.values:
+        # Remove leading and trailing dots, then everything before the first whitespace (the enemy's number)
+        block.values['Name'] = block.values['Name'].strip(".").split(" ", 1)[1]
+
+# An enemy that's missing a stat gets reported and left out, instead of shifting every column after it by one
+df = to_frame(blocks, fields)
 
 # Replace missing values with "N/A"
 df.replace('', 'N/A', inplace=True)
@@ -0,0 +1,177 @@
+"""
+Single-pass parser for the enemy lists in GameFAQs FAQs.
+
+Instead of running one re.findall per stat and hoping every list comes out the
+same length, every field's pattern is combined into one regex and the text is
+scanned once, left to right. Each match of the start field (the enemy's name)
+opens a new block and every other match is added to the current block, so a
+value can only ever end up next to the other values from its own block.
+
+Matches can't overlap, so a pattern that runs past the end of its own line
+would swallow the next label. Every pattern should stay on one line, which is
+what labelled() does by default: an empty value is captured as ''.
+
+A block that's missing a field, or where a field shows up twice (usually
+because the next enemy's header didn't match), is reported with its line
+number instead of shifting every column after it.
+
+Usage:
+    fields = [Field('Name', labelled('Name')), Field('HP', labelled('HP'))]
+    blocks = parse_blocks(text, fields, start='Name')
+    df = to_frame(blocks, fields)
+"""
+
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import pandas as pd
+
+
+class Field(NamedTuple):
+    """One column: its name, a regex with exactly one capture group for the value, and an optional clean-up function."""
+    column: str
+    pattern: str
+    convert: Optional[Callable[[str], str]] = None
+
+
+class Block(NamedTuple):
+    """The values found for one enemy, and the line its block starts on (1-based)."""
+    line: int
+    values: Dict[str, str]
+
+
+def labelled(label, value=r'[^\r\n]*', separator=r'[ \t]*', tail=''):
+    """
+    Build the pattern for a "Label: value" field.
+
+    Args:
+        label (str): The label, without the colon.
+        value (str): What the value looks like; this is the part that's captured. Keep it on one line.
+        separator (str): What sits between the colon and the value. Keep it on one line, or an empty value takes the next line's label with it.
+        tail (str): Anything after the value that should be consumed (or looked ahead for) but not captured.
+
+    Returns:
+        str: The pattern. The label can't be the end of a longer word, so 'EP:' doesn't match inside 'DEEP:'.
+    """
+    return rf'(?<![A-Za-z]){re.escape(label)}:{separator}({value}){tail}'
+
+
+def compile_fields(fields):
+    # Wrap each field's pattern in its own group so a match says which field it was
+    parts = []
+    for field in fields:
+        if re.compile(field.pattern).groups != 1:
+            raise ValueError(f"The pattern for {field.column} needs exactly one capture group: {field.pattern}")
+        parts.append(f'({field.pattern})')
+    return re.compile('|'.join(parts))
+
+
+def parse_blocks(text, fields, start):
+    """
+    Scan the text once and split it into one block per enemy.
+
+    Args:
+        text (str): The FAQ text.
+        fields (List[Field]): The fields to look for. Where two could match at the same spot, the first one listed wins.
+        start (str): The column whose match starts a new block, normally the name.
+
+    Returns:
+        List[Block]: The blocks, in document order. Anything before the first start match is ignored.
+    """
+    pattern = compile_fields(fields)
+    # Group number of each field's outer group -> the field
+    by_group = {2 * i + 1: field for i, field in enumerate(fields)}
+
+    blocks: List[Block] = []
+    line, scanned = 1, 0
+    for match in pattern.finditer(text):
+        field = by_group[match.lastindex]
+        value = match.group(match.lastindex + 1)
+        if field.convert is not None:
+            value = field.convert(value)
+        # Only count the newlines since the last match, so working out line numbers stays linear
+        line += text.count('\n', scanned, match.start())
+        scanned = match.start()
+
+        if field.column == start:
+            blocks.append(Block(line, {start: value}))
+        elif not blocks:
+            continue
+        elif field.column in blocks[-1].values:
+            # A field showing up twice means a block started without a start match, so keep it apart instead of overwriting
+            blocks.append(Block(line, {field.column: value}))
+        else:
+            blocks[-1].values[field.column] = value
+    return blocks
+
+
+def name_headless_blocks(blocks, text, start, header):
+    """
+    Name the blocks that opened without a start match, from a looser header pattern.
+
+    Args:
+        blocks (List[Block]): The parsed blocks. Named in place.
+        text (str): The text they were parsed from.
+        start (str): The start column, normally the name.
+        header (str): A pattern with one capture group for the name, tried on each line between the previous block's start and this one's.
+
+    Returns:
+        List[Block]: The blocks that still have no name.
+    """
+    header = re.compile(header)
+    lines = text.split('\n')
+    unnamed = []
+    for position, block in enumerate(blocks):
+        if start in block.values:
+            continue
+        previous = blocks[position - 1].line if position else 0
+        # The closest header above the block's first value wins
+        for line in reversed(lines[previous:block.line - 1]):
+            match = header.search(line)
+            if match:
+                block.values[start] = match.group(1)
+                break
+        else:
+            unnamed.append(block)
+    return unnamed
+
+
+def find_problems(blocks, fields):
+    """
+    List every block that's missing a field.
+
+    Returns:
+        Dict[int, str]: Block position to a description of what's wrong with it.
+    """
+    columns = [field.column for field in fields]
+    problems = {}
+    for position, block in enumerate(blocks):
+        missing = [column for column in columns if column not in block.values]
+        if missing:
+            name = next(iter(block.values.values()), '?')
+            problems[position] = f"block {position} at line {block.line} ({name}) is missing {', '.join(missing)}"
+    return problems
+
+
+def to_frame(blocks, fields, strict=False):
+    """
+    Build a dataframe with one row per complete block.
+
+    Args:
+        blocks (List[Block]): The parsed blocks.
+        fields (List[Field]): The fields, in the column order to use.
+        strict (bool): Raise on any malformed block instead of reporting and skipping it.
+
+    Returns:
+        pd.DataFrame: The complete blocks.
+    """
+    problems = find_problems(blocks, fields)
+    if problems:
+        report = '\n'.join(f"  {problem}" for problem in problems.values())
+        if strict:
+            raise ValueError(f"{len(problems)} malformed blocks:\n{report}")
+        print(f"Skipping {len(problems)} malformed blocks:\n{report}")
+    return pd.DataFrame.from_records(
+        [block.values for position, block in enumerate(blocks) if position not in problems],
+        columns=[field.column for field in fields],
+    )
@@ -0,0 +1,188 @@
+"""
+Shared HTTP fetching for the scraping scripts.
+
+Every response is kept in an on-disk cache (webscraping/.cache by default), and
+later fetches send a conditional GET (If-None-Match / If-Modified-Since) so an
+unchanged page costs a 304 instead of a full download. Requests have a timeout
+and are retried with exponential backoff on connection errors and 429/5xx
+responses. If the site is down and the page is cached, the cached copy is used.
+
+Set SCRAPE_OFFLINE=1 (or pass offline=True) to never touch the network: pages
+come from the cache, or from webscraping/fixtures/ which uses the same layout.
+The fixtures that ship with the repo are small synthetic pages laid out like
+the real FAQs (copy a cache entry there to pin a real one instead).
+
+Usage:
+    from fetch import SOURCES, fetch, fetch_all
+    html = fetch(SOURCES['episode1'])
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv('SCRAPE_CACHE_DIR', os.path.join(HERE, '.cache'))
+FIXTURE_DIR = os.path.join(HERE, 'fixtures')
+
+# The pages each episode is scraped from
+SOURCES = {
+    'episode1': "https://gamefaqs.gamespot.com/ps2/519264-xenosaga-episode-i-der-wille-zur-macht/faqs/22927",
+    'episode3': "https://gamefaqs.gamespot.com/ps2/929933-xenosaga-episode-iii-also-sprach-zarathustra/faqs/45192",
+}
+
+# Pretend like we're human
+# https://stackoverflow.com/a/43441551
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:52.0) Gecko/20100101 Firefox/52.0',
+}
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (5, 30)
+RETRIES = 3
+# Waits 1s, 2s, 4s... between retries (or whatever Retry-After says)
+BACKOFF = 1.0
+
+
+class OfflineCacheMiss(LookupError):
+    """Raised in offline mode when a page is neither cached nor a fixture."""
+
+
+def is_offline():
+    return os.getenv('SCRAPE_OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+
+def cache_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:24]
+
+
+def _read_entry(directory, url):
+    # Returns (body, metadata), or (None, None) if the page isn't in that directory
+    base = os.path.join(directory, cache_key(url))
+    try:
+        with open(f'{base}.json') as f:
+            meta = json.load(f)
+        with open(f'{base}.body', 'rb') as f:
+            return f.read(), meta
+    except FileNotFoundError:
+        return None, None
+
+
+def _write_entry(url, body, meta):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    base = os.path.join(CACHE_DIR, cache_key(url))
+    # Write the body before the metadata, each to a temp file first, so a crash never leaves a half-written page behind
+    for suffix, data in (('.body', body), ('.json', json.dumps(meta, indent=2).encode('utf-8'))):
+        temp_path = f'{base}{suffix}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, f'{base}{suffix}')
+
+
+_local = threading.local()
+
+
+def _session(retries, backoff):
+    # requests sessions aren't meant to be shared between threads, so each thread gets its own (per retry policy)
+    sessions = _local.__dict__.setdefault('sessions', {})
+    session = sessions.get((retries, backoff))
+    if session is None:
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET',),
+            respect_retry_after_header=True,
+        )
+        session.mount('https://', HTTPAdapter(max_retries=retry))
+        session.mount('http://', HTTPAdapter(max_retries=retry))
+        sessions[(retries, backoff)] = session
+    return session
+
+
+def fetch(url, offline=None, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """
+    Fetch a page, going through the on-disk cache.
+
+    Args:
+        url (str): The page to fetch.
+        offline (bool): Only use the cache and fixtures. Defaults to the SCRAPE_OFFLINE environment variable.
+        timeout (tuple): (connect, read) timeouts in seconds.
+        retries (int): How many times to retry connection errors and 429/5xx responses.
+        backoff (float): The backoff factor between retries, in seconds.
+
+    Returns:
+        bytes: The response body.
+    """
+    body, meta = _read_entry(CACHE_DIR, url)
+    if offline if offline is not None else is_offline():
+        if body is None:
+            body, meta = _read_entry(FIXTURE_DIR, url)
+        if body is None:
+            raise OfflineCacheMiss(f"{url} isn't cached (key {cache_key(url)}) and offline mode is on")
+        return body
+
+    conditional = {}
+    if meta is not None:
+        if meta.get('etag'):
+            conditional['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            conditional['If-Modified-Since'] = meta['last_modified']
+    try:
+        response = _session(retries, backoff).get(url, headers=conditional, timeout=timeout)
+        if response.status_code == 304 and body is not None:
+            meta['checked_at'] = formatdate(usegmt=True)
+            _write_entry(url, body, meta)
+            return body
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if body is None:
+            raise
+        print(f"Couldn't fetch {url} ({e}), using the copy cached on {meta.get('fetched_at')}")
+        return body
+
+    meta = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched_at': formatdate(usegmt=True),
+        'checked_at': formatdate(usegmt=True),
+    }
+    _write_entry(url, response.content, meta)
+    return response.content
+
+
+def fetch_all(urls, max_workers=4, **kwargs):
+    """
+    Fetch several pages at once.
+
+    Args:
+        urls (list): The pages to fetch.
+        max_workers (int): How many to fetch in parallel.
+        **kwargs: Passed on to fetch().
+
+    Returns:
+        dict: URL to response body mapping.
+    """
+    urls = list(dict.fromkeys(urls))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(urls, pool.map(lambda url: fetch(url, **kwargs), urls)))
+
+
+if __name__ == '__main__':
+    # Warm the cache for every source (or check it's complete with SCRAPE_OFFLINE=1)
+    started = time.perf_counter()
+    pages = fetch_all(SOURCES.values())
+    for name, url in SOURCES.items():
+        print(f"{name}: {len(pages[url])} bytes")
+    print(f"Fetched {len(pages)} pages in {time.perf_counter() - started:.2f}s")